@@ -0,0 +1,123 @@
+"""数据库读写压测: 比较逐行 execute 与 executemany 写入、各 PRAGMA 配置的读写耗时
+
+写入: 对每个数据规模在新的临时数据库中写入合成任务行 (一个事务)，分别计时
+    - legacy: 逐行 cursor.execute，连接不设置 PRAGMA (旧实现)
+    - bulk:   TaskWriter.write() (executemany)，连接使用写配置 SQLITE_WRITE_PRAGMAS
+读取: 在写好的数据库上按周查询 get_tasks_from_db()，分别使用空配置和读配置 SQLITE_READ_PRAGMAS
+
+用法:
+    python bench_db.py --rows 10000 100000
+    SQLITE_WRITE_PRAGMAS="synchronous=FULL" python bench_db.py --rows 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+WEEKDAY_KEYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "weekend", "weekend"]
+
+
+def _make_tasks(rows: int) -> dict:
+    """生成按星期分组的合成任务行: 每条记录覆盖 4 天"""
+    groups = {key: [] for key in WEEKDAY_KEYS + ["unknown_date"]}
+    first_day = date.today() - timedelta(days=180)
+    for n in range(rows):
+        day = first_day + timedelta(days=(n // 4) % 360 + n % 4)
+        start = first_day + timedelta(days=(n // 4) % 360)
+        key = WEEKDAY_KEYS[day.weekday()]
+        groups[key].append({
+            "record_id": f"rec{n // 4:08d}",
+            "task_name": f"客户{n % 997} 网络巡检",
+            "assignee": ["张三", "李四", "王五", "赵六"][n % 4],
+            "status": "进行中",
+            "priority": "普通",
+            "application_status": "审批中",
+            "date": day.isoformat(),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=3)).isoformat(),
+        })
+    return groups
+
+
+def _legacy_write(task_db, groups: dict) -> float:
+    """旧实现: 逐行 execute，连接不设置 PRAGMA"""
+    saved = task_db.PRAGMA_PROFILES["write"]
+    task_db.PRAGMA_PROFILES["write"] = []
+    try:
+        started = time.perf_counter()
+        with task_db.open_task_writer() as writer:
+            for weekday, tasks in groups.items():
+                for task in tasks:
+                    writer.cursor.execute(f"""
+                        INSERT OR REPLACE INTO tasks (record_id, date, {', '.join(task_db.MERGE_COLUMNS)}, source)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (task["record_id"], task_db._day(task["date"]), *writer._task_values(task, weekday),
+                          writer.source))
+        return time.perf_counter() - started
+    finally:
+        task_db.PRAGMA_PROFILES["write"] = saved
+
+
+def _bulk_write(task_db, groups: dict) -> float:
+    started = time.perf_counter()
+    with task_db.open_task_writer() as writer:
+        writer.write(groups)
+    return time.perf_counter() - started
+
+
+def _read_weeks(task_db, pragmas, weeks: int) -> float:
+    """依次查询 weeks 个整周，返回总耗时"""
+    saved = task_db.PRAGMA_PROFILES["read"]
+    task_db.PRAGMA_PROFILES["read"] = pragmas
+    try:
+        monday = date.today() - timedelta(days=date.today().weekday() + 7 * (weeks // 2))
+        started = time.perf_counter()
+        for n in range(weeks):
+            start = monday + timedelta(weeks=n)
+            task_db.get_tasks_from_db(start.isoformat(), (start + timedelta(days=6)).isoformat())
+        return time.perf_counter() - started
+    finally:
+        task_db.PRAGMA_PROFILES["read"] = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库读写压测")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000], help="写入行数，可传多个")
+    parser.add_argument("--weeks", type=int, default=20, help="读取测试查询的周数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["DB_FILE"] = os.path.join(workdir, "tasks.db")
+
+    import logging
+    import task_db
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"write pragmas: {task_db.SQLITE_WRITE_PRAGMAS}")
+    print(f"read pragmas:  {task_db.SQLITE_READ_PRAGMAS}")
+    print(f"{'rows':>10} {'legacy s':>9} {'bulk s':>9} {'bulk rows/s':>12} {'read s':>8} {'read(tuned) s':>14}")
+    for rows in args.rows:
+        groups = _make_tasks(rows)
+        timings = []
+        for write in (_legacy_write, _bulk_write):
+            # 每种写法都写入一个全新的数据库
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(task_db.DB_FILE + suffix):
+                    os.remove(task_db.DB_FILE + suffix)
+            task_db.init_db()
+            timings.append(write(task_db, groups))
+        read_plain = _read_weeks(task_db, [], args.weeks)
+        read_tuned = _read_weeks(task_db, task_db.PRAGMA_PROFILES["read"], args.weeks)
+        print(f"{rows:>10} {timings[0]:>9.3f} {timings[1]:>9.3f} {rows / timings[1]:>12.0f} "
+              f"{read_plain:>8.3f} {read_tuned:>14.3f}")
+
+    print(f"\nworkdir: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""筛选器压测: 比较逐条解释执行的旧版条件判断与 TaskFilter 编译后的闭包
+
+合成任务取自一个较小的样本池 (列表中重复引用，避免百万个字典占用过多内存)，
+对每个筛选器分别计时旧版和编译版的 filter_tasks，并校验结果一致。
+
+用法:
+    python bench_filter.py --rows 1000000
+    python bench_filter.py --rows 200000 1000000 --in-list-size 200
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ASSIGNEES = ["张三", "李四", "王五", "赵六", "钱七", "张三, 李四", ""]
+STATUSES = ["进行中", "已结束", "紧急", "重要", "已取消", "已关闭"]
+PRIORITIES = ["普通", "重要", "紧急", "非常紧急", ""]
+APPLICATION_STATUSES = ["", "审批中", "已通过", "已撤回"]
+
+
+def _make_pool(size: int, today: str) -> list:
+    """样本任务 (日期集中在今天前后两周，部分为空)"""
+    from process_feishu_data import date_str_to_ordinal, ordinal_to_date_str, weekday_key
+
+    base = date_str_to_ordinal(today)
+    rng = random.Random(42)
+    pool = []
+    for i in range(size):
+        date = "" if i % 40 == 0 else ordinal_to_date_str(base + rng.randint(-14, 14))
+        pool.append({
+            "record_id": f"rec{i}", "task_name": f"客户{i % 500} {rng.choice(['巡检', '安装', '故障排查'])}",
+            "assignee": rng.choice(ASSIGNEES), "status": rng.choice(STATUSES), "priority": rng.choice(PRIORITIES),
+            "application_status": rng.choice(APPLICATION_STATUSES), "date": date, "start_date": date,
+            "end_date": date, "weekday": weekday_key(date) if date else "unknown_date", "source": "default",
+        })
+    return pool
+
+
+def _filters(in_list_size: int) -> dict:
+    customers = [f"客户{i} 巡检" for i in range(in_list_size)]
+    return {
+        "default": ("and", [
+            {"field": "status", "operator": "not_in", "value": ["已取消", "已关闭"]},
+            {"field": "assignee", "operator": "not_empty"},
+            {"field": "application_status", "operator": "not_in", "value": ["已撤回"]},
+        ]),
+        "approved_this_week": ("and", [
+            {"field": "application_status", "operator": "equals", "value": "已通过"},
+            {"field": "date", "operator": "this_week"},
+        ]),
+        "customer_list_or_urgent": ("or", [
+            {"field": "task_name", "operator": "in", "value": customers},
+            {"field": "priority", "operator": "contains", "value": "紧急"},
+        ]),
+        "not_contains_and_weekday": ("and", [
+            {"field": "task_name", "operator": "not_contains", "value": "故障"},
+            {"field": "weekday", "operator": "not_in", "value": ["weekend", "unknown_date"]},
+            {"field": "priority", "operator": "in", "value": ["紧急", "非常紧急"]},
+        ]),
+    }
+
+
+def _legacy_filter(task_filter, tasks: list, conditions: list, logic: str) -> list:
+    """旧版实现: 每条任务、每个条件都按操作符字符串分派，先算出全部结果再 all()/any()"""
+    def evaluate(task, condition):
+        field = condition["field"]
+        operator = condition["operator"]
+        value = condition.get("value")
+        task_value = task.get(field)
+        if task_value is None:
+            if operator in ["not_empty", "is_empty"]:
+                return operator == "is_empty"
+            return False
+        if operator == "equals":
+            return task_value == value
+        elif operator == "not_equals":
+            return task_value != value
+        elif operator == "contains":
+            return value in str(task_value)
+        elif operator == "not_contains":
+            return value not in str(task_value)
+        elif operator == "in":
+            return task_value in value if isinstance(value, list) else False
+        elif operator == "not_in":
+            return task_value not in value if isinstance(value, list) else True
+        elif operator == "not_empty":
+            return task_value is not None and task_value != ""
+        elif operator == "is_empty":
+            return task_value is None or task_value == ""
+        elif operator == "this_week":
+            return task_filter._is_date_in_current_week(task_value)
+        return False
+
+    def evaluate_all(task):
+        results = [evaluate(task, cond) for cond in conditions]
+        return any(results) if logic == "or" else all(results)
+
+    return [task for task in tasks if evaluate_all(task)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="筛选器旧版/编译版压测")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000], help="任务数，可传多个")
+    parser.add_argument("--pool-size", type=int, default=20000, help="不同任务的样本数")
+    parser.add_argument("--in-list-size", type=int, default=100, help="in 条件的取值个数")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from task_db import get_week_range
+    from task_filter import TaskFilter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        task_filter = TaskFilter(os.path.join(tmp, "filter_config.json"))
+    pool = _make_pool(args.pool_size, get_week_range()[0])
+    filters = _filters(args.in_list_size)
+    task_filter.config = {
+        "filters": {name: {"enabled": True, "conditions": conditions, "logic": logic}
+                    for name, (logic, conditions) in filters.items()},
+    }
+    task_filter._compile_filters()
+
+    print(f"{'rows':>10} {'filter':<26} {'matched':>9} {'legacy s':>9} {'compiled s':>11}  speedup")
+    for rows in args.rows:
+        tasks = [pool[i % len(pool)] for i in range(rows)]
+        for name, (logic, conditions) in filters.items():
+            started = time.perf_counter()
+            legacy = _legacy_filter(task_filter, tasks, conditions, logic)
+            legacy_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            compiled = task_filter.filter_tasks(tasks, name)
+            compiled_seconds = time.perf_counter() - started
+            if compiled != legacy:
+                print(f"  result mismatch for filter {name}")
+
+            print(f"{rows:>10} {name:<26} {len(compiled):>9} {legacy_seconds:>9.2f} {compiled_seconds:>11.2f}"
+                  f"  {legacy_seconds / compiled_seconds:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
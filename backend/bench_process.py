@@ -0,0 +1,60 @@
+"""记录转换压测: 比较 process_feishu_records() 串行与多进程版本的耗时
+
+用 feishu_mock_server.make_record() 生成合成记录 (包含宽字段和少量长周期任务)，
+对每个数据规模分别计时串行和各进程数的并行转换，并校验结果一致。
+
+用法:
+    python bench_process.py --records 20000 100000 400000 --workers 2 4 8
+    python bench_process.py --records 200000 --chunk-size 50000 --long-span-rate 0.05
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="记录转换串行/多进程压测")
+    parser.add_argument("--records", type=int, nargs="+", default=[20000, 100000], help="数据规模，可传多个")
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1], help="进程数，可传多个")
+    parser.add_argument("--chunk-size", type=int, default=None, help="每块记录数，默认 PROCESS_POOL_CHUNK_SIZE")
+    parser.add_argument("--long-span-rate", type=float, default=0.01, help="长周期 (30-400 天) 任务的比例")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from feishu_mock_server import make_record
+    from process_feishu_data import process_feishu_records, process_feishu_records_parallel
+
+    logging.getLogger().setLevel(logging.WARNING)
+    base_time_ms = int(time.time() * 1000)
+
+    print(f"cpu count: {os.cpu_count()}")
+    print(f"{'records':>10} {'rows':>10} {'serial s':>9} " + " ".join(f"{f'{w} procs s':>10}" for w in args.workers)
+          + "  speedup")
+    for records in args.records:
+        data = [make_record(i, base_time_ms, long_span_rate=args.long_span_rate) for i in range(records)]
+
+        started = time.perf_counter()
+        serial = process_feishu_records(data)
+        serial_seconds = time.perf_counter() - started
+        rows = sum(len(tasks) for tasks in serial.values())
+
+        timings = []
+        for workers in args.workers:
+            started = time.perf_counter()
+            parallel = process_feishu_records_parallel(data, workers=workers, chunk_size=args.chunk_size)
+            timings.append(time.perf_counter() - started)
+            if parallel != serial:
+                print(f"  result mismatch with {workers} workers")
+
+        best = min(timings)
+        print(f"{records:>10} {rows:>10} {serial_seconds:>9.2f} " + " ".join(f"{t:>10.2f}" for t in timings)
+              + f"  {serial_seconds / best:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
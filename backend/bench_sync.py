@@ -0,0 +1,119 @@
+"""同步链路压测: 用 feishu_mock_server.py 替代飞书，驱动真实的 run_sync()
+
+每个数据规模启动一个独立的替身服务进程，同步写入临时数据库，输出
+耗时、records/sec、下载字节数、请求数和同步进程的峰值 RSS。
+
+用法:
+    python bench_sync.py --records 10000 100000 --latency-ms 30
+    python bench_sync.py --records 50000 --rate-429 0.05 --fail-rate 0.01
+    python bench_sync.py --records 50000 --mode incremental   # 先全量再增量
+    TASK_STORAGE_MODE=interval python bench_sync.py --records 50000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _start_server(records: int, latency_ms: float, rate_429: float, fail_rate: float) -> (subprocess.Popen, str):
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BACKEND_DIR, "feishu_mock_server.py"),
+            "--port", "0", "--records", str(records), "--latency-ms", str(latency_ms),
+            "--rate-429", str(rate_429), "--fail-rate", str(fail_rate),
+        ],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = proc.stdout.readline().strip()
+    if not url.startswith("http"):
+        proc.kill()
+        raise RuntimeError("mock server failed to start")
+    return proc, url
+
+
+def _server_stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/__stats") as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def _db_size_mb(db_file: str) -> float:
+    # WAL 模式下未合并的写入在 -wal 文件中
+    paths = [db_file, db_file + "-wal"]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 1024 / 1024
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="飞书同步链路压测")
+    parser.add_argument("--records", type=int, nargs="+", default=[10000], help="数据规模，可传多个")
+    parser.add_argument("--latency-ms", type=float, default=0, help="替身服务每个请求的延迟")
+    parser.add_argument("--rate-429", type=float, default=0, help="注入 429 的比例")
+    parser.add_argument("--fail-rate", type=float, default=0, help="注入 500 的比例")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full",
+                        help="incremental: 先跑一次全量建立高水位，再计时一次增量同步")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_sync_")
+    # 必须在导入同步模块之前设置，这些配置在模块加载时读取
+    os.environ["DB_FILE"] = os.path.join(workdir, "tasks.db")
+    os.environ["FEISHU_TOKEN_CACHE_FILE"] = os.path.join(workdir, "token_cache.json")
+    os.environ.setdefault("FEISHU_RETRY_BASE_SECONDS", "0.05")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import logging
+    from feishu_reader import FeishuBitableReader
+    from feishu_sync import run_sync
+    from task_db import init_db, get_task_count
+
+    logging.getLogger().setLevel(logging.WARNING)
+    init_db()
+    baseline_rss = _peak_rss_mb()
+
+    print(f"{'records':>10} {'mode':>12} {'seconds':>9} {'rec/s':>10} {'MB down':>9} "
+          f"{'requests':>9} {'429/500':>9} {'tasks':>9} {'DB MB':>7} {'peak RSS MB':>12}")
+    for records in args.records:
+        proc, url = _start_server(records, args.latency_ms, args.rate_429, args.fail_rate)
+        try:
+            reader = FeishuBitableReader("bench_app", "bench_secret", base_url=url)
+            table_id = f"tbl_bench_{records}"
+            if args.mode == "incremental":
+                run_sync(app_token="bench", table_id=table_id, mode="full", reader=reader)
+            before = _server_stats(url)
+
+            started = time.perf_counter()
+            summary = run_sync(app_token="bench", table_id=table_id, mode=args.mode, reader=reader)
+            elapsed = time.perf_counter() - started
+
+            after = _server_stats(url)
+            downloaded_mb = (after["bytes_sent"] - before["bytes_sent"]) / 1024 / 1024
+            requests_made = after["record_requests"] - before["record_requests"]
+            injected = (after["injected_429"] - before["injected_429"], after["injected_500"] - before["injected_500"])
+            rate = summary["records_fetched"] / elapsed if elapsed > 0 else 0
+            print(f"{records:>10} {summary['mode']:>12} {elapsed:>9.2f} {rate:>10.0f} {downloaded_mb:>9.2f} "
+                  f"{requests_made:>9} {injected[0]:>4}/{injected[1]:<4} {get_task_count():>9} "
+                  f"{_db_size_mb(os.environ['DB_FILE']):>7.1f} {_peak_rss_mb():>12.1f}")
+            if not summary["success"]:
+                print(f"  sync failed: {summary['message']}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"\nbaseline RSS before syncing: {baseline_rss:.1f} MB, workdir: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""飞书事件订阅: 多维表格记录变更的推送接收与批量应用
+
+main.py 的 POST /api/feishu/events 收到事件后:
+1. parse_event_request() 校验 Verification Token (配置了 Encrypt Key 时还会校验签名、时间戳并解密)，
+   is_duplicate_event() 丢弃近期已收到过的 event_id (飞书超时重试或重放的推送)
+2. extract_record_changes() 从 drive.file.bitable_record_changed_v1 事件中取出变更的 record_id
+3. RecordChangeBatcher 把变更放入队列立即返回 (飞书要求 3 秒内响应)，后台线程每隔
+   EVENT_BATCH_WINDOW_SECONDS 合并一批，按 record_id 回查最新记录并替换对应的任务行
+
+事件里只用 record_id 和动作类型，字段值一律通过 records/batch_get 重新读取，
+所以漏过去重的重复推送、乱序推送都只会导致重复回查，结果是幂等的。回查不到的记录按删除处理。
+
+注意: 多维表格的记录变更事件需要先在开发者后台订阅该事件，并调用云文档
+「订阅云文档事件」接口订阅对应的多维表格 (file_type=bitable)。
+"""
+
+import os
+import json
+import base64
+import hashlib
+import hmac
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, NamedTuple, Callable
+
+from feishu_reader import FeishuBitableReader
+from feishu_sync import SYNC_FETCH_ALL_FIELDS, invalidate_dataset_hash, load_sync_sources, write_changed_records
+from field_schema import compile_field_extractor
+from process_feishu_data import record_content_hash
+from task_db import open_task_writer
+
+# 可选依赖: 只有配置了 Encrypt Key (事件加密推送) 时才需要 cryptography
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# --- 配置部分 ---
+# 开发者后台「事件订阅」中的 Verification Token，未配置时事件接口不可用
+EVENT_VERIFICATION_TOKEN = os.getenv("FEISHU_EVENT_VERIFICATION_TOKEN", "")
+# 开发者后台「事件订阅」中的 Encrypt Key (可选)，配置后校验签名并解密事件
+EVENT_ENCRYPT_KEY = os.getenv("FEISHU_EVENT_ENCRYPT_KEY", "")
+# 签名推送的 X-Lark-Request-Timestamp 与本机时间相差超过该秒数时拒绝 (防重放)。
+# event_id 记住两倍时长，覆盖时间戳仍在允许范围内的所有重放
+EVENT_MAX_AGE_SECONDS = int(os.getenv("EVENT_MAX_AGE_SECONDS", "300"))
+# 去重时最多记住的 event_id 数
+EVENT_DEDUP_MAX_IDS = 10000
+# 合并窗口 (秒): 收到第一条变更后最多等待这么久再统一应用
+EVENT_BATCH_WINDOW_SECONDS = float(os.getenv("EVENT_BATCH_WINDOW_SECONDS", "2"))
+# 单批最多的记录数，达到后不再等待窗口结束
+EVENT_BATCH_MAX_RECORDS = int(os.getenv("EVENT_BATCH_MAX_RECORDS", "200"))
+# 应用失败 (回查或写库出错) 的变更最多重新排队的次数，之后交给定时同步兜底
+EVENT_MAX_RETRIES = 3
+# --- 配置结束 ---
+
+RECORD_CHANGED_EVENT = "drive.file.bitable_record_changed_v1"
+
+
+class EventVerificationError(Exception):
+    """事件请求未通过校验 (token、签名或解密失败)"""
+
+
+class RecordChange(NamedTuple):
+    """一条记录变更，deleted 为 True 表示飞书侧删除了该记录"""
+    app_token: str
+    table_id: str
+    record_id: str
+    deleted: bool
+
+
+def decrypt_event(encrypt: str, encrypt_key: str) -> Dict[str, Any]:
+    """解密加密推送的事件 (AES-256-CBC，密钥为 Encrypt Key 的 SHA256，前 16 字节为 IV)"""
+    if Cipher is None:
+        raise EventVerificationError("FEISHU_EVENT_ENCRYPT_KEY is set but the 'cryptography' package is not installed")
+    try:
+        data = base64.b64decode(encrypt)
+        key = hashlib.sha256(encrypt_key.encode("utf-8")).digest()
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(data[:16])).decryptor()
+        plain = decryptor.update(data[16:]) + decryptor.finalize()
+        plain = plain[:-plain[-1]]  # 去掉 PKCS#7 填充
+        return json.loads(plain.decode("utf-8"))
+    except Exception as e:
+        raise EventVerificationError(f"Failed to decrypt event: {e}") from e
+
+
+def verify_signature(headers: Dict[str, str], raw_body: bytes, encrypt_key: str) -> bool:
+    """校验 X-Lark-Signature = sha256(timestamp + nonce + encrypt_key + body)"""
+    timestamp = headers.get("x-lark-request-timestamp", "")
+    nonce = headers.get("x-lark-request-nonce", "")
+    signature = headers.get("x-lark-signature", "")
+    expected = hashlib.sha256((timestamp + nonce + encrypt_key).encode("utf-8") + raw_body).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_event_request(
+    raw_body: bytes,
+    headers: Dict[str, str],
+    verification_token: Optional[str] = None,
+    encrypt_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """校验并解析一次事件推送，返回明文事件
+
+    headers 的键需为小写 (Starlette 的 request.headers 满足)。
+
+    Raises:
+        EventVerificationError: 未配置 Verification Token，或校验/解密失败，或签名推送的时间戳过期
+    """
+    verification_token = EVENT_VERIFICATION_TOKEN if verification_token is None else verification_token
+    encrypt_key = EVENT_ENCRYPT_KEY if encrypt_key is None else encrypt_key
+    if not verification_token:
+        raise EventVerificationError("FEISHU_EVENT_VERIFICATION_TOKEN is not configured")
+
+    try:
+        payload = json.loads(raw_body.decode("utf-8"))
+    except Exception as e:
+        raise EventVerificationError(f"Invalid event body: {e}") from e
+
+    if "encrypt" in payload:
+        if not encrypt_key:
+            raise EventVerificationError("Received an encrypted event but FEISHU_EVENT_ENCRYPT_KEY is not configured")
+        signed = bool(headers.get("x-lark-signature"))
+        if signed:
+            if not verify_signature(headers, raw_body, encrypt_key):
+                raise EventVerificationError("Invalid event signature")
+            # 时间戳参与签名，过期的推送即使签名正确也拒绝
+            try:
+                age = time.time() - int(headers.get("x-lark-request-timestamp", ""))
+            except ValueError:
+                raise EventVerificationError("Missing or invalid event timestamp") from None
+            if abs(age) > EVENT_MAX_AGE_SECONDS:
+                raise EventVerificationError(f"Event timestamp is {age:.0f}s off, limit is {EVENT_MAX_AGE_SECONDS}s")
+        payload = decrypt_event(payload["encrypt"], encrypt_key)
+        # 飞书只有 URL 校验请求不带签名头 (只回显 challenge)，其他未签名的推送一律拒绝
+        if not signed and payload.get("type") != "url_verification":
+            raise EventVerificationError("Missing event signature")
+    elif encrypt_key:
+        raise EventVerificationError("Expected an encrypted event")
+
+    # 2.0 版事件的 token 在 header 中，URL 校验和 1.0 版事件在顶层
+    token = (payload.get("header") or {}).get("token") or payload.get("token")
+    if not hmac.compare_digest(str(token or ""), verification_token):
+        raise EventVerificationError("Invalid verification token")
+    return payload
+
+
+class RecentEventIds:
+    """近期收到过的 event_id，超过 ttl_seconds 或数量超过 max_ids 的最早记录被淘汰"""
+
+    def __init__(self, ttl_seconds: float = 2 * EVENT_MAX_AGE_SECONDS, max_ids: int = EVENT_DEDUP_MAX_IDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_ids = max_ids
+        self.seen: "OrderedDict[str, float]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check_and_add(self, event_id: str) -> bool:
+        """记住 event_id，近期已见过时返回 True"""
+        now = time.monotonic()
+        with self.lock:
+            while self.seen:
+                oldest, seen_at = next(iter(self.seen.items()))
+                if now - seen_at <= self.ttl_seconds and len(self.seen) < self.max_ids:
+                    break
+                del self.seen[oldest]
+            if event_id in self.seen:
+                return True
+            self.seen[event_id] = now
+            return False
+
+
+_recent_events = RecentEventIds()
+
+
+def is_duplicate_event(payload: Dict[str, Any], recent: Optional[RecentEventIds] = None) -> bool:
+    """同一事件 (2.0 版 header.event_id，1.0 版 uuid) 近期已收到过时返回 True，调用方应直接确认、不再处理"""
+    event_id = (payload.get("header") or {}).get("event_id") or payload.get("uuid")
+    if not event_id:
+        return False
+    return (_recent_events if recent is None else recent).check_and_add(str(event_id))
+
+
+def extract_record_changes(payload: Dict[str, Any]) -> List[RecordChange]:
+    """从记录变更事件中取出变更列表，其他类型的事件返回空列表"""
+    header = payload.get("header") or {}
+    if header.get("event_type") != RECORD_CHANGED_EVENT:
+        return []
+    event = payload.get("event") or {}
+    app_token = event.get("file_token")
+    table_id = event.get("table_id")
+    if not app_token or not table_id:
+        return []
+    return [
+        RecordChange(app_token, table_id, action["record_id"], action.get("action") == "record_deleted")
+        for action in event.get("action_list") or []
+        if action.get("record_id")
+    ]
+
+
+_readers: Dict[str, FeishuBitableReader] = {}
+
+
+def _reader_for(app_id: str, app_secret: str) -> FeishuBitableReader:
+    """同一应用复用一个 reader (共享 token)"""
+    reader = _readers.get(app_id)
+    if reader is None:
+        reader = _readers[app_id] = FeishuBitableReader(app_id, app_secret)
+    return reader
+
+
+def apply_record_changes(changes: List[RecordChange]) -> Dict[str, Any]:
+    """回查变更记录的最新内容并替换对应的任务行
+
+    只处理 SYNC_SOURCES_FILE 中配置过的数据表。每张表一个事务，回查失败的表
+    抛出异常前不会写库。
+
+    Returns:
+        dict: records_upserted, records_deleted, tasks_written, ignored (未配置的表的变更数)
+    """
+    sources = {(src["app_token"], src["table_id"]): src for src in load_sync_sources()}
+    by_table: Dict[tuple, List[RecordChange]] = OrderedDict()
+    for change in changes:
+        by_table.setdefault((change.app_token, change.table_id), []).append(change)
+
+    summary = {"records_upserted": 0, "records_deleted": 0, "tasks_written": 0, "ignored": 0}
+    for (app_token, table_id), table_changes in by_table.items():
+        src = sources.get((app_token, table_id))
+        if src is None:
+            logger.warning("Ignoring %d changes of unconfigured table %s/%s", len(table_changes), app_token, table_id)
+            summary["ignored"] += len(table_changes)
+            continue
+
+        extractor = compile_field_extractor(src.get("field_mapping"))
+        reader = _reader_for(src.get("app_id") or os.getenv("FEISHU_APP_ID"),
+                             src.get("app_secret") or os.getenv("FEISHU_APP_SECRET"))
+        record_ids = [c.record_id for c in table_changes]
+        wanted = [c.record_id for c in table_changes if not c.deleted]
+        records = reader.get_records_by_ids(
+            app_token, table_id, wanted, None if SYNC_FETCH_ALL_FIELDS else list(extractor.field_names)
+        ) if wanted else []
+
+        hashes = {r.get("record_id", ""): record_content_hash(r, extractor) for r in records}
+        fetched = set(hashes)
+        with open_task_writer(src["name"]) as writer:
+            # 已删除 (回查不到) 的记录清空其任务，回查到的记录与已有任务合并写入
+            writer.replace_records([rid for rid in record_ids if rid not in fetched], {})
+            summary["tasks_written"] += write_changed_records(writer, records, extractor, hashes)
+            invalidate_dataset_hash(writer, app_token, table_id)
+        summary["records_upserted"] += len(records)
+        summary["records_deleted"] += len(record_ids) - len(records)
+
+    return summary
+
+
+class RecordChangeBatcher:
+    """记录变更队列: 按 (表, record_id) 合并，后台线程按窗口批量应用
+
+    同一条记录在窗口内多次变更只会回查一次，以最后一次动作为准。
+    """
+
+    def __init__(
+        self,
+        apply: Callable[[List[RecordChange]], Dict[str, Any]] = apply_record_changes,
+        window_seconds: float = EVENT_BATCH_WINDOW_SECONDS,
+        max_records: int = EVENT_BATCH_MAX_RECORDS
+    ):
+        self.apply = apply
+        self.window_seconds = window_seconds
+        self.max_records = max_records
+        self.pending: "OrderedDict[tuple, RecordChange]" = OrderedDict()
+        self.attempts: Dict[tuple, int] = {}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"received": 0, "batches": 0, "applied": 0, "failed_batches": 0, "dropped": 0}
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._run, name="feishu-events", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止后台线程，并应用队列中剩余的变更"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        while self.pending:
+            if self.flush() is None:
+                break
+
+    def submit(self, changes: List[RecordChange]):
+        with self.condition:
+            for change in changes:
+                key = (change.app_token, change.table_id, change.record_id)
+                self.pending.pop(key, None)
+                self.pending[key] = change
+            self.stats["received"] += len(changes)
+            self.condition.notify_all()
+
+    def _take_batch(self) -> List[RecordChange]:
+        with self.condition:
+            batch = []
+            while self.pending and len(batch) < self.max_records:
+                batch.append(self.pending.popitem(last=False)[1])
+            return batch
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """立即应用一批队列中的变更，失败的变更重新排队"""
+        batch = self._take_batch()
+        if not batch:
+            return None
+        try:
+            result = self.apply(batch)
+        except Exception as e:
+            logger.error("Failed to apply %d record changes: %s", len(batch), e)
+            self._requeue(batch)
+            with self.condition:
+                self.stats["failed_batches"] += 1
+            return None
+        with self.condition:
+            self.stats["batches"] += 1
+            self.stats["applied"] += len(batch)
+            for change in batch:
+                self.attempts.pop((change.app_token, change.table_id, change.record_id), None)
+        logger.info("Applied %d record changes from events: %s", len(batch), result)
+        return result
+
+    def _requeue(self, batch: List[RecordChange]):
+        with self.condition:
+            for change in batch:
+                key = (change.app_token, change.table_id, change.record_id)
+                if key in self.pending:
+                    continue  # 期间又收到了更新的变更
+                attempts = self.attempts.get(key, 0) + 1
+                if attempts > EVENT_MAX_RETRIES:
+                    self.attempts.pop(key, None)
+                    self.stats["dropped"] += 1
+                    logger.warning("Dropping change of record %s after %d attempts, periodic sync will pick it up",
+                                   change.record_id, EVENT_MAX_RETRIES)
+                    continue
+                self.attempts[key] = attempts
+                self.pending[key] = change
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                # 第一条变更到达后等待合并窗口，队列攒满时提前结束
+                self.condition.wait_for(
+                    lambda: not self.running or len(self.pending) >= self.max_records, timeout=self.window_seconds
+                )
+            while self.pending:
+                if self.flush() is None:
+                    break
+
+
+_batcher: Optional[RecordChangeBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_event_batcher() -> RecordChangeBatcher:
+    """进程内共享的变更队列，首次使用时启动后台线程"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = RecordChangeBatcher()
+            _batcher.start()
+        return _batcher
+
+
+def stop_event_batcher():
+    """应用剩余变更并停止后台线程 (服务关闭时调用)"""
+    global _batcher
+    with _batcher_lock:
+        batcher, _batcher = _batcher, None
+    if batcher is not None:
+        batcher.stop()
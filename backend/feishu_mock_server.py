@@ -0,0 +1,339 @@
+"""飞书开放平台本地替身服务 (离线压测用)
+
+模拟同步用到的接口:
+- POST /open-apis/auth/v3/tenant_access_token/internal/
+- GET  /open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records
+- POST /open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/search
+- POST /open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_get
+
+记录按序号确定性生成，不在内存中保存整张表，百万级数据也可以直接分页。
+支持 field_names 字段投影、search 的日期条件 (ExactDate)、gzip 压缩，
+以及注入延迟、429 限流和 500 错误。GET /__stats 返回请求数和发送字节数。
+
+用法:
+    python feishu_mock_server.py --records 100000 --port 8765 --latency-ms 50
+    FEISHU_BASE_URL=http://127.0.0.1:8765 python sync_once.py
+"""
+
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+from process_feishu_data import (
+    CUSTOMER_NAME_FIELD,
+    TASK_CONTENT_FIELD,
+    ASSIGNEE_FIELD,
+    PRIORITY_FIELD,
+    APPLICATION_STATUS_FIELD,
+    START_DATE_FIELD,
+    END_DATE_FIELD,
+)
+
+RECORDS_PATH = re.compile(r"^/open-apis/bitable/v1/apps/([^/]+)/tables/([^/]+)/records(/search|/batch_get)?$")
+FIELDS_PATH = re.compile(r"^/open-apis/bitable/v1/apps/([^/]+)/tables/([^/]+)/fields$")
+TOKEN_PATH = "/open-apis/auth/v3/tenant_access_token/internal/"
+
+CUSTOMERS = ["华东电力", "星河科技", "远航物流", "蓝海医疗", "北辰制造", "东方证券", "云帆教育", "山海能源"]
+CONTENTS = ["网络巡检", "服务器上架", "防火墙策略调整", "存储扩容", "系统升级", "故障排查", "驻场支持"]
+ENGINEERS = ["张三", "李四", "王五", "赵六", "钱七", "孙八", "周九", "吴十"]
+PRIORITIES = ["非常紧急", "紧急", "重要", "一般"]
+APPLICATION_STATUSES = ["审批中", "已通过", "已撤回", ""]
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def make_record(index: int, base_time_ms: int, long_span_rate: float = 0.01) -> Dict[str, Any]:
+    """按序号生成一条确定性的合成记录 (包含同步不需要的宽字段，用于衡量字段投影的收益)
+
+    各数据表生成的记录相同 (record_id 也相同)，多表同步时覆盖不同数据源之间 record_id 重复的情况
+    """
+    rng = random.Random(index)
+    start = base_time_ms + rng.randint(-180, 180) * DAY_MS + 9 * 3600 * 1000
+    if rng.random() < long_span_rate:
+        span_days = rng.randint(30, 400)
+    else:
+        span_days = rng.choice([0, 0, 0, 1, 1, 2, 4])
+    engineers = rng.sample(ENGINEERS, rng.choice([1, 1, 1, 2]))
+    fields = {
+        CUSTOMER_NAME_FIELD: rng.choice(CUSTOMERS) + f"{index % 997}",
+        TASK_CONTENT_FIELD: rng.choice(CONTENTS),
+        ASSIGNEE_FIELD: [{"id": f"ou_{name}", "name": name, "email": ""} for name in engineers],
+        PRIORITY_FIELD: rng.choice(PRIORITIES),
+        APPLICATION_STATUS_FIELD: rng.choice(APPLICATION_STATUSES),
+        START_DATE_FIELD: start,
+        END_DATE_FIELD: start + span_days * DAY_MS,
+        "备注": "现场情况说明" * rng.randint(5, 40),
+        "附件": [
+            {"file_token": f"box{index}_{n}", "name": f"现场照片{n}.jpg", "size": 204800, "type": "image/jpeg"}
+            for n in range(rng.randint(0, 3))
+        ],
+    }
+    return {
+        "record_id": f"rec{index:08d}",
+        "fields": fields,
+        "created_time": base_time_ms - 200 * DAY_MS + index,
+        "last_modified_time": base_time_ms - rng.randint(0, 30) * DAY_MS,
+    }
+
+
+def _condition_matches(record: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    """评估 search 接口的单个日期条件 (只支持 ExactDate，按天比较)"""
+    value = record["fields"].get(condition.get("field_name"))
+    if value is None:
+        value = record.get("last_modified_time")
+    operand = condition.get("value") or []
+    if len(operand) != 2 or operand[0] != "ExactDate":
+        return True
+    day = int(value) // DAY_MS
+    target = int(operand[1]) // DAY_MS
+    return {
+        "is": day == target,
+        "isGreater": day > target,
+        "isGreaterEqual": day >= target,
+        "isLess": day < target,
+        "isLessEqual": day <= target,
+    }.get(condition.get("operator"), True)
+
+
+class MockFeishuState:
+    """替身服务的数据集配置和统计"""
+
+    def __init__(
+        self,
+        records: int,
+        latency_ms: float = 0,
+        rate_429: float = 0,
+        fail_rate: float = 0,
+        base_time_ms: Optional[int] = None,
+        seed: int = 0
+    ):
+        self.records = records
+        self.latency_ms = latency_ms
+        self.rate_429 = rate_429
+        self.fail_rate = fail_rate
+        self.base_time_ms = base_time_ms or int(datetime.now().timestamp() * 1000)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "record_requests": 0, "records_served": 0,
+                      "bytes_sent": 0, "injected_429": 0, "injected_500": 0, "tokens_issued": 0}
+        # 已作废的 tenant_access_token: 带着它的请求与真实飞书一样返回 HTTP 400 + 99991663
+        self.revoked_tokens = set()
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def page(self, page_token: Optional[str], page_size: int, field_names: Optional[List[str]],
+             condition_filter: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """从 page_token (扫描起点序号) 开始取一页满足条件的记录"""
+        index = int(page_token) if page_token else 0
+        conditions = (condition_filter or {}).get("conditions") or []
+        items = []
+        while index < self.records and len(items) < page_size:
+            record = make_record(index, self.base_time_ms)
+            index += 1
+            if conditions and not all(_condition_matches(record, c) for c in conditions):
+                continue
+            if field_names:
+                record["fields"] = {k: v for k, v in record["fields"].items() if k in field_names}
+            items.append(record)
+        has_more = index < self.records
+        self.count("records_served", len(items))
+        return {
+            "code": 0,
+            "msg": "success",
+            "data": {
+                "items": items,
+                "has_more": has_more,
+                "page_token": str(index) if has_more else None,
+                "total": self.records,
+            }
+        }
+
+
+    def batch_get(self, record_ids: List[str], field_names: Optional[List[str]]) -> Dict[str, Any]:
+        """按 record_id 取记录 (record_id 末尾 8 位是序号)，超出范围的视为已删除"""
+        records = []
+        absent = []
+        for record_id in record_ids:
+            index = int(record_id[-8:]) if record_id[-8:].isdigit() else -1
+            record = make_record(index, self.base_time_ms) if 0 <= index < self.records else None
+            if record is None or record["record_id"] != record_id:
+                absent.append(record_id)
+                continue
+            if field_names:
+                record["fields"] = {k: v for k, v in record["fields"].items() if k in field_names}
+            records.append(record)
+        self.count("records_served", len(records))
+        return {"code": 0, "msg": "success", "data": {"records": records, "absent_record_ids": absent}}
+
+
+    def fields(self) -> Dict[str, Any]:
+        """合成数据表的字段元数据 (type 为多维表格字段类型编号)"""
+        types = [
+            (CUSTOMER_NAME_FIELD, 1), (TASK_CONTENT_FIELD, 1), (ASSIGNEE_FIELD, 11), (PRIORITY_FIELD, 3),
+            (APPLICATION_STATUS_FIELD, 3), (START_DATE_FIELD, 5), (END_DATE_FIELD, 5), ("备注", 1), ("附件", 17),
+        ]
+        items = [{"field_id": f"fld{n:04d}", "field_name": name, "type": field_type}
+                 for n, (name, field_type) in enumerate(types)]
+        return {"code": 0, "msg": "success", "data": {"items": items, "has_more": False, "total": len(items)}}
+
+
+class MockFeishuHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，与真实服务一致
+
+    @property
+    def state(self) -> MockFeishuState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count("bytes_sent", len(body))
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _inject_faults(self) -> bool:
+        """按配置注入延迟和错误，已返回错误响应时返回 True"""
+        state = self.state
+        if state.latency_ms:
+            time.sleep(state.latency_ms / 1000.0)
+        with state.lock:
+            roll = state.rng.random()
+        if roll < state.rate_429:
+            state.count("injected_429")
+            self._send_json(429, {"code": 99991400, "msg": "request trigger frequency limit"})
+            return True
+        if roll < state.rate_429 + state.fail_rate:
+            state.count("injected_500")
+            self._send_json(500, {"code": 1254290, "msg": "internal error"})
+            return True
+        return False
+
+    def _check_token(self) -> bool:
+        """校验 Authorization 头，已返回错误响应时返回 False"""
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer "):
+            self._send_json(400, {"code": 99991661, "msg": "missing access token"})
+            return False
+        if authorization[len("Bearer "):] in self.state.revoked_tokens:
+            self._send_json(400, {"code": 99991663, "msg": "Invalid access token for authorization"})
+            return False
+        return True
+
+    def _records(self, match, query: Dict[str, List[str]], body: Dict[str, Any]):
+        self.state.count("record_requests")
+        if not self._check_token():
+            return
+        if self._inject_faults():
+            return
+        if match.group(3) == "/batch_get":
+            self._send_json(200, self.state.batch_get(body.get("record_ids") or [], body.get("field_names")))
+            return
+        page_size = min(int(query.get("page_size", ["20"])[0]), 500)
+        page_token = query.get("page_token", [None])[0]
+        if match.group(3):
+            field_names = body.get("field_names")
+            condition_filter = body.get("filter")
+        else:
+            raw = query.get("field_names", [None])[0]
+            field_names = json.loads(raw) if raw else None
+            condition_filter = None
+        self._send_json(200, self.state.page(page_token, page_size, field_names, condition_filter))
+
+    def do_GET(self):
+        self.state.count("requests")
+        parsed = urlparse(self.path)
+        if parsed.path == "/__stats":
+            with self.state.lock:
+                stats = dict(self.state.stats)
+            self._send_json(200, stats)
+            return
+        match = RECORDS_PATH.match(parsed.path)
+        if match and not match.group(3):
+            self._records(match, parse_qs(parsed.query), {})
+            return
+        if FIELDS_PATH.match(parsed.path):
+            if self._check_token():
+                self._send_json(200, self.state.fields())
+            return
+        self._send_json(404, {"code": 404, "msg": "not found"})
+
+    def do_POST(self):
+        self.state.count("requests")
+        parsed = urlparse(self.path)
+        body = self._read_json()
+        if parsed.path == TOKEN_PATH:
+            self.state.count("tokens_issued")
+            self._send_json(200, {
+                "code": 0,
+                "msg": "ok",
+                "tenant_access_token": f"t-mock-{body.get('app_id', '')}-{self.state.stats['tokens_issued']}",
+                "expire": 7200
+            })
+            return
+        match = RECORDS_PATH.match(parsed.path)
+        if match and match.group(3):
+            self._records(match, parse_qs(parsed.query), body)
+            return
+        self._send_json(404, {"code": 404, "msg": "not found"})
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **options) -> ThreadingHTTPServer:
+    """在后台线程启动替身服务，返回 server (server.server_address 为实际监听地址)"""
+    server = ThreadingHTTPServer((host, port), MockFeishuHandler)
+    server.daemon_threads = True
+    server.state = MockFeishuState(**options)
+    thread = threading.Thread(target=server.serve_forever, name="feishu-mock", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="飞书开放平台本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--records", type=int, default=10000, help="合成记录数")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个记录请求的注入延迟 (毫秒)")
+    parser.add_argument("--rate-429", type=float, default=0, help="返回 429 的请求比例")
+    parser.add_argument("--fail-rate", type=float, default=0, help="返回 500 的请求比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_mock_server(
+        args.host, args.port,
+        records=args.records, latency_ms=args.latency_ms,
+        rate_429=args.rate_429, fail_rate=args.fail_rate, seed=args.seed
+    )
+    host, port = server.server_address[:2]
+    # 第一行输出监听地址，便于脚本读取
+    print(f"http://{host}:{port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,7 +1,12 @@
 import os
-import requests
+import json
 import time
-from typing import Dict, List, Any, Optional
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, List, Any, Optional, Iterator, Tuple
+from urllib.parse import urlparse
 import logging
 
 logging.basicConfig(
@@ -10,93 +15,469 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+class FeishuAPIError(Exception):
+    """飞书开放平台接口调用失败"""
+
+
+class FeishuRetryableError(FeishuAPIError):
+    """可重试的失败 (网络错误、超时、限流、服务端 5xx)"""
+
+
+# --- 连接与 token 缓存配置 ---
+# 飞书开放平台地址 (本地压测时可指向 feishu_mock_server.py)
+FEISHU_BASE_URL = os.getenv("FEISHU_BASE_URL", "https://open.feishu.cn")
+# 连接池大小 (同一进程内所有 reader 共享一个 Session)
+FEISHU_POOL_SIZE = int(os.getenv("FEISHU_POOL_SIZE", "10"))
+# tenant_access_token 磁盘缓存文件，按 app_id 存储，进程重启后仍可复用
+# 默认与数据库文件放在同一目录 (Docker 中该目录挂载为持久卷)
+TOKEN_CACHE_FILE = os.getenv(
+    "FEISHU_TOKEN_CACHE_FILE",
+    os.path.join(os.path.dirname(os.getenv("DB_FILE", "./data/db/tasks.db")), "feishu_token_cache.json")
+)
+# token 提前过期的秒数
+TOKEN_EXPIRE_MARGIN = 60
+# 表示 token 无效/过期的错误码，遇到时丢弃缓存重新获取
+TOKEN_INVALID_CODES = {99991663, 99991668}
+# 单页请求失败时的重试次数和指数退避参数 (秒)
+FEISHU_MAX_RETRIES = int(os.getenv("FEISHU_MAX_RETRIES", "5"))
+FEISHU_RETRY_BASE_SECONDS = float(os.getenv("FEISHU_RETRY_BASE_SECONDS", "1"))
+FEISHU_RETRY_MAX_SECONDS = 30.0
+# 飞书的频率限制错误码 (HTTP 200 或 429 返回)
+RATE_LIMIT_CODES = {99991400}
+# 客户端限速: 同一 app_id 每秒最多发出的记录请求数 (多表并行同步时共享，0 表示不限速)
+FEISHU_QPS_LIMIT = float(os.getenv("FEISHU_QPS_LIMIT", "10"))
+# records/batch_get 每次请求的 record_id 数量上限
+BATCH_GET_MAX_IDS = 100
+# --- 配置结束 ---
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# 进程内 token 缓存: {app_id: (token, expire_time)}
+_token_cache: Dict[str, Tuple[str, float]] = {}
+_token_lock = threading.Lock()
+
+
+class QpsLimiter:
+    """令牌桶限速器，线程安全
+
+    允许短时突发 burst 个请求，长期速率不超过 qps。
+    """
+
+    def __init__(self, qps: float, burst: Optional[int] = None):
+        self.qps = qps
+        self.capacity = float(burst if burst is not None else max(1, int(qps)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，必要时阻塞等待"""
+        if self.qps <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.qps)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.qps
+            time.sleep(wait)
+
+
+_limiters: Dict[str, QpsLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_qps_limiter(app_id: str) -> QpsLimiter:
+    """返回 app_id 对应的共享限速器 (飞书按应用限制调用频率)"""
+    with _limiters_lock:
+        limiter = _limiters.get(app_id)
+        if limiter is None:
+            limiter = QpsLimiter(FEISHU_QPS_LIMIT)
+            _limiters[app_id] = limiter
+        return limiter
+
+
+def get_session() -> requests.Session:
+    """返回进程内共享的 HTTP Session (keep-alive 连接池，请求 gzip 压缩)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=FEISHU_POOL_SIZE, pool_maxsize=FEISHU_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            _session = session
+        return _session
+
+
+def _load_token_cache_file() -> Dict[str, Any]:
+    try:
+        with open(TOKEN_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable token cache %s: %s", TOKEN_CACHE_FILE, e)
+        return {}
+
+
+def _save_token_cache_file(app_id: str, token: Optional[str], expire_time: float):
+    """写入 (或删除) 某个 app_id 的磁盘缓存，先写临时文件再替换，避免并发写出半个文件"""
+    try:
+        data = _load_token_cache_file()
+        if token:
+            data[app_id] = {"tenant_access_token": token, "expire_time": expire_time}
+        else:
+            data.pop(app_id, None)
+        cache_dir = os.path.dirname(TOKEN_CACHE_FILE)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, TOKEN_CACHE_FILE)
+    except OSError as e:
+        logger.warning("Failed to write token cache %s: %s", TOKEN_CACHE_FILE, e)
+
+
+def _get_cached_token(app_id: str) -> Optional[Tuple[str, float]]:
+    """依次查找进程内缓存和磁盘缓存，返回仍然有效的 (token, expire_time)"""
+    deadline = time.time() + TOKEN_EXPIRE_MARGIN
+    cached = _token_cache.get(app_id)
+    if cached and cached[1] > deadline:
+        return cached
+
+    entry = _load_token_cache_file().get(app_id)
+    if entry and entry.get("expire_time", 0) > deadline:
+        cached = (entry["tenant_access_token"], entry["expire_time"])
+        _token_cache[app_id] = cached
+        return cached
+    return None
+
+
 class FeishuBitableReader:
-    def __init__(self, app_id: str, app_secret: str, timeout: int = 15):
+    def __init__(
+        self,
+        app_id: str,
+        app_secret: str,
+        timeout: int = 15,
+        session: Optional[requests.Session] = None,
+        base_url: Optional[str] = None
+    ):
         self.app_id = app_id
         self.app_secret = app_secret
         self.timeout = timeout
+        self.base_url = (base_url or FEISHU_BASE_URL).rstrip("/")
+        self.limiter = get_qps_limiter(app_id)
+        self.session = session or get_session()
         self.access_token = None
         self.token_expire_time = 0
 
     def _get_tenant_access_token(self) -> Optional[str]:
-        """获取 tenant_access_token"""
-        # 检查缓存的 token 是否 still有效 (提前60秒过期)
-        if self.access_token and self.token_expire_time > time.time() + 60:
+        """获取 tenant_access_token
+
+        token 按 app_id 缓存在进程内和磁盘上，新建的 reader 以及新启动的同步进程
+        都会复用尚未过期的 token。
+        """
+        # 检查缓存的 token 是否仍然有效 (提前60秒过期)
+        if self.access_token and self.token_expire_time > time.time() + TOKEN_EXPIRE_MARGIN:
             logger.debug("Using cached tenant_access_token")
             return self.access_token
 
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal/"
-        payload = {
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
-        headers = {
-            "Content-Type": "application/json; charset=utf-8"
-        }
+        with _token_lock:
+            cached = _get_cached_token(self.app_id)
+            if cached:
+                logger.debug("Using shared cached tenant_access_token")
+                self.access_token, self.token_expire_time = cached
+                return self.access_token
+
+            url = f"{self.base_url}/open-apis/auth/v3/tenant_access_token/internal/"
+            payload = {
+                "app_id": self.app_id,
+                "app_secret": self.app_secret
+            }
+            headers = {
+                "Content-Type": "application/json; charset=utf-8"
+            }
+
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                result = response.json()
+
+                if result.get("code") == 0:
+                    self.access_token = result["tenant_access_token"]
+                    self.token_expire_time = time.time() + result["expire"]
+                    _token_cache[self.app_id] = (self.access_token, self.token_expire_time)
+                    _save_token_cache_file(self.app_id, self.access_token, self.token_expire_time)
+                    logger.info("Successfully obtained tenant_access_token, expires at %s", time.ctime(self.token_expire_time))
+                    return self.access_token
+                else:
+                    logger.error("Failed to get tenant_access_token: %s", result)
+                    return None
+
+            except Exception as e:
+                logger.exception("Exception while getting tenant_access_token: %s", e)
+                return None
+
+    def _invalidate_token(self):
+        """丢弃当前 token 的所有缓存 (服务端判定 token 无效时调用)"""
+        with _token_lock:
+            _token_cache.pop(self.app_id, None)
+            _save_token_cache_file(self.app_id, None, 0)
+        self.access_token = None
+        self.token_expire_time = 0
+
+    def _send(self, method: str, url: str, token: str, **kwargs) -> Dict[str, Any]:
+        """带上 token 发出一个开放平台请求 (经过限速)，返回分类后的 JSON 响应
+
+        先按响应体中的错误码分类，再看 HTTP 状态码: 飞书对无效/过期的 token
+        (TOKEN_INVALID_CODES) 返回 HTTP 4xx，响应体中仍带有错误码，这类响应原样返回，
+        由 _call_with_token 刷新 token 后重试。
+
+        Raises:
+            FeishuRetryableError: 网络错误、超时、HTTP 429/5xx 或限流错误码
+            FeishuAPIError: 其他 HTTP 错误或响应无法解析
+        """
+        action = f"{method} {urlparse(url).path}"
+        headers = {"Authorization": f"Bearer {token}"}
+        self.limiter.acquire()
+        try:
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise FeishuRetryableError(f"Network error on {action}: {e}") from e
 
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=self.timeout)
-            response.raise_for_status()
             result = response.json()
+        except ValueError:
+            result = None
+        code = result.get("code") if isinstance(result, dict) else None
 
-            if result.get("code") == 0:
-                self.access_token = result["tenant_access_token"]
-                self.token_expire_time = time.time() + result["expire"]
-                logger.info("Successfully obtained tenant_access_token, expires at %s", time.ctime(self.token_expire_time))
-                return self.access_token
-            else:
-                logger.error("Failed to get tenant_access_token: %s", result)
-                return None
+        if code in RATE_LIMIT_CODES:
+            raise FeishuRetryableError(f"Rate limited on {action}: {result.get('msg')}")
+        if code in TOKEN_INVALID_CODES:
+            return result
+        if response.status_code == 429 or response.status_code >= 500:
+            raise FeishuRetryableError(f"HTTP {response.status_code} on {action}")
+        if response.status_code >= 400 or code is None:
+            raise FeishuAPIError(f"HTTP {response.status_code} on {action}: {result or response.text[:200]}")
+        return result
+
+    def _call_with_token(self, request: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """调用 request(token) 并返回 code 为 0 的响应
 
-        except Exception as e:
-            logger.exception("Exception while getting tenant_access_token: %s", e)
-            return None
+        可重试的错误按指数退避重试 FEISHU_MAX_RETRIES 次；token 被服务端作废时
+        丢弃缓存、刷新一次后重试。
 
-    def get_records(self, app_token: str, table_id: str, page_size: int = 100) -> List[Dict[str, Any]]:
-        """获取多维表格中的所有记录"""
+        Raises:
+            FeishuAPIError: 获取 token 失败、刷新后仍被拒绝、重试后仍然失败或返回其他错误码
+        """
         token = self._get_tenant_access_token()
         if not token:
-            logger.error("Failed to get access token, cannot fetch records")
-            return []
+            raise FeishuAPIError("Failed to get access token")
+        result = self._with_retry(request, token)
 
-        records = []
-        page_token = None
+        if result.get("code") in TOKEN_INVALID_CODES:
+            # 缓存的 token 已被服务端作废，刷新一次后重试
+            logger.warning("Cached tenant_access_token rejected (%s), refreshing", result.get("code"))
+            self._invalidate_token()
+            token = self._get_tenant_access_token()
+            if not token:
+                raise FeishuAPIError("Failed to refresh access token")
+            result = self._with_retry(request, token)
+
+        if result.get("code") != 0:
+            raise FeishuAPIError(f"Feishu API request failed: {result}")
+        return result
+
+    def _with_retry(self, request, *args) -> Dict[str, Any]:
+        """调用 request(*args)，FeishuRetryableError 按指数退避重试 FEISHU_MAX_RETRIES 次"""
+        attempt = 0
+        while True:
+            try:
+                return request(*args)
+            except FeishuRetryableError as e:
+                if attempt >= FEISHU_MAX_RETRIES:
+                    raise
+                delay = min(FEISHU_RETRY_BASE_SECONDS * (2 ** attempt), FEISHU_RETRY_MAX_SECONDS)
+                delay *= random.uniform(0.5, 1.0)  # 抖动，避免多个任务同时重试
+                attempt += 1
+                logger.warning("%s; retry %d/%d in %.1fs", e, attempt, FEISHU_MAX_RETRIES, delay)
+                time.sleep(delay)
+
+    def _request_page(
+        self,
+        app_token: str,
+        table_id: str,
+        page_size: int,
+        page_token: Optional[str],
+        filter: Optional[Dict[str, Any]],
+        field_names: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """请求一页记录，返回飞书接口的原始 JSON (错误分类和 token 刷新见 _send、_call_with_token)"""
+        url = f"{self.base_url}/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        params = {"page_size": page_size}
+        if page_token:
+            params["page_token"] = page_token
+
+        if filter is None:
+            params["automatic_fields"] = "true"
+            if field_names:
+                params["field_names"] = json.dumps(field_names, ensure_ascii=False)
+            return self._call_with_token(lambda token: self._send("GET", url, token, params=params))
+        body = {"filter": filter, "automatic_fields": True}
+        if field_names:
+            body["field_names"] = field_names
+        return self._call_with_token(lambda token: self._send("POST", f"{url}/search", token, params=params, json=body))
+
+    def _request_batch_get(
+        self,
+        app_token: str,
+        table_id: str,
+        record_ids: List[str],
+        field_names: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """按 record_id 批量获取记录 (records/batch_get)"""
+        url = f"{self.base_url}/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_get"
+        body = {"record_ids": record_ids, "automatic_fields": True}
+        if field_names:
+            body["field_names"] = field_names
+        return self._call_with_token(lambda token: self._send("POST", url, token, json=body))
+
+    def _request_fields(self, app_token: str, table_id: str, page_token: Optional[str]) -> Dict[str, Any]:
+        """请求一页字段元数据 (fields)"""
+        url = f"{self.base_url}/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/fields"
+        params = {"page_size": 100}
+        if page_token:
+            params["page_token"] = page_token
+        return self._call_with_token(lambda token: self._send("GET", url, token, params=params))
+
+    def iter_pages(
+        self,
+        app_token: str,
+        table_id: str,
+        page_size: int = 100,
+        filter: Optional[Dict[str, Any]] = None,
+        page_token: Optional[str] = None,
+        field_names: Optional[List[str]] = None
+    ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """逐页获取记录，产出 (本页记录, 下一页的 page_token)
+
+        下一页的 page_token 为 None 表示已经是最后一页。把它保存下来，
+        之后通过 page_token 参数即可从断点继续拉取。
+
+        Raises:
+            FeishuAPIError: 获取 token 失败，或某一页重试后仍然失败
+        """
         has_more = True
+        fetched = 0
 
         while has_more:
-            url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records"
-            params = {"page_size": page_size}
-            if page_token:
-                params["page_token"] = page_token
-                
-            headers = {
-                "Authorization": f"Bearer {token}"
-            }
+            result = self._request_page(app_token, table_id, page_size, page_token, filter, field_names)
+            data = result.get("data", {})
+            items = data.get("items") or []
+            fetched += len(items)
+            logger.debug("Fetched %d records, total so far: %d", len(items), fetched)
 
-            try:
-                response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
-                response.raise_for_status()
-                result = response.json()
+            # 检查是否还有更多数据
+            has_more = data.get("has_more", False)
+            page_token = data.get("page_token") if has_more else None
+            yield items, page_token
 
-                if result.get("code") == 0:
-                    items = result.get("data", {}).get("items", [])
-                    records.extend(items)
-                    logger.debug("Fetched %d records, total so far: %d", len(items), len(records))
-                    
-                    # 检查是否还有更多数据
-                    page_token = result.get("data", {}).get("page_token")
-                    has_more = result.get("data", {}).get("has_more", False)
-                else:
-                    logger.error("Failed to fetch records: %s", result)
-                    break
+        logger.info("Finished fetching all records. Total: %d", fetched)
 
-            except Exception as e:
-                logger.exception("Exception while fetching records: %s", e)
-                break
-                
-        logger.info("Finished fetching all records. Total: %d", len(records))
+    def iter_record_pages(
+        self,
+        app_token: str,
+        table_id: str,
+        page_size: int = 100,
+        filter: Optional[Dict[str, Any]] = None,
+        field_names: Optional[List[str]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """逐页获取多维表格记录的生成器，每次产出一页记录
+
+        调用方可以边拉取边处理，不必等全表下载完成，内存占用与表大小无关。
+
+        Args:
+            page_size: 每页记录数 (飞书上限 500)
+            filter: 可选的服务端筛选条件 (search 接口的 filter 结构)。
+                    提供时改用 records/search 接口，只返回满足条件的记录。
+            field_names: 可选的字段列表，只下载这些字段 (不传则返回全部字段)
+
+        返回的记录带有 created_time / last_modified_time (automatic_fields)，
+        供增量同步计算高水位。
+
+        Raises:
+            FeishuAPIError: 获取 token 失败，或某一页重试后仍然失败 (已产出的页不受影响)
+        """
+        for items, _ in self.iter_pages(app_token, table_id, page_size=page_size, filter=filter, field_names=field_names):
+            yield items
+
+    def get_records(
+        self,
+        app_token: str,
+        table_id: str,
+        page_size: int = 100,
+        filter: Optional[Dict[str, Any]] = None,
+        field_names: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """获取多维表格中的所有记录 (参数含义同 iter_record_pages)
+
+        只返回完整的结果: 任何一页最终失败都返回空列表，不会返回部分数据。
+        """
+        records = []
+        try:
+            for items in self.iter_record_pages(app_token, table_id, page_size=page_size, filter=filter, field_names=field_names):
+                records.extend(items)
+        except FeishuAPIError as e:
+            logger.error("Fetch incomplete after %d records, discarding: %s", len(records), e)
+            return []
         return records
 
+    def get_records_by_ids(
+        self,
+        app_token: str,
+        table_id: str,
+        record_ids: List[str],
+        field_names: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """按 record_id 获取记录 (每批最多 BATCH_GET_MAX_IDS 条)
+
+        已被删除或无权访问的记录不会出现在结果中。
+
+        Raises:
+            FeishuAPIError: 获取 token 失败，或某一批重试后仍然失败
+        """
+        records = []
+        for start in range(0, len(record_ids), BATCH_GET_MAX_IDS):
+            batch = record_ids[start:start + BATCH_GET_MAX_IDS]
+            result = self._request_batch_get(app_token, table_id, batch, field_names)
+            records.extend(result.get("data", {}).get("records") or [])
+        return records
+
+    def get_fields(self, app_token: str, table_id: str) -> List[Dict[str, Any]]:
+        """获取数据表的字段元数据 (field_name、type 等)，用于校验字段映射
+
+        Raises:
+            FeishuAPIError: 获取 token 失败，或请求重试后仍然失败
+        """
+        fields = []
+        page_token = None
+        while True:
+            data = self._request_fields(app_token, table_id, page_token).get("data", {})
+            fields.extend(data.get("items") or [])
+            if not data.get("has_more"):
+                return fields
+            page_token = data.get("page_token")
+
+
 if __name__ == "__main__":
     CONFIG = {
         "app_id": os.getenv("FEISHU_APP_ID"),
@@ -0,0 +1,678 @@
+"""飞书数据同步流程
+
+sync_once.py、sync_feishu_to_db.py 和 main.py 的 /api/sync 共用此模块。
+
+同步模式:
+- full: 拉取全表，更新内容变化的记录并删除飞书侧已删除的记录
+- incremental: 只处理上次同步之后修改过的记录 (高水位 = 见到的最大 last_modified_time)，
+  按 record_id 替换对应的任务行。距上次全量同步超过 FULL_SYNC_INTERVAL_HOURS 时
+  自动改为全量同步，用于清理飞书侧删除的记录。
+
+两种模式都按页流水线执行: 后台线程预取下一页的同时，当前页在主线程完成转换并写入
+同一个数据库事务，网络等待与处理/写库重叠，内存占用只与页大小有关。
+
+任务按 TASK_STORAGE_MODE 写入 tasks 表 (每天一行) 或 task_intervals 表 (每条记录一行)。
+
+每条记录按处理用到的字段计算内容哈希 (record_hashes 表)，哈希未变的记录不重新转换和写入；
+全量同步时整表哈希与上次相同则不做任何写入。
+
+每拉到一页就追加到断点文件 (SyncCheckpoint)。拉取中途失败时数据库事务整体回滚，
+tasks 表保持原样；下次同步先回放断点文件中的页，再从保存的 page_token 继续拉取。
+"""
+
+import os
+import json
+import time
+import hashlib
+import queue
+import threading
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Iterator, Iterable, Tuple
+
+from feishu_reader import FeishuBitableReader, FeishuAPIError
+from concurrent.futures import ThreadPoolExecutor
+
+from field_schema import FieldExtractor, FieldSchemaError, compile_field_extractor
+from process_feishu_data import (
+    MAX_EXPANSION_DAYS, build_task_intervals, expand_task_intervals, record_content_hash, split_oversized_intervals
+)
+from task_db import DB_FILE, DEFAULT_SOURCE, TASK_STORAGE_MODE, TaskWriter, open_task_writer, get_sync_state, set_sync_state
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# --- 配置部分 ---
+# 默认同步模式: incremental 或 full
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")
+# 增量模式下每隔多少小时做一次全量对账 (清理飞书侧删除的记录)
+FULL_SYNC_INTERVAL_HOURS = float(os.getenv("FULL_SYNC_INTERVAL_HOURS", "24"))
+# 飞书表中「修改时间」类型字段的名称。配置后增量同步会把时间条件下推到飞书服务端，
+# 只下载修改过的记录；未配置时仍需拉取全表，但只处理和写入修改过的记录。
+LAST_MODIFIED_FIELD = os.getenv("FEISHU_LAST_MODIFIED_FIELD", "")
+# 只下载处理时用到的字段 (字段映射中的字段)；设为 true 时下载全部字段
+SYNC_FETCH_ALL_FIELDS = os.getenv("SYNC_FETCH_ALL_FIELDS", "false").lower() == "true"
+# 同步窗口: 只同步服务开始时间在今天前后 N 个月内的记录 (0 表示不限制)。
+# 条件下推到飞书服务端执行，全量同步后窗口外的旧任务会从数据库中移除。
+SYNC_WINDOW_MONTHS = int(os.getenv("SYNC_WINDOW_MONTHS", "0"))
+# 每页记录数 (飞书上限 500)
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+# 预取队列深度: 处理当前页时最多提前拉取的页数
+SYNC_PREFETCH_PAGES = int(os.getenv("SYNC_PREFETCH_PAGES", "2"))
+# 断点文件目录 (默认与数据库文件同目录)，以及断点的有效期 (飞书的 page_token 不会长期有效)
+SYNC_CHECKPOINT_DIR = os.getenv("SYNC_CHECKPOINT_DIR", os.path.join(os.path.dirname(DB_FILE), "sync_checkpoints"))
+SYNC_CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("SYNC_CHECKPOINT_MAX_AGE_HOURS", "6"))
+# 多表同步的数据源配置文件；不存在时只同步环境变量中配置的一张表
+SYNC_SOURCES_FILE = os.getenv("SYNC_SOURCES_FILE", "sync_sources.json")
+# 多表同步时同时拉取的表数量上限
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "4"))
+# 高水位回退量，避免时钟误差或同一毫秒内的修改被漏掉 (重复处理是幂等的)
+WATERMARK_OVERLAP_MS = 5 * 60 * 1000
+# 同步摘要中列出的超出展开预算的记录数上限
+OVERSIZED_REPORT_LIMIT = 20
+# 全量同步何时在影子表中重建任务 (写完整表后一次性替换，见 task_db.TaskWriter):
+# auto 在首次同步或字段映射变化 (所有记录都要重写) 时重建，always 每次全量同步都重建，never 总是合并写入
+SYNC_FULL_REBUILD = os.getenv("SYNC_FULL_REBUILD", "auto")
+# --- 配置结束 ---
+
+
+def _state_key(name: str, app_token: str, table_id: str) -> str:
+    return f"{name}:{app_token}:{table_id}"
+
+
+def _max_modified_time(records: List[Dict[str, Any]]) -> Optional[int]:
+    """返回记录中最大的 last_modified_time (毫秒)，没有该字段时返回 None"""
+    times = [r["last_modified_time"] for r in records if isinstance(r.get("last_modified_time"), (int, float))]
+    return int(max(times)) if times else None
+
+
+def _date_condition(field_name: str, operator: str, day: datetime) -> Dict[str, Any]:
+    """构造 search 接口的日期条件 (按天比较)"""
+    day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "field_name": field_name,
+        "operator": operator,
+        "value": ["ExactDate", str(int(day_start.timestamp() * 1000))]
+    }
+
+
+def _shift_months(day: datetime, months: int) -> datetime:
+    """日期加减整月，月末日期自动收缩到目标月份的最后一天"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month_first = datetime(year + month // 12, month % 12 + 1, 1)
+    last_day = (next_month_first - timedelta(days=1)).day
+    return day.replace(year=year, month=month, day=min(day.day, last_day))
+
+
+def _window_filter(months: int, start_date_field: str) -> Dict[str, Any]:
+    """构造同步窗口条件: 服务开始时间在今天前后 months 个月之内"""
+    today = datetime.now()
+    return {
+        "conjunction": "and",
+        "conditions": [
+            _date_condition(start_date_field, "isGreaterEqual", _shift_months(today, -months)),
+            _date_condition(start_date_field, "isLessEqual", _shift_months(today, months)),
+        ]
+    }
+
+
+def _combine_filters(*filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """把多个 and 条件组合并为一个，全部为空时返回 None"""
+    conditions = []
+    for f in filters:
+        if f:
+            conditions.extend(f["conditions"])
+    if not conditions:
+        return None
+    return {"conjunction": "and", "conditions": conditions}
+
+
+def _modified_since_filter(since_ms: int) -> Dict[str, Any]:
+    """构造 search 接口的筛选条件: 修改时间晚于 since_ms
+
+    飞书的日期条件按天比较，这里向前多取一天，再由客户端按毫秒精确过滤。
+    """
+    since_day = datetime.fromtimestamp(since_ms / 1000.0) - timedelta(days=1)
+    return {
+        "conjunction": "and",
+        "conditions": [_date_condition(LAST_MODIFIED_FIELD, "isGreater", since_day)]
+    }
+
+
+class SyncCheckpoint:
+    """页级同步断点
+
+    文件为 JSON Lines: 第一行是头部 (本次拉取的参数指纹和创建时间)，之后每行一页:
+    {"items": [...], "next_page_token": "..."}。只有参数指纹一致且未过期的断点才会被回放。
+    """
+
+    def __init__(self, key: str, fingerprint: Dict[str, Any]):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(SYNC_CHECKPOINT_DIR, f"{digest}.jsonl")
+        self.fingerprint = fingerprint
+
+    def load(self) -> Optional[Tuple[int, Optional[str]]]:
+        """检查断点是否可用，返回 (已保存页数, 下一页 page_token)；不可用时删除断点并返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        pages = 0
+        next_page_token = None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get("fingerprint") != self.fingerprint:
+                    raise ValueError("fingerprint mismatch")
+                if time.time() - header.get("created_at", 0) > SYNC_CHECKPOINT_MAX_AGE_HOURS * 3600:
+                    raise ValueError("checkpoint expired")
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # 写入中途中断的最后一行，丢弃
+                    next_page_token = json.loads(line)["next_page_token"]
+                    pages += 1
+        except (OSError, ValueError, KeyError) as e:
+            logger.info("Discarding sync checkpoint %s: %s", self.path, e)
+            self.clear()
+            return None
+        if pages == 0:
+            return None
+        return pages, next_page_token
+
+    def replay(self, pages: int) -> Iterator[List[Dict[str, Any]]]:
+        """按顺序产出断点中保存的前 pages 页记录"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for _ in range(pages):
+                yield json.loads(f.readline())["items"]
+
+    def start(self):
+        """新建断点文件 (覆盖旧文件)"""
+        os.makedirs(SYNC_CHECKPOINT_DIR, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"fingerprint": self.fingerprint, "created_at": time.time()}) + "\n")
+
+    def append(self, items: List[Dict[str, Any]], next_page_token: Optional[str]):
+        """追加一页已成功拉取的记录"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"items": items, "next_page_token": next_page_token}, ensure_ascii=False) + "\n")
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _checkpointed_pages(
+    reader: FeishuBitableReader,
+    checkpoint: SyncCheckpoint,
+    app_token: str,
+    table_id: str,
+    record_filter: Optional[Dict[str, Any]],
+    field_names: Optional[List[str]],
+    summary: Dict[str, Any]
+) -> Iterator[List[Dict[str, Any]]]:
+    """先回放断点中的页，再从断点的 page_token 继续拉取，新拉到的页同时写入断点"""
+    resume = checkpoint.load()
+    page_token = None
+    if resume is None:
+        checkpoint.start()
+    else:
+        saved_pages, page_token = resume
+        logger.info("Resuming sync from checkpoint: replaying %d saved pages", saved_pages)
+        for items in checkpoint.replay(saved_pages):
+            summary["resumed_pages"] += 1
+            yield items
+        if page_token is None:
+            return  # 上次已拉取完整，只是写库失败
+
+    live_pages = 0
+    try:
+        for items, next_page_token in reader.iter_pages(
+            app_token, table_id, page_size=SYNC_PAGE_SIZE, filter=record_filter,
+            page_token=page_token, field_names=field_names
+        ):
+            checkpoint.append(items, next_page_token)
+            live_pages += 1
+            yield items
+    except FeishuAPIError:
+        if resume is not None and live_pages == 0:
+            # 断点保存的 page_token 可能已失效，丢弃断点，下次从头拉取
+            checkpoint.clear()
+        raise
+
+
+def prefetch_pages(pages: Iterable[List[Dict[str, Any]]], depth: int = SYNC_PREFETCH_PAGES) -> Iterator[List[Dict[str, Any]]]:
+    """在后台线程中迭代 pages，最多提前缓冲 depth 页
+
+    生产者抛出的异常会在消费者一侧原样抛出。
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(depth, 1))
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                buffer.put(page)
+        except BaseException as e:  # 交给消费者线程处理
+            buffer.put(e)
+            return
+        buffer.put(done)
+
+    thread = threading.Thread(target=produce, name="feishu-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # 消费者提前退出时腾出队列空间，让生产者线程能够结束
+        while thread.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                thread.join(timeout=0.1)
+
+
+def write_changed_records(
+    writer: TaskWriter,
+    records: List[Dict[str, Any]],
+    extractor: FieldExtractor,
+    hashes: Dict[str, str]
+) -> int:
+    """按 TASK_STORAGE_MODE 转换记录并替换它们的任务，返回写入行数
+
+    按天存储时，展开天数超过 MAX_EXPANSION_DAYS 的记录 (如结束日期误填成几十年后) 改存为区间，
+    查询时按日期范围展开。
+    """
+    record_ids = [r.get("record_id", "") for r in records]
+    intervals = build_task_intervals(records, extractor)
+    if TASK_STORAGE_MODE == "interval":
+        return writer.replace_record_intervals(record_ids, intervals, hashes)
+    intervals, oversized = split_oversized_intervals(intervals)
+    for interval in oversized:
+        logger.warning("Record %s of source '%s' spans %s..%s, stored as an interval instead of daily rows",
+                       interval["record_id"], writer.source, interval["first_date"], interval["last_date"])
+    return writer.replace_records(record_ids, expand_task_intervals(intervals), hashes, intervals=oversized)
+
+
+class DatasetHash:
+    """整表内容哈希: 各记录 (record_id, 内容哈希) 的摘要之和，与记录顺序无关"""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def update(self, records: List[Dict[str, Any]], extractor: FieldExtractor) -> Dict[str, str]:
+        """累加一批记录，返回这批记录的内容哈希 {record_id: hash}"""
+        hashes = {}
+        for record in records:
+            record_id = record.get("record_id", "")
+            content_hash = hashes[record_id] = record_content_hash(record, extractor)
+            digest = hashlib.sha1(f"{record_id}:{content_hash}".encode("utf-8")).digest()
+            self.total = (self.total + int.from_bytes(digest, "big")) % (1 << 160)
+        self.count += len(records)
+        return hashes
+
+    def hexdigest(self) -> str:
+        return f"{self.count}:{self.total:040x}"
+
+
+def _compile_extractor(
+    reader: FeishuBitableReader,
+    app_token: str,
+    table_id: str,
+    field_mapping: Optional[Dict[str, Any]]
+) -> FieldExtractor:
+    """编译数据源的字段映射并按数据表的字段元数据校验，取不到元数据 (如缺少权限) 时跳过校验
+
+    Raises:
+        FieldSchemaError: 映射配置无效，或映射的字段不存在 / 类型不兼容
+    """
+    try:
+        field_meta = reader.get_fields(app_token, table_id)
+    except FeishuAPIError as e:
+        logger.warning("Could not fetch field metadata of table %s, skipping mapping validation: %s", table_id, e)
+        field_meta = None
+    return compile_field_extractor(field_mapping, field_meta)
+
+
+def invalidate_dataset_hash(writer: TaskWriter, app_token: str, table_id: str):
+    """增量同步或事件推送改写了记录后，在同一写入事务中调用: 整表哈希只在全量同步时更新，
+    此后库中内容已不同于它，不清除的话，记录在下次全量同步前被改回原样时会被当作「整表未变化」而跳过"""
+    writer.set_sync_state(_state_key("dataset_hash", app_token, table_id), None)
+
+
+def _finish_unchanged(
+    summary: Dict[str, Any],
+    checkpoint: "SyncCheckpoint",
+    dataset: DatasetHash,
+    last_full_key: str
+) -> Dict[str, Any]:
+    """全量同步拉到的数据与上次完全相同: 不写库，只记录本次全量同步时间"""
+    checkpoint.clear()
+    set_sync_state(last_full_key, str(time.time()))
+    summary["records_fetched"] = dataset.count
+    summary["records_skipped"] = dataset.count
+    summary["success"] = True
+    summary["message"] = f"{summary['mode']} sync finished: dataset unchanged since last sync"
+    logger.info("Sync of source '%s' finished: dataset of %d records unchanged, nothing written",
+                summary["source"], dataset.count)
+    return summary
+
+
+def _choose_mode(mode: str, watermark: Optional[int], last_full_sync: Optional[float]) -> str:
+    """决定本次实际执行的同步模式"""
+    if mode == "full":
+        return "full"
+    if watermark is None or last_full_sync is None:
+        logger.info("No watermark recorded yet, falling back to full sync.")
+        return "full"
+    if time.time() - last_full_sync > FULL_SYNC_INTERVAL_HOURS * 3600:
+        logger.info("Last full sync is older than %.1f hours, running full reconcile.", FULL_SYNC_INTERVAL_HOURS)
+        return "full"
+    return "incremental"
+
+
+def run_sync(
+    app_id: Optional[str] = None,
+    app_secret: Optional[str] = None,
+    app_token: Optional[str] = None,
+    table_id: Optional[str] = None,
+    mode: Optional[str] = None,
+    reader: Optional[FeishuBitableReader] = None,
+    source: str = DEFAULT_SOURCE,
+    field_mapping: Optional[Dict[str, Any]] = None,
+    write_lock: Optional[threading.Lock] = None
+) -> Dict[str, Any]:
+    """从飞书同步一次数据到数据库
+
+    未传入的参数从环境变量 FEISHU_APP_ID / FEISHU_APP_SECRET / FEISHU_APP_TOKEN / FEISHU_TABLE_ID 读取。
+
+    Args:
+        mode: "incremental" 或 "full"，默认取 SYNC_MODE
+        source: 数据源名称，写入的任务以此标记，全量同步只替换该数据源的任务
+        field_mapping: 字段映射覆盖项 (见 field_schema.py)，同步前按数据表的字段元数据校验
+        write_lock: 多表并行同步时共享的写锁。提供时先把全部页拉取到断点文件，
+                    再持锁回放写库，避免拉取期间长时间占用 SQLite 的写锁。
+                    全量同步不论是否提供写锁都先拉取完整，整表内容与上次相同时不写库
+
+    Returns:
+        dict: 同步摘要 (success, source, mode, records_fetched, records_changed, records_skipped,
+              records_deleted, records_oversized, oversized_records, tasks_written, pages,
+              resumed_pages, task_rows, rebuilt, message)。records_oversized / oversized_records 为按天存储模式下
+              超出 MAX_EXPANSION_DAYS、改存为区间的记录数和其中跨度最长的几条；
+              task_rows 为合并写入 tasks 表的新增 / 更新 / 删除 / 未变化行数；
+              rebuilt 表示本次在影子表中重建了任务
+    """
+    app_id = app_id or os.getenv("FEISHU_APP_ID")
+    app_secret = app_secret or os.getenv("FEISHU_APP_SECRET")
+    app_token = app_token or os.getenv("FEISHU_APP_TOKEN")
+    table_id = table_id or os.getenv("FEISHU_TABLE_ID")
+    if reader is None:
+        reader = FeishuBitableReader(app_id, app_secret)
+
+    watermark_key = _state_key("watermark", app_token, table_id)
+    last_full_key = _state_key("last_full_sync", app_token, table_id)
+    fingerprint_key = _state_key("field_fingerprint", app_token, table_id)
+    watermark_value = get_sync_state(watermark_key)
+    last_full_value = get_sync_state(last_full_key)
+    watermark = int(watermark_value) if watermark_value else None
+    last_full_sync = float(last_full_value) if last_full_value else None
+
+    actual_mode = _choose_mode(mode or SYNC_MODE, watermark, last_full_sync)
+    summary = {
+        "success": False,
+        "source": source,
+        "mode": actual_mode,
+        "records_fetched": 0,
+        "records_changed": 0,
+        "tasks_written": 0,
+        "records_skipped": 0,
+        "records_deleted": 0,
+        "records_oversized": 0,
+        "oversized_records": [],
+        "task_rows": {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0},
+        "rebuilt": False,
+        "pages": 0,
+        "resumed_pages": 0,
+        "message": ""
+    }
+
+    try:
+        extractor = _compile_extractor(reader, app_token, table_id, field_mapping)
+    except FieldSchemaError as e:
+        logger.error("Sync of source '%s' aborted: %s", source, e)
+        summary["message"] = str(e)
+        return summary
+
+    if actual_mode == "incremental":
+        since_ms = watermark - WATERMARK_OVERLAP_MS
+        modified_filter = _modified_since_filter(since_ms) if LAST_MODIFIED_FIELD else None
+    else:
+        since_ms = None
+        modified_filter = None
+    window_filter = _window_filter(SYNC_WINDOW_MONTHS, extractor.mapping["start_date"]) if SYNC_WINDOW_MONTHS > 0 else None
+    record_filter = _combine_filters(modified_filter, window_filter)
+    field_names = None if SYNC_FETCH_ALL_FIELDS else list(extractor.field_names)
+    # 区间存储模式不写 tasks 表，不需要重建
+    rebuild = actual_mode == "full" and TASK_STORAGE_MODE != "interval" and (
+        SYNC_FULL_REBUILD == "always"
+        or (SYNC_FULL_REBUILD == "auto" and get_sync_state(fingerprint_key) != extractor.fingerprint)
+    )
+
+    checkpoint = SyncCheckpoint(
+        _state_key("checkpoint", app_token, table_id),
+        {"mode": actual_mode, "filter": record_filter, "field_names": field_names, "page_size": SYNC_PAGE_SIZE}
+    )
+    pages = _checkpointed_pages(reader, checkpoint, app_token, table_id, record_filter, field_names, summary)
+    max_modified = None
+
+    dataset_key = _state_key("dataset_hash", app_token, table_id)
+    dataset = DatasetHash()
+
+    try:
+        fetch_first = write_lock is not None or actual_mode == "full"
+        if write_lock is None:
+            write_lock = nullcontext()
+        if not fetch_first:
+            # 单表增量同步: 边拉取边写库
+            pages = prefetch_pages(pages)
+        else:
+            # 先完整拉取到断点文件，拉取期间不占用数据库
+            for _ in pages:
+                pass
+            saved = checkpoint.load()
+            saved_pages = saved[0] if saved else 0
+            if actual_mode == "full" and saved_pages:
+                # 整表内容与上次全量同步完全一致时直接结束，不打开写事务
+                for raw_records in checkpoint.replay(saved_pages):
+                    dataset.update(raw_records, extractor)
+                if dataset.hexdigest() == get_sync_state(dataset_key):
+                    with write_lock:
+                        return _finish_unchanged(summary, checkpoint, dataset, last_full_key)
+                dataset = DatasetHash()
+            pages = checkpoint.replay(saved_pages)
+
+        with write_lock, open_task_writer(source, rebuild=rebuild) as writer:
+            for raw_records in pages:
+                summary["pages"] += 1
+                summary["records_fetched"] += len(raw_records)
+
+                if actual_mode == "full":
+                    writer.mark_seen([r.get("record_id", "") for r in raw_records])
+                    candidates = raw_records
+                else:
+                    candidates = [
+                        r for r in raw_records
+                        if not isinstance(r.get("last_modified_time"), (int, float)) or r["last_modified_time"] > since_ms
+                    ]
+                page_hashes = dataset.update(candidates, extractor)
+                page_max = _max_modified_time(candidates)
+                if page_max is not None and (max_modified is None or page_max > max_modified):
+                    max_modified = page_max
+
+                # 内容哈希与上次写入时相同的记录无需重新处理
+                known = writer.get_hashes(list(page_hashes))
+                changed = [r for r in candidates if known.get(r.get("record_id", "")) != page_hashes[r.get("record_id", "")]]
+                summary["records_skipped"] += len(candidates) - len(changed)
+                if not changed:
+                    continue
+
+                changed_ids = [r.get("record_id", "") for r in changed]
+                summary["tasks_written"] += write_changed_records(
+                    writer, changed, extractor, {rid: page_hashes[rid] for rid in changed_ids}
+                )
+                summary["records_changed"] += len(changed)
+
+            unchanged = summary["records_changed"] == 0 and dataset.hexdigest() == get_sync_state(dataset_key)
+            if actual_mode == "full" and summary["records_fetched"] > 0 and not unchanged:
+                # 飞书返回空表时保留现有任务；否则清理本次没有见到的记录 (飞书侧已删除)
+                summary["records_deleted"] = writer.delete_unseen()
+            if writer.rebuilding:
+                if summary["records_fetched"] > 0:
+                    writer.finish_rebuild()
+                    summary["rebuilt"] = True
+                else:
+                    writer.cancel_rebuild()
+            summary["task_rows"] = dict(writer.merge_counts)
+            if TASK_STORAGE_MODE != "interval":
+                # 按天存储模式下以区间存储的都是超出展开预算的记录，在摘要中列出供核对日期
+                summary["records_oversized"], summary["oversized_records"] = writer.list_intervals(OVERSIZED_REPORT_LIMIT)
+
+            # 同步状态与任务行在同一事务中提交: 不会出现任务已写入而高水位、指纹仍是旧值的情况，
+            # 也不需要在写事务之外另开连接 (并行同步时可能等不到写锁)
+            if actual_mode == "full":
+                if summary["records_fetched"] > 0:
+                    writer.set_sync_state(watermark_key, str(max_modified) if max_modified is not None else None)
+                    writer.set_sync_state(last_full_key, str(time.time()))
+                    writer.set_sync_state(dataset_key, dataset.hexdigest())
+                    writer.set_sync_state(fingerprint_key, extractor.fingerprint)
+            else:
+                if summary["records_changed"]:
+                    invalidate_dataset_hash(writer, app_token, table_id)
+                if max_modified is not None and max_modified > watermark:
+                    writer.set_sync_state(watermark_key, str(max_modified))
+    except FeishuAPIError as e:
+        logger.error("Sync of source '%s' aborted after %d pages, database left unchanged: %s",
+                     source, summary["pages"], e)
+        summary["message"] = f"{e} (fetched pages are checkpointed, next sync resumes from there)"
+        return summary
+
+    checkpoint.clear()
+
+    if actual_mode == "full" and summary["records_fetched"] == 0:
+        summary["message"] = "No data fetched from Feishu"
+        return summary
+
+    summary["success"] = True
+    summary["message"] = f"{actual_mode} sync finished: {summary['records_changed']} records changed"
+    if summary["records_oversized"]:
+        summary["message"] += (f", {summary['records_oversized']} records span more than {MAX_EXPANSION_DAYS} days "
+                               f"and are stored as intervals (check their dates)")
+    logger.info(
+        "Sync of source '%s' finished: mode=%s pages=%d fetched=%d changed=%d skipped=%d deleted=%d "
+        "oversized=%d tasks_written=%d",
+        source, actual_mode, summary["pages"], summary["records_fetched"], summary["records_changed"],
+        summary["records_skipped"], summary["records_deleted"], summary["records_oversized"], summary["tasks_written"]
+    )
+    return summary
+
+
+def load_sync_sources() -> List[Dict[str, Any]]:
+    """读取数据源列表
+
+    SYNC_SOURCES_FILE 存在时从中读取，格式:
+        {"sources": [{"name": "售后派工", "app_token": "...", "table_id": "...",
+                      "field_mapping": {"customer_name": "客户名称",
+                                        "assignee": {"field": "负责人", "type": "text"}}}]}
+    每个数据源还可以单独指定 app_id / app_secret，未指定时使用环境变量。
+    文件不存在时返回环境变量 FEISHU_APP_TOKEN / FEISHU_TABLE_ID 对应的单个数据源。
+    """
+    if os.path.exists(SYNC_SOURCES_FILE):
+        with open(SYNC_SOURCES_FILE, 'r', encoding='utf-8') as f:
+            sources = json.load(f).get("sources", [])
+        names = [src.get("name") for src in sources]
+        if not all(names) or len(set(names)) != len(names):
+            raise ValueError(f"Every source in {SYNC_SOURCES_FILE} needs a unique name")
+        return sources
+
+    app_token = os.getenv("FEISHU_APP_TOKEN")
+    table_id = os.getenv("FEISHU_TABLE_ID")
+    if not app_token or not table_id:
+        return []
+    return [{"name": DEFAULT_SOURCE, "app_token": app_token, "table_id": table_id}]
+
+
+def run_all_syncs(
+    mode: Optional[str] = None,
+    sources: Optional[List[Dict[str, Any]]] = None,
+    max_workers: int = SYNC_MAX_WORKERS
+) -> Dict[str, Any]:
+    """同步所有数据源
+
+    多个数据源通过有界线程池并行拉取 (同一应用的请求共享 FEISHU_QPS_LIMIT 限速)，
+    写库按数据源串行进行，总耗时接近最慢的那张表。
+
+    Returns:
+        dict: 汇总摘要，字段同 run_sync，另有 sources (各数据源的摘要列表)
+    """
+    if sources is None:
+        sources = load_sync_sources()
+    if not sources:
+        return {"success": False, "mode": mode or SYNC_MODE, "records_fetched": 0, "records_changed": 0,
+                "tasks_written": 0, "message": "No sync source configured", "sources": []}
+
+    def sync_source(src: Dict[str, Any], write_lock: Optional[threading.Lock]) -> Dict[str, Any]:
+        try:
+            return run_sync(
+                src.get("app_id"), src.get("app_secret"), src["app_token"], src["table_id"],
+                mode=mode, source=src["name"], field_mapping=src.get("field_mapping"), write_lock=write_lock
+            )
+        except Exception as e:
+            logger.exception("Sync of source '%s' failed", src.get("name"))
+            return {"success": False, "source": src.get("name"), "mode": mode or SYNC_MODE, "records_fetched": 0,
+                    "records_changed": 0, "tasks_written": 0, "message": str(e)}
+
+    started = time.perf_counter()
+    if len(sources) == 1:
+        results = [sync_source(sources[0], None)]
+    else:
+        write_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources))), thread_name_prefix="feishu-sync") as pool:
+            results = list(pool.map(lambda src: sync_source(src, write_lock), sources))
+    elapsed = time.perf_counter() - started
+
+    failed = [r["source"] for r in results if not r["success"]]
+    summary = {
+        "success": not failed,
+        "mode": results[0]["mode"] if len(results) == 1 else (mode or SYNC_MODE),
+        "records_fetched": sum(r["records_fetched"] for r in results),
+        "records_changed": sum(r["records_changed"] for r in results),
+        "records_skipped": sum(r.get("records_skipped", 0) for r in results),
+        "records_deleted": sum(r.get("records_deleted", 0) for r in results),
+        "records_oversized": sum(r.get("records_oversized", 0) for r in results),
+        "tasks_written": sum(r["tasks_written"] for r in results),
+        "elapsed_seconds": round(elapsed, 3),
+        "sources": results,
+    }
+    if len(results) == 1:
+        summary["message"] = results[0]["message"]
+    elif failed:
+        summary["message"] = f"{len(failed)}/{len(results)} sources failed: {', '.join(failed)}"
+    else:
+        summary["message"] = f"{len(results)} sources synced: {summary['records_changed']} records changed"
+    return summary
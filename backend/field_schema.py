@@ -0,0 +1,273 @@
+"""飞书字段映射: 声明式配置 -> 编译后的字段提取器
+
+映射配置 (FIELD_MAPPING_FILE，默认 field_mapping.json) 声明每个任务属性取自哪个飞书字段、
+字段类型和可选的值映射:
+
+    {
+      "fields": {
+        "assignee": {"field": "售后工程师", "type": "user", "default": "未知负责人"},
+        "start_date": {"field": "服务开始时间", "type": "timestamp"},
+        "priority": {"field": "优先级", "type": "select", "map": {"P0": "紧急"}}
+      },
+      "status_map": {"审批中": "进行中", "已通过": "已结束"}
+    }
+
+compile_field_extractor() 把配置 (加上数据源的覆盖项) 编译为 FieldExtractor: 每个属性按类型
+选好取值函数，处理记录时不再逐条判断字段类型。传入数据表的字段元数据时会校验字段存在且类型兼容。
+"""
+
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional, Callable, Tuple, Union
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# --- 配置部分 ---
+# 字段映射配置文件，不存在时使用下面的内置默认映射
+FIELD_MAPPING_FILE = os.getenv(
+    "FIELD_MAPPING_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "field_mapping.json")
+)
+# --- 配置结束 ---
+
+# 内置默认映射 (与售后派工表的字段一致)
+DEFAULT_FIELD_SCHEMA = {
+    "fields": {
+        "customer_name": {"field": "客户公司名称", "type": "text", "default": ""},
+        "task_content": {"field": "工作内容", "type": "text", "default": ""},
+        "assignee": {"field": "售后工程师", "type": "user", "default": "未知负责人"},
+        "priority": {"field": "优先级", "type": "select", "default": "未知优先级"},
+        "application_status": {"field": "申请状态", "type": "select", "default": ""},
+        "start_date": {"field": "服务开始时间", "type": "timestamp"},
+        "end_date": {"field": "服务结束时间", "type": "timestamp"}
+    },
+    "status_map": {"审批中": "进行中", "已通过": "已结束"}
+}
+
+# 处理逻辑需要的任务属性
+TASK_ATTRIBUTES = ["customer_name", "task_content", "assignee", "priority", "application_status", "start_date", "end_date"]
+
+# 字段类型 -> 兼容的多维表格字段类型编号
+# 1 多行文本, 3 单选, 4 多选, 5 日期, 11 人员, 13 电话, 15 超链接, 19 查找引用, 20 公式,
+# 1001 创建时间, 1002 修改时间, 1003 创建人, 1004 修改人, 1005 自动编号
+BITABLE_TYPES = {
+    "text": {1, 3, 13, 15, 19, 20, 1005},
+    "select": {1, 3, 19, 20},
+    "list": {4, 19, 20},
+    "user": {11, 1003, 1004, 19, 20},
+    "timestamp": {5, 1001, 1002, 19, 20},
+}
+
+
+class FieldSchemaError(ValueError):
+    """字段映射配置无效，或与数据表的字段元数据不一致"""
+
+
+def _text_value(value: Any) -> Optional[str]:
+    """文本类字段: 字符串原样返回，富文本片段列表 / 超链接对象取其中的 text"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return value.get("text")
+    if isinstance(value, list):
+        return "".join(seg.get("text", "") if isinstance(seg, dict) else str(seg) for seg in value)
+    return str(value)
+
+
+def _list_value(value: Any) -> Optional[str]:
+    """多选字段: 选项列表用逗号连接"""
+    if isinstance(value, list):
+        return ", ".join(str(option) for option in value) or None
+    return _text_value(value)
+
+
+def _user_value(value: Any) -> Optional[str]:
+    """人员字段: 所有人员的名字用逗号连接"""
+    if isinstance(value, list):
+        names = [user["name"] for user in value if isinstance(user, dict) and "name" in user]
+        return ", ".join(names) or None
+    if isinstance(value, dict) and "name" in value:
+        return value["name"]
+    return None
+
+
+def _timestamp_value(value: Any) -> Union[int, str]:
+    """日期字段: 毫秒级时间戳 (数字或数字字符串)；有值但不是时间戳时为空字符串 (与字段缺失区分)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return ""
+    try:
+        return int(float(value)) if isinstance(value, str) else int(value)
+    except (ValueError, OverflowError):
+        return ""
+
+
+EXTRACTORS: Dict[str, Callable[[Any], Any]] = {
+    "text": _text_value,
+    "select": _text_value,
+    "list": _list_value,
+    "user": _user_value,
+    "timestamp": _timestamp_value,
+}
+
+
+# 各类型最常见取值的快速判断 (命中时值原样使用，否则调用完整的转换函数)
+FAST_PATH_TYPES = {"text": str, "select": str, "timestamp": int}
+
+
+def _compile_slow_path(spec: Dict[str, Any]) -> Callable[[Any], Any]:
+    """完整的取值转换: 类型转换 -> 默认值 -> 值映射"""
+    convert = EXTRACTORS[spec["type"]]
+    default = spec.get("default")
+    value_map = spec.get("map") or {}
+
+    def slow_path(value: Any) -> Any:
+        value = convert(value) if value is not None else None
+        if value is None:
+            return default
+        return value_map.get(value, value)
+    return slow_path
+
+
+def _compile_getter(spec: Dict[str, Any]) -> Tuple[Optional[type], Callable[[Any], Any]]:
+    """按字段类型选好单个属性的取值方式，返回 (原样取值的类型, 转换函数)
+
+    没有值映射的属性在值已是期望类型 (文本为 str、时间戳为 int) 时原样使用，
+    其他情况才调用转换函数；不能原样使用的类型为 None。
+    """
+    slow_path = _compile_slow_path(spec)
+    if spec.get("map"):
+        return None, slow_path
+    if spec["type"] == "user":
+        default = spec.get("default")
+
+        def user_path(value: Any) -> Any:
+            # 人员列表: 直接取出名字，没有名字时为默认值
+            if value.__class__ is list:
+                return ", ".join([u["name"] for u in value if u.__class__ is dict and "name" in u]) or default
+            return slow_path(value)
+        return None, user_path
+    return FAST_PATH_TYPES.get(spec["type"]), slow_path
+
+
+def _compile_extract(specs: Dict[str, Dict[str, Any]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """生成 extract(fields) 函数: 按 (任务属性, 飞书字段名, 原样取值的类型, 转换函数) 列表逐个取值
+
+    常见记录的每个属性只有一次字典查找和一次类型比较。
+    """
+    plan = [(attr, spec["field"], *_compile_getter(spec)) for attr, spec in specs.items()]
+
+    def extract(fields: Dict[str, Any]) -> Dict[str, Any]:
+        get = fields.get
+        result = {}
+        for attr, field, fast_type, convert in plan:
+            value = get(field)
+            result[attr] = value if value.__class__ is fast_type else convert(value)
+        return result
+    return extract
+
+
+class FieldExtractor:
+    """编译后的字段提取器，每个数据表 (字段映射) 一个
+
+    Attributes:
+        mapping: 任务属性 -> 飞书字段名
+        field_names: 需要向飞书请求的字段名 (去重)
+        status_map: 申请状态 -> 展示状态，不在其中时展示状态取优先级
+        fingerprint: 映射配置的摘要，配置变化时记录需要重新处理
+    """
+
+    def __init__(self, specs: Dict[str, Dict[str, Any]], status_map: Dict[str, str]):
+        self.specs = specs
+        self.mapping = {attr: spec["field"] for attr, spec in specs.items()}
+        self.field_names = list(dict.fromkeys(self.mapping.values()))
+        self.status_map = status_map
+        payload = json.dumps([specs, status_map], ensure_ascii=False, sort_keys=True)
+        self.fingerprint = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+        # extract(fields) -> {任务属性: 值}
+        self.extract = _compile_extract(specs)
+
+    def validate(self, field_meta: List[Dict[str, Any]]):
+        """按数据表的字段元数据 (FeishuBitableReader.get_fields) 校验字段存在且类型兼容
+
+        Raises:
+            FieldSchemaError: 字段不存在或类型不兼容
+        """
+        types = {meta.get("field_name"): meta.get("type") for meta in field_meta}
+        problems = []
+        for attr, spec in self.specs.items():
+            name = spec["field"]
+            if name not in types:
+                problems.append(f"{attr}: field '{name}' not found")
+            elif types[name] not in BITABLE_TYPES[spec["type"]]:
+                problems.append(f"{attr}: field '{name}' has Bitable type {types[name]}, expected {spec['type']}")
+        if problems:
+            raise FieldSchemaError("Field mapping does not match table: " + "; ".join(problems))
+
+
+def load_field_schema() -> Dict[str, Any]:
+    """读取字段映射配置，文件不存在时返回内置默认映射"""
+    if not os.path.exists(FIELD_MAPPING_FILE):
+        return DEFAULT_FIELD_SCHEMA
+    with open(FIELD_MAPPING_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _normalize_spec(attr: str, spec: Union[str, Dict[str, Any]], base: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """覆盖项可以只写字段名，也可以写完整配置；未写的键沿用 base"""
+    if isinstance(spec, str):
+        spec = {"field": spec}
+    if not isinstance(spec, dict):
+        raise FieldSchemaError(f"{attr}: mapping must be a field name or an object")
+    merged = dict(base or {})
+    merged.update(spec)
+    if not merged.get("field"):
+        raise FieldSchemaError(f"{attr}: missing field name")
+    if merged.get("type") not in EXTRACTORS:
+        raise FieldSchemaError(f"{attr}: unknown type {merged.get('type')!r}, expected one of {sorted(EXTRACTORS)}")
+    if "map" in merged and not isinstance(merged["map"], dict):
+        raise FieldSchemaError(f"{attr}: map must be an object")
+    return merged
+
+
+_cache: Dict[str, FieldExtractor] = {}
+_cache_lock = threading.Lock()
+
+
+def compile_field_extractor(
+    overrides: Optional[Dict[str, Any]] = None,
+    field_meta: Optional[List[Dict[str, Any]]] = None
+) -> FieldExtractor:
+    """在映射配置上应用数据源的覆盖项并编译为 FieldExtractor
+
+    相同覆盖项的编译结果会被缓存。传入 field_meta 时按数据表的字段元数据校验。
+
+    Raises:
+        FieldSchemaError: 配置无效或与字段元数据不一致
+    """
+    key = json.dumps(overrides or {}, ensure_ascii=False, sort_keys=True)
+    with _cache_lock:
+        extractor = _cache.get(key)
+    if extractor is None:
+        schema = load_field_schema()
+        base = schema.get("fields", {})
+        unknown = (set(base) | set(overrides or {})) - set(TASK_ATTRIBUTES)
+        if unknown:
+            raise FieldSchemaError(f"Unknown field mapping keys: {sorted(unknown)}")
+        specs = {}
+        for attr in TASK_ATTRIBUTES:
+            default_spec = DEFAULT_FIELD_SCHEMA["fields"][attr]
+            base_spec = _normalize_spec(attr, base.get(attr, default_spec), default_spec)
+            override = (overrides or {}).get(attr)
+            specs[attr] = base_spec if override is None else _normalize_spec(attr, override, base_spec)
+        extractor = FieldExtractor(specs, schema.get("status_map", {}))
+        with _cache_lock:
+            _cache[key] = extractor
+    if field_meta is not None:
+        extractor.validate(field_meta)
+    return extractor
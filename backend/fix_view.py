@@ -1,5 +1,7 @@
 import sqlite3
 
+from task_db import CURRENT_WEEK_VIEW_SQL
+
 # 连接到SQLite数据库
 conn = sqlite3.connect('tasks.db')
 cursor = conn.cursor()
@@ -11,16 +13,9 @@ try:
 except sqlite3.OperationalError as e:
     print(f"删除视图时出错: {e}")
 
-# 2. 创建新的视图
+# 2. 创建新的视图 (date 列为日序号)
 try:
-    cursor.execute("""
-        CREATE VIEW current_week_tasks_view AS
-        SELECT * FROM tasks 
-        WHERE date BETWEEN 
-            (SELECT DATE('now', 'weekday 1', '-7 days')) -- 本周一
-            AND 
-            (SELECT DATE('now', 'weekday 1', '-1 day')) -- 本周日
-    """)
+    cursor.execute(CURRENT_WEEK_VIEW_SQL)
     print("已创建新的视图")
 except sqlite3.OperationalError as e:
     print(f"创建视图时出错: {e}")
@@ -31,7 +26,7 @@ try:
     count = cursor.fetchone()[0]
     print(f"新视图中的记录数: {count}")
     
-    cursor.execute("SELECT DISTINCT date FROM current_week_tasks_view ORDER BY date")
+    cursor.execute("SELECT DISTINCT DATE(date + 1721424.5) FROM current_week_tasks_view ORDER BY date")
     dates = cursor.fetchall()
     print("新视图中的日期:")
     for date_row in dates:
@@ -11,7 +11,8 @@ import os
 import logging
 import time
 # 从本地数据库模块导入
-from task_db import init_db, get_tasks_from_db, get_week_range, get_db_connection, get_task_count
+import task_db
+from task_db import init_db, get_week_range, get_task_count
 # 导入筛选模块
 from task_filter import task_filter
 # 导入认证和限流模块
@@ -59,6 +60,7 @@ class TaskItem(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     weekday: Optional[str] = None
+    source: Optional[str] = None # 数据来源 (多表同步时的数据源名称)
 
 class TaskGroup(BaseModel):
     monday: List[TaskItem]
@@ -73,6 +75,14 @@ class TaskListResponse(BaseModel):
     total: int
     tasks: List[TaskItem]
 
+class SearchTaskItem(TaskItem):
+    snippet: Optional[str] = None # 命中内容的高亮片段 (<mark>关键词</mark>)
+
+class SearchResponse(BaseModel):
+    """搜索响应(按相关度排序)"""
+    total: int
+    tasks: List[SearchTaskItem]
+
 class EngineerStatsItem(BaseModel):
     """工程师统计信息"""
     engineer: str
@@ -81,11 +91,22 @@ class EngineerStatsItem(BaseModel):
     urgent: int
     important: int
 
+class PeriodStatsItem(BaseModel):
+    """按周/按月汇总的统计"""
+    period: str
+    start: str
+    end: str
+    workdays: int
+    total_tasks: int
+    workday_tasks: int
+
 class StatsResponse(BaseModel):
     """统计响应"""
     date_range: dict
+    workdays: int
     by_engineer: List[EngineerStatsItem]
     by_priority: dict
+    by_period: Optional[List[PeriodStatsItem]] = None
 
 
 # ===== 中间件 =====
@@ -132,7 +153,7 @@ async def health_check():
     2. 数据量在合理范围
 
     Returns:
-        dict: 包含status, database, task_count, timestamp
+        dict: 包含status, database, task_count, db_pool (连接池状态), timestamp
     """
     try:
         task_count = get_task_count()
@@ -141,12 +162,23 @@ async def health_check():
             "status": "healthy",
             "database": "connected",
             "task_count": task_count,
+            "db_pool": task_db.get_pool_stats(),
             "timestamp": datetime.datetime.now().isoformat()
         }
     except Exception as e:
         logger.exception("Health check failed")
         raise HTTPException(status_code=503, detail=f"Service unhealthy: {e}")
 
+def _check_dates(*dates: Optional[str]):
+    """日期参数须为 YYYY-MM-DD (数据库按日序号存储，无法解析的日期不能用于查询)"""
+    for value in dates:
+        if value:
+            try:
+                datetime.datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
 @app.get("/api/tasks", response_model=TaskGroup)
 async def get_tasks(
     start_date: Optional[str] = Query(None, description="开始日期 (YYYY-MM-DD)"),
@@ -161,37 +193,23 @@ async def get_tasks(
     可以通过 filter_name 参数指定使用哪个筛选器。
     """
     print(f"Received request to /api/tasks with start_date={start_date}, end_date={end_date}, filter_name={filter_name}")
+    _check_dates(start_date, end_date)
     
     try:
-        # 如果提供了筛选器名称或使用激活的筛选器，则从数据库获取所有任务进行筛选
-        if filter_name or not start_date or not end_date:
-            # 获取所有任务
-            all_tasks = []
-            task_groups_data = get_tasks_from_db()  # 不提供日期范围，获取所有任务
-            for day_tasks in task_groups_data.values():
-                all_tasks.extend(day_tasks)
-            
-            # 如果没有提供日期范围，则使用本周的日期范围进行最终分组
-            if not start_date or not end_date:
-                start_date, end_date = get_week_range(week_start="sunday")
-                print(f"No date range provided, using current week: {start_date} to {end_date}")
+        # 如果没有提供日期范围，则使用本周的日期范围
+        if not start_date or not end_date:
+            start_date, end_date = get_week_range(week_start="sunday")
+            print(f"No date range provided, using current week: {start_date} to {end_date}")
         else:
-            # 如果没有筛选器且提供了日期范围，则只获取指定日期范围内的任务
             print(f"Date range provided: {start_date} to {end_date}")
-            task_groups_data = get_tasks_from_db(start_date, end_date)
-            
-            # 将所有任务合并为一个列表进行筛选
-            all_tasks = []
-            for day_tasks in task_groups_data.values():
-                all_tasks.extend(day_tasks)
-        
+
         # 如果没有指定筛选器名称，则使用当前激活的筛选器
         if not filter_name:
             filter_name = task_filter.get_active_filter()
             print(f"No filter name provided, using active filter: {filter_name}")
         
-        # 应用筛选器
-        filtered_tasks = task_filter.filter_tasks(all_tasks, filter_name)
+        # 只获取日期范围内的任务 (以及没有有效日期的任务)，筛选条件尽量在数据库中执行
+        filtered_tasks = task_filter.query_tasks(start_date, end_date, filter_name)
         print(f"Filtered tasks count: {len(filtered_tasks)}")
         
         # 打印筛选后的任务详情用于调试
@@ -200,7 +218,7 @@ async def get_tasks(
             for i, task in enumerate(filtered_tasks):
                 print(f"  {i+1}. Record ID: {task.get('record_id')}, Weekday: {task.get('weekday')}")
         
-        # 重新按星期分组，并只保留指定日期范围内的任务
+        # 按星期分组
         filtered_task_groups = {
             "monday": [],
             "tuesday": [],
@@ -212,12 +230,6 @@ async def get_tasks(
         }
         
         for task in filtered_tasks:
-            # 如果提供了日期范围，则只保留该范围内的任务
-            if start_date and end_date:
-                task_date = task.get("date")
-                if task_date and (task_date < start_date or task_date > end_date):
-                    continue  # 跳过不在日期范围内的任务
-            
             weekday = task.get("weekday", "unknown_date")
             print(f"Adding task to group: {weekday}")  # 调试信息
             if weekday in filtered_task_groups:
@@ -325,6 +337,7 @@ async def get_tasks_by_engineer(
     Header: X-API-Key: your-readonly-key
     """
     logger.info("API request: by-engineer=%s, start=%s, end=%s", engineer, start_date, end_date)
+    _check_dates(start_date, end_date)
 
     try:
         # 如果未提供日期范围,使用本周
@@ -332,18 +345,7 @@ async def get_tasks_by_engineer(
             start_date, end_date = get_week_range(week_start="sunday")
 
         # 从数据库查询
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT record_id, task_name, assignee, status, priority,
-                       application_status, date, start_date, end_date, weekday
-                FROM tasks
-                WHERE assignee = ? AND date BETWEEN ? AND ?
-                ORDER BY date
-            """, (engineer, start_date, end_date))
-
-            rows = cursor.fetchall()
-            tasks = [dict(row) for row in rows]
+        tasks = task_db.query_tasks(start_date, end_date, assignee=engineer)
 
         return TaskListResponse(total=len(tasks), tasks=tasks)
 
@@ -373,20 +375,10 @@ async def get_tasks_by_date(
     Header: X-API-Key: your-readonly-key
     """
     logger.info("API request: by-date=%s", date)
+    _check_dates(date)
 
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT record_id, task_name, assignee, status, priority,
-                       application_status, date, start_date, end_date, weekday
-                FROM tasks
-                WHERE date = ?
-                ORDER BY assignee, priority DESC
-            """, (date,))
-
-            rows = cursor.fetchall()
-            tasks = [dict(row) for row in rows]
+        tasks = task_db.get_tasks_by_date(date)
 
         return TaskListResponse(total=len(tasks), tasks=tasks)
 
@@ -403,6 +395,7 @@ async def get_tasks_by_date(
 async def get_task_stats(
     start_date: Optional[str] = Query(None, description="开始日期 (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="结束日期 (YYYY-MM-DD)"),
+    group_by: Optional[str] = Query(None, description="按周 (week，周日开始) 或按月 (month) 汇总"),
     api_key: str = Depends(verify_readonly_api_key)
 ):
     """
@@ -415,52 +408,32 @@ async def get_task_stats(
     返回:
     - 按工程师统计(总任务数,各优先级数量)
     - 按优先级统计
+    - 工作日天数 (扣除法定节假日、计入调休上班日)，指定 group_by 时按周/按月汇总
 
     示例:
     GET /api/tasks/stats?start_date=2025-10-13&end_date=2025-10-19
     Header: X-API-Key: your-readonly-key
     """
-    logger.info("API request: stats, start=%s, end=%s", start_date, end_date)
+    logger.info("API request: stats, start=%s, end=%s, group_by=%s", start_date, end_date, group_by)
+    _check_dates(start_date, end_date)
+    if group_by not in (None, "week", "month"):
+        raise HTTPException(status_code=400, detail="group_by must be 'week' or 'month'")
 
     try:
         if not start_date or not end_date:
             start_date, end_date = get_week_range(week_start="sunday")
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-
-            # 按工程师统计
-            cursor.execute("""
-                SELECT
-                    assignee as engineer,
-                    COUNT(*) as total_tasks,
-                    SUM(CASE WHEN priority='非常紧急' THEN 1 ELSE 0 END) as very_urgent,
-                    SUM(CASE WHEN priority='紧急' THEN 1 ELSE 0 END) as urgent,
-                    SUM(CASE WHEN priority='重要' THEN 1 ELSE 0 END) as important
-                FROM tasks
-                WHERE date BETWEEN ? AND ?
-                GROUP BY assignee
-                ORDER BY total_tasks DESC
-            """, (start_date, end_date))
-
-            by_engineer = [dict(row) for row in cursor.fetchall()]
-
-            # 按优先级统计
-            cursor.execute("""
-                SELECT
-                    priority,
-                    COUNT(*) as count
-                FROM tasks
-                WHERE date BETWEEN ? AND ?
-                GROUP BY priority
-            """, (start_date, end_date))
-
-            by_priority = {row["priority"]: row["count"] for row in cursor.fetchall()}
+        # 按工程师和按优先级统计 (任务天数)
+        by_engineer, by_priority = task_db.get_task_stats(start_date, end_date)
+
+        by_period = task_db.get_period_stats(start_date, end_date, group_by) if group_by else None
 
         return StatsResponse(
             date_range={"start": start_date, "end": end_date},
+            workdays=task_db.count_workdays(start_date, end_date),
             by_engineer=by_engineer,
-            by_priority=by_priority
+            by_priority=by_priority,
+            by_period=by_period
         )
 
     except Exception as e:
@@ -470,7 +443,7 @@ async def get_task_stats(
 
 @app.get(
     "/api/tasks/search",
-    response_model=TaskListResponse,
+    response_model=SearchResponse,
     dependencies=[Depends(verify_readonly_api_key)]
 )
 async def search_tasks(
@@ -486,6 +459,7 @@ async def search_tasks(
     - 搜索"网络故障"相关派工
 
     搜索字段: task_name, assignee
+    结果按相关度排序，同一派工记录的任务按日期降序；snippet 为命中内容的高亮片段
 
     示例:
     GET /api/tasks/search?keyword=阿里巴巴&limit=50
@@ -494,21 +468,9 @@ async def search_tasks(
     logger.info("API request: search=%s, limit=%d", keyword, limit)
 
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT record_id, task_name, assignee, status, priority,
-                       application_status, date, start_date, end_date, weekday
-                FROM tasks
-                WHERE task_name LIKE ? OR assignee LIKE ?
-                ORDER BY date DESC
-                LIMIT ?
-            """, (f"%{keyword}%", f"%{keyword}%", limit))
-
-            rows = cursor.fetchall()
-            tasks = [dict(row) for row in rows]
+        tasks = task_db.search_tasks(keyword, limit)
 
-        return TaskListResponse(total=len(tasks), tasks=tasks)
+        return SearchResponse(total=len(tasks), tasks=tasks)
 
     except Exception as e:
         logger.exception("Failed to search tasks")
@@ -534,16 +496,7 @@ async def get_engineers(api_key: str = Depends(verify_readonly_api_key)):
     logger.info("API request: get engineers")
 
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT DISTINCT assignee
-                FROM tasks
-                WHERE assignee IS NOT NULL AND assignee != ''
-                ORDER BY assignee
-            """)
-
-            engineers = [row["assignee"] for row in cursor.fetchall()]
+        engineers = task_db.get_engineers()
 
         return {"total": len(engineers), "engineers": engineers}
 
@@ -556,70 +509,122 @@ async def get_engineers(api_key: str = Depends(verify_readonly_api_key)):
     "/api/sync",
     dependencies=[Depends(verify_readonly_api_key)]
 )
-async def sync_from_feishu(api_key: str = Depends(verify_readonly_api_key)):
+def sync_from_feishu(
+    full: bool = Query(False, description="是否强制全量同步 (默认增量同步)"),
+    api_key: str = Depends(verify_readonly_api_key)
+):
     """
     手动触发从飞书同步数据到数据库
 
+    同步会阻塞数秒 (网络请求、写库、退避重试)，定义为普通函数由 FastAPI 放到线程池执行，
+    同步期间其他请求不受影响。
+
     用例:
     - 用户在前端点击"同步数据"按钮
     - 管理员需要立即更新数据
 
+    默认只同步上次同步后修改过的记录; full=true 时拉取全表并清理已删除的记录。
+
     示例:
     POST /api/sync
+    POST /api/sync?full=true
     Header: X-API-Key: your-readonly-key
     """
-    logger.info("API request: manual sync triggered")
+    logger.info("API request: manual sync triggered (full=%s)", full)
 
     try:
-        from feishu_reader import FeishuBitableReader
-        from process_feishu_data import process_feishu_records
-        from task_db import save_processed_tasks_to_db
-
-        # 从环境变量读取飞书配置
-        app_id = os.getenv("FEISHU_APP_ID")
-        app_secret = os.getenv("FEISHU_APP_SECRET")
-        app_token = os.getenv("FEISHU_APP_TOKEN")
-        table_id = os.getenv("FEISHU_TABLE_ID")
+        from feishu_sync import load_sync_sources, run_all_syncs
 
-        if not all([app_id, app_secret, app_token, table_id]):
+        # 应用凭证从环境变量读取 (数据源可以单独覆盖)，数据源列表见 SYNC_SOURCES_FILE
+        sources = load_sync_sources()
+        credentials_ok = all(
+            (src.get("app_id") or os.getenv("FEISHU_APP_ID")) and (src.get("app_secret") or os.getenv("FEISHU_APP_SECRET"))
+            for src in sources
+        )
+        if not sources or not credentials_ok:
             raise HTTPException(
                 status_code=500,
                 detail="Feishu configuration incomplete. Check environment variables."
             )
 
-        # 1. 从飞书获取数据
-        logger.info("Fetching data from Feishu...")
-        reader = FeishuBitableReader(app_id, app_secret)
-        raw_records = reader.get_records(app_token, table_id)
+        summary = run_all_syncs(mode="full" if full else None, sources=sources)
 
-        if not raw_records:
+        if not summary["success"]:
             return {
                 "success": False,
-                "message": "No data fetched from Feishu",
+                "message": summary["message"],
                 "records_synced": 0
             }
 
-        # 2. 处理数据
-        logger.info(f"Processing {len(raw_records)} records...")
-        processed_tasks = process_feishu_records(raw_records)
-
-        # 3. 保存到数据库
-        logger.info("Saving to database...")
-        save_processed_tasks_to_db(processed_tasks)
-
-        logger.info(f"Sync completed: {len(processed_tasks)} tasks synced")
+        logger.info(f"Sync completed: {summary['records_changed']} records synced")
 
         return {
             "success": True,
             "message": "Data synced successfully",
-            "records_synced": len(processed_tasks),
+            "mode": summary["mode"],
+            "records_synced": summary["records_changed"],
+            "records_fetched": summary["records_fetched"],
+            "tasks_written": summary["tasks_written"],
+            "sources": [
+                {"source": r["source"], "records_synced": r["records_changed"], "message": r["message"]}
+                for r in summary["sources"]
+            ],
             "timestamp": datetime.datetime.now().isoformat()
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to sync data from Feishu")
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
+@app.post("/api/feishu/events")
+async def receive_feishu_event(request: Request):
+    """
+    飞书事件订阅回调 (多维表格记录变更推送)
+
+    在飞书开发者后台把请求地址配置为 https://<host>/api/feishu/events，
+    并配置 FEISHU_EVENT_VERIFICATION_TOKEN (及可选的 FEISHU_EVENT_ENCRYPT_KEY)。
+    请求由飞书服务端发起，不使用 API Key，改为校验 Verification Token / 签名。
+
+    记录变更放入队列后立即返回，后台线程按批回查记录并更新 tasks 表，
+    通常几秒内即可在接口中看到变更。
+    """
+    from feishu_events import (
+        EventVerificationError, parse_event_request, is_duplicate_event, extract_record_changes, get_event_batcher
+    )
+
+    raw_body = await request.body()
+    try:
+        payload = parse_event_request(raw_body, request.headers)
+    except EventVerificationError as e:
+        logger.warning("Rejected Feishu event: %s", e)
+        raise HTTPException(status_code=401, detail="Event verification failed")
+
+    # 配置请求地址时飞书发送的 URL 校验请求
+    if payload.get("type") == "url_verification":
+        return {"challenge": payload.get("challenge")}
+
+    # 飞书没有及时收到响应时会重试同一事件，重复的只确认不处理
+    if is_duplicate_event(payload):
+        logger.info("Ignored duplicate Feishu event")
+        return {"code": 0}
+
+    changes = extract_record_changes(payload)
+    if changes:
+        get_event_batcher().submit(changes)
+        logger.info("Queued %d record changes from Feishu event", len(changes))
+    return {"code": 0}
+
+
+@app.on_event("shutdown")
+def flush_feishu_events():
+    """服务关闭前应用队列中剩余的记录变更，然后关闭数据库连接"""
+    from feishu_events import stop_event_batcher
+    stop_event_batcher()
+    task_db.close_connection_pool()
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,8 +1,19 @@
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Iterator, Tuple, Union
 import logging
-from read_feishu_data import FeishuBitableReader
+from feishu_reader import FeishuBitableReader
+from field_schema import FieldExtractor, compile_field_extractor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖，未安装时逐条展开
+    np = None
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,37 +21,327 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- 配置部分 (需要根据你的飞书表格字段进行修改) ---
-# 请根据你实际的飞书多维表格字段名修改以下映射
-CUSTOMER_NAME_FIELD = "客户公司名称"  # 客户公司名称字段
-TASK_CONTENT_FIELD = "工作内容"  # 工作内容字段
-ASSIGNEE_FIELD = "售后工程师"  # 负责人字段
-PRIORITY_FIELD = "优先级"  # 优先级字段
-APPLICATION_STATUS_FIELD = "申请状态"  # 申请状态字段
-# 日期字段 (开始时间和结束时间)
-START_DATE_FIELD = "服务开始时间"  # 开始日期字段 (时间戳)
-END_DATE_FIELD = "服务结束时间"    # 结束日期字段 (时间戳)
+# --- 配置部分 ---
+# 飞书字段映射在 field_mapping.json 中配置 (字段名、类型、值映射，见 field_schema.py)，
+# 以下常量由默认映射生成，供按字段名读取飞书数据的脚本使用
+_DEFAULT_EXTRACTOR = compile_field_extractor()
+CUSTOMER_NAME_FIELD = _DEFAULT_EXTRACTOR.mapping["customer_name"]  # 客户公司名称字段
+TASK_CONTENT_FIELD = _DEFAULT_EXTRACTOR.mapping["task_content"]  # 工作内容字段
+ASSIGNEE_FIELD = _DEFAULT_EXTRACTOR.mapping["assignee"]  # 负责人字段
+PRIORITY_FIELD = _DEFAULT_EXTRACTOR.mapping["priority"]  # 优先级字段
+APPLICATION_STATUS_FIELD = _DEFAULT_EXTRACTOR.mapping["application_status"]  # 申请状态字段
+START_DATE_FIELD = _DEFAULT_EXTRACTOR.mapping["start_date"]  # 开始日期字段 (时间戳)
+END_DATE_FIELD = _DEFAULT_EXTRACTOR.mapping["end_date"]    # 结束日期字段 (时间戳)
 # --- 配置结束 ---
 
+# 字段映射: 任务属性 -> 飞书字段名。多表同步时每个数据源可以覆盖其中的部分字段
+DEFAULT_FIELD_MAPPING = dict(_DEFAULT_EXTRACTOR.mapping)
+
+# 处理时实际用到的字段，同步时只向飞书请求这些字段
+FEISHU_FIELD_NAMES = list(_DEFAULT_EXTRACTOR.field_names)
+
+# 处理逻辑版本号，参与内容哈希计算。修改 process_feishu_records() 的输出时加 1，
+# 下次同步会重新处理所有记录
+PROCESSING_VERSION = 4
+
+# 记录数不少于该值且安装了 NumPy 时，按天展开改用 NumPy 批量计算日期和星期
+VECTORIZED_EXPANSION_MIN_RECORDS = int(os.getenv("VECTORIZED_EXPANSION_MIN_RECORDS", "5000"))
+
+# 每条记录按天展开的天数上限 (0 表示不限制)。超出的记录 (如结束日期误填成几十年后)
+# 在按天存储模式下改存为区间，查询时按日期范围展开，不会产生成千上万行
+MAX_EXPANSION_DAYS = int(os.getenv("MAX_EXPANSION_DAYS", "731"))
+
+# 多进程转换 (默认不启用): 进程数 (1 为串行，0 表示 CPU 核数) 和每个分块的记录数。
+# 进程启动和记录序列化的开销很大，只有多核且记录数不少于 PROCESS_POOL_MIN_RECORDS 时才使用进程池。
+# 只用于一次转换整表的场景 (本模块的命令行入口、bench_process.py)；feishu_sync 的同步按页
+# (不超过 500 条) 转换变化的记录，达不到这个规模，始终串行处理
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "1"))
+PROCESS_POOL_CHUNK_SIZE = int(os.getenv("PROCESS_POOL_CHUNK_SIZE", "20000"))
+PROCESS_POOL_MIN_RECORDS = int(os.getenv("PROCESS_POOL_MIN_RECORDS", "100000"))
+
+
+def get_field_extractor(field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None) -> FieldExtractor:
+    """字段映射覆盖项 -> 编译后的字段提取器 (已编译的提取器原样返回)"""
+    if isinstance(field_mapping, FieldExtractor):
+        return field_mapping
+    return compile_field_extractor(field_mapping)
+
+
+def resolve_field_mapping(overrides: Union[FieldExtractor, Dict[str, Any], None] = None) -> Dict[str, str]:
+    """在默认字段映射上应用覆盖项，返回完整映射 (任务属性 -> 飞书字段名)"""
+    return dict(get_field_extractor(overrides).mapping)
+
+
+def record_content_hash(
+    record: Dict[str, Any],
+    field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None
+) -> str:
+    """计算记录中处理用到的字段的内容哈希
+
+    只包含字段映射中的字段，其他字段 (备注、附件等) 变化不会导致重新处理。
+    映射配置 (类型、值映射) 的摘要也参与计算，修改配置后下次同步会重新处理所有记录。
+    """
+    extractor = get_field_extractor(field_mapping)
+    fields = record.get("fields", {})
+    relevant = {name: fields.get(name) for name in extractor.field_names}
+    payload = json.dumps([PROCESSING_VERSION, extractor.fingerprint, relevant],
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# 0001-01-01 为第 1 天的日序号 (date.toordinal) 中 1970-01-01 的值
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MAX_ORDINAL = date.max.toordinal()
+SECONDS_PER_DAY = 86400
+
+
+@lru_cache(maxsize=8192)
+def _utc_offset_seconds(hour: int) -> int:
+    """本地时区在某个整点小时 (Unix 时间 // 3600) 的 UTC 偏移秒数，按小时缓存"""
+    return time.localtime(hour * 3600).tm_gmtoff
+
+
+def timestamp_to_ordinal(timestamp_ms: int) -> int:
+    """将毫秒级时间戳转换为本地日期的日序号 (date.toordinal)，不构造 datetime 对象"""
+    seconds = timestamp_ms // 1000
+    ordinal = (seconds + _utc_offset_seconds(seconds // 3600)) // SECONDS_PER_DAY + EPOCH_ORDINAL
+    if not 1 <= ordinal <= MAX_ORDINAL:
+        raise ValueError(f"timestamp out of range: {timestamp_ms}")
+    return ordinal
+
+
+@lru_cache(maxsize=8192)
+def ordinal_to_date_str(ordinal: int) -> str:
+    """日序号 -> YYYY-MM-DD，结果缓存 (任务日期集中在少量天上)"""
+    return date.fromordinal(ordinal).strftime("%Y-%m-%d")
+
+
+@lru_cache(maxsize=8192)
+def date_str_to_ordinal(date_str: str) -> int:
+    """YYYY-MM-DD -> 日序号，无法解析时抛出 ValueError"""
+    return datetime.strptime(date_str, "%Y-%m-%d").toordinal()
+
 
 def convert_timestamp_to_date(timestamp_ms: int) -> str:
-    """将毫秒级时间戳转换为 YYYY-MM-DD 格式的日期字符串"""
+    """将毫秒级时间戳 (数字字符串已由 field_schema 转成整数) 转换为 YYYY-MM-DD 格式的日期字符串
+
+    无法转换时记录警告并返回空字符串 (视为没有日期，任务落入 unknown_date)，不用今天代替。
+    """
+    try:
+        return ordinal_to_date_str(timestamp_to_ordinal(timestamp_ms))
+    except (ValueError, OSError, OverflowError) as e:
+        logger.warning("Invalid timestamp %r, treating the date as missing: %s", timestamp_ms, e)
+        return ""
+
+
+# 按 date.weekday() 索引；日序号 n 对应的 weekday() 为 (n + 6) % 7
+WEEKDAY_KEYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "weekend", "weekend"]
+
+
+def weekday_key(date_str: str) -> str:
+    """YYYY-MM-DD -> 分组键 (monday ... friday / weekend)，无法解析时为 unknown_date"""
     try:
-        dt = datetime.fromtimestamp(timestamp_ms / 1000.0)
-        return dt.strftime("%Y-%m-%d")
-    except (ValueError, OSError) as e:
-        logger.warning("Invalid timestamp %s, using today as fallback: %s", timestamp_ms, e)
-        return datetime.now().strftime("%Y-%m-%d")
-    except Exception as e:
-        logger.error("Unexpected error converting timestamp %s: %s", timestamp_ms, e)
-        return datetime.now().strftime("%Y-%m-%d")
+        return WEEKDAY_KEYS[(date_str_to_ordinal(date_str) + 6) % 7]
+    except ValueError:
+        return "unknown_date"
+
 
+def build_task_interval(item: Dict[str, Any], extractor: FieldExtractor) -> Optional[Dict[str, Any]]:
+    """把一条飞书记录转换为一个任务区间 (不按天展开)
 
-def process_feishu_records(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    返回的 first_date / last_date 是任务覆盖的第一天和最后一天，日期缺失或无法解析时
+    都为空字符串 (展开后落入 unknown_date)。结束日期早于开始日期的记录不覆盖任何一天，返回 None。
+    """
+    values = extractor.extract(item.get("fields", {}))
+
+    # 任务名称: 客户公司名称 + 工作内容；负责人、优先级、申请状态的类型转换和默认值由字段映射决定
+    task_name = f"{values['customer_name']} {values['task_content']}".strip()
+    priority = values["priority"]
+    application_status = values["application_status"]
+    # 根据申请状态转换为展示状态，没有申请状态或不是指定的值时使用优先级
+    status = extractor.status_map.get(application_status, priority)
+
+    interval = {
+        "record_id": item.get("record_id", ""),
+        "task_name": task_name,
+        "assignee": values["assignee"],
+        "status": status,
+        "priority": priority,
+        "application_status": application_status,
+        "start_date": "",
+        "end_date": "",
+        "first_date": "",
+        "last_date": ""
+    }
+
+    # 提取并转换开始和结束日期，任一字段为空都视为没有有效日期
+    # 有值但不是时间戳的字段提取为空字符串
+    start_timestamp = values["start_date"]
+    end_timestamp = values["end_date"]
+    if start_timestamp is None or end_timestamp is None:
+        return interval
+
+    start_date_str = convert_timestamp_to_date(start_timestamp) if start_timestamp != "" else ""
+    end_date_str = convert_timestamp_to_date(end_timestamp) if end_timestamp != "" else ""
+    if not start_date_str and not end_date_str:
+        return interval
+
+    # 只有开始日期或只有结束日期时只在那一天显示，都有时显示两者之间的每一天
+    interval["start_date"] = start_date_str
+    interval["end_date"] = end_date_str
+    interval["first_date"] = start_date_str or end_date_str
+    interval["last_date"] = end_date_str or start_date_str
+    if interval["last_date"] < interval["first_date"]:
+        return None
+    return interval
+
+
+def expand_interval(
+    interval: Dict[str, Any],
+    window_start: Optional[str] = None,
+    window_end: Optional[str] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """把任务区间展开为每天一条的任务，产出 (分组键, 任务)
+
+    window_start / window_end 限定只展开该日期范围内的天 (YYYY-MM-DD，包含两端)。
+    没有有效日期的区间产出一条 unknown_date 任务 (不受窗口限制)，字段与按天展开的任务相同。
+    """
+    if not interval["first_date"]:
+        yield "unknown_date", {
+            "record_id": interval["record_id"],
+            "task_name": interval["task_name"],
+            "assignee": interval["assignee"],
+            "status": interval["status"],
+            "priority": interval["priority"],
+            "application_status": interval["application_status"],
+            "date": "",  # 日期为空
+            "start_date": interval["start_date"],
+            "end_date": interval["end_date"],
+            "weekday": "unknown_date"
+        }
+        return
+
+    first = date_str_to_ordinal(interval["first_date"])
+    last = date_str_to_ordinal(interval["last_date"])
+    if window_start:
+        first = max(first, date_str_to_ordinal(window_start))
+    if window_end:
+        last = min(last, date_str_to_ordinal(window_end))
+    for ordinal in range(first, last + 1):
+        key = WEEKDAY_KEYS[(ordinal + 6) % 7]
+        # 构造前端需要的任务对象
+        yield key, {
+            "record_id": interval["record_id"],
+            "task_name": interval["task_name"],
+            "assignee": interval["assignee"],
+            "status": interval["status"],
+            "priority": interval["priority"],  # 保留原始优先级字段
+            "application_status": interval["application_status"],  # 添加申请状态字段
+            "date": ordinal_to_date_str(ordinal),
+            "start_date": interval["start_date"],
+            "end_date": interval["end_date"],
+            "weekday": key
+        }
+
+
+def _expand_intervals_vectorized(intervals: List[Dict[str, Any]], task_groups: Dict[str, List[Dict[str, Any]]]):
+    """用 NumPy 批量展开区间，结果与逐条调用 expand_interval() 相同 (同一分组内顺序也相同)
+
+    所有区间的日序号一次性算出 (repeat + arange)，日期字符串用 datetime64 批量格式化，
+    Python 层只剩逐行构造任务字典。
+    """
+    dated = []
+    for interval in intervals:
+        if interval["first_date"]:
+            dated.append(interval)
+        else:
+            for key, task_item in expand_interval(interval):
+                task_groups[key].append(task_item)
+    if not dated:
+        return
+
+    firsts = np.fromiter((date_str_to_ordinal(i["first_date"]) for i in dated), dtype=np.int64, count=len(dated))
+    lasts = np.fromiter((date_str_to_ordinal(i["last_date"]) for i in dated), dtype=np.int64, count=len(dated))
+    lengths = lasts - firsts + 1
+    owners = np.repeat(np.arange(len(dated)), lengths)
+    # 每行在所属区间内的偏移: 全局行号 - 所属区间第一行的行号
+    starts = np.cumsum(lengths) - lengths
+    ordinals = firsts[owners] + (np.arange(int(lengths.sum())) - starts[owners])
+    date_strs = np.datetime_as_string((ordinals - EPOCH_ORDINAL).astype("datetime64[D]"), unit="D")
+    weekdays = (ordinals + 6) % 7
+
+    for owner, date_str, weekday in zip(owners.tolist(), date_strs.tolist(), weekdays.tolist()):
+        interval = dated[owner]
+        key = WEEKDAY_KEYS[weekday]
+        task_groups[key].append({
+            "record_id": interval["record_id"],
+            "task_name": interval["task_name"],
+            "assignee": interval["assignee"],
+            "status": interval["status"],
+            "priority": interval["priority"],
+            "application_status": interval["application_status"],
+            "date": date_str,
+            "start_date": interval["start_date"],
+            "end_date": interval["end_date"],
+            "weekday": key
+        })
+
+
+def interval_span_days(interval: Dict[str, Any]) -> int:
+    """区间按天展开后的行数 (没有日期的区间为 1 行 unknown_date)"""
+    if not interval["first_date"]:
+        return 1
+    return date_str_to_ordinal(interval["last_date"]) - date_str_to_ordinal(interval["first_date"]) + 1
+
+
+def split_oversized_intervals(
+    intervals: List[Dict[str, Any]],
+    max_days: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """按展开预算拆分区间，返回 (可以按天展开的, 超过 max_days 天的)
+
+    max_days 默认取 MAX_EXPANSION_DAYS，0 表示不限制。
+    """
+    max_days = MAX_EXPANSION_DAYS if max_days is None else max_days
+    if max_days <= 0:
+        return intervals, []
+    normal, oversized = [], []
+    for interval in intervals:
+        (oversized if interval_span_days(interval) > max_days else normal).append(interval)
+    return normal, oversized
+
+
+def build_task_intervals(
+    records: List[Dict[str, Any]],
+    field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None
+) -> List[Dict[str, Any]]:
+    """将原始飞书记录转换为任务区间列表，每条记录一个 (区间存储模式使用)"""
+    extractor = get_field_extractor(field_mapping)
+    intervals = []
+    for item in records:
+        interval = build_task_interval(item, extractor)
+        if interval is not None:
+            intervals.append(interval)
+    return intervals
+
+
+def process_feishu_records(
+    records: List[Dict[str, Any]],
+    field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None
+) -> Dict[str, List[Dict[str, Any]]]:
     """
     将原始飞书记录处理并转换为前端所需的格式（按星期一分组）
-    对于跨天任务，会在每个涵盖的日期都生成一条记录
+    对于跨天任务，会在每个涵盖的日期都生成一条记录 (不受 MAX_EXPANSION_DAYS 限制，
+    展开预算在同步写库时应用，见 feishu_sync.write_changed_records)
+
+    Args:
+        field_mapping: 编译好的 FieldExtractor，或字段映射覆盖项 (见 field_schema.py)，默认使用 field_mapping.json
     """
+    return expand_task_intervals(build_task_intervals(records, get_field_extractor(field_mapping)))
+
+
+def expand_task_intervals(intervals: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """把任务区间全部按天展开并按星期分组 (记录数较多且安装了 NumPy 时批量计算)"""
     task_groups = {
         "monday": [],
         "tuesday": [],
@@ -51,167 +352,75 @@ def process_feishu_records(records: List[Dict[str, Any]]) -> Dict[str, List[Dict
         "unknown_date": []  # 可选：处理日期解析失败的数据
     }
 
-    # 星期映射
-    weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+    if np is not None and len(intervals) >= VECTORIZED_EXPANSION_MIN_RECORDS:
+        _expand_intervals_vectorized(intervals, task_groups)
+        return task_groups
 
-    for item in records:
-        record_id = item.get("record_id", "")
-        fields = item.get("fields", {})
-
-        # 1. 提取任务名称: 客户公司名称 + 工作内容
-        customer_name = fields.get(CUSTOMER_NAME_FIELD, "")
-        task_content = fields.get(TASK_CONTENT_FIELD, "")
-        task_name = f"{customer_name} {task_content}".strip()
-
-        # 2. 提取负责人 (售后工程师)
-        # 假设是一个用户列表，提取所有用户的名字
-        assignee = "未知负责人"
-        assignee_obj = fields.get(ASSIGNEE_FIELD, [])
-        if isinstance(assignee_obj, list) and len(assignee_obj) > 0:
-            assignee_names = []
-            for user in assignee_obj:
-                if isinstance(user, dict) and "name" in user:
-                    assignee_names.append(user["name"])
-            if assignee_names:
-                assignee = ", ".join(assignee_names)  # 用逗号分隔多个负责人
-        elif isinstance(assignee_obj, dict) and "name" in assignee_obj:
-            # 如果不是列表而是单个对象
-            assignee = assignee_obj["name"]
-
-        # 3. 提取状态 (现在是优先级)
-        priority = fields.get(PRIORITY_FIELD, "未知优先级")
-        
-        # 4. 提取申请状态并转换为展示状态
-        application_status = fields.get(APPLICATION_STATUS_FIELD, "")
-        # 根据申请状态转换为展示状态
-        if application_status == "审批中":
-            status = "进行中"
-        elif application_status == "已通过":
-            status = "已结束"
-        else:
-            # 如果没有申请状态或不是指定的值，则使用优先级作为默认状态
-            status = priority
-
-        # 4. 提取并转换开始和结束日期
-        # 优先使用 "服务开始时间" 和 "服务结束时间"
-        # 如果这两个字段都为空，则跳过这条记录
-        start_timestamp = fields.get(START_DATE_FIELD)
-        end_timestamp = fields.get(END_DATE_FIELD)
-        
-        # 如果主字段为空，不使用带1的备选字段
-        # 直接跳过这条记录
-        if start_timestamp is None and end_timestamp is None:
-            # 添加到 unknown_date 组，因为没有有效日期
-            task_item = {
-                "record_id": record_id,
-                "task_name": task_name,
-                "assignee": assignee,
-                "status": status,
-                "date": "",  # 日期为空
-                "start_date": "",
-                "end_date": ""
-            }
-            task_groups["unknown_date"].append(task_item)
-            continue # 跳过后续处理
-            
-        # 如果只有一个字段有值，也视为无效，跳过
-        # (根据业务需求，你也可以选择只使用有的那个字段)
-        # 这里我们选择跳过
-        if start_timestamp is None or end_timestamp is None:
-            # 添加到 unknown_date 组
-            task_item = {
-                "record_id": record_id,
-                "task_name": task_name,
-                "assignee": assignee,
-                "status": status,
-                "date": "",  # 日期为空
-                "start_date": "",
-                "end_date": ""
-            }
-            task_groups["unknown_date"].append(task_item)
-            continue # 跳过后续处理
-        
-        start_date_str = ""
-        end_date_str = ""
-        
-        if isinstance(start_timestamp, (int, float)):
-            start_date_str = convert_timestamp_to_date(int(start_timestamp))
-        if isinstance(end_timestamp, (int, float)):
-            end_date_str = convert_timestamp_to_date(int(end_timestamp))
-
-        # 5. 为每个涵盖的日期生成任务记录
-        # 如果只有开始日期或只有结束日期，则只在那一天显示
-        # 如果开始日期和结束日期都有效，则在两者之间的每一天都显示
-        dates_to_show = []
-        
-        if start_date_str and end_date_str:
-            try:
-                start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
-                end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
-                # 包含开始和结束日期
-                current_dt = start_dt
-                while current_dt <= end_dt:
-                    dates_to_show.append(current_dt.strftime("%Y-%m-%d"))
-                    current_dt += timedelta(days=1)
-            except ValueError:
-                # 日期格式无法解析
-                if start_date_str:
-                    dates_to_show.append(start_date_str)
-                elif end_date_str:
-                    dates_to_show.append(end_date_str)
-        elif start_date_str:
-            dates_to_show.append(start_date_str)
-        elif end_date_str:
-            dates_to_show.append(end_date_str)
-        else:
-            # 日期解析失败，添加到 unknown_date 组
-            task_item = {
-                "record_id": record_id,
-                "task_name": task_name,
-                "assignee": assignee,
-                "status": status,
-                "date": "",  # 日期为空
-                "start_date": start_date_str,
-                "end_date": end_date_str
-            }
-            task_groups["unknown_date"].append(task_item)
-            continue # 跳过后续处理
-
-        # 6. 为每个日期创建任务记录并分组
-        for date_str in dates_to_show:
-            # 确定星期几并分组
-            weekday_key = "unknown_date"
-            try:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                weekday_index = date_obj.weekday()  # Monday is 0, Sunday is 6
-                if 0 <= weekday_index <= 4:
-                    weekday_key = weekdays[weekday_index]
-                else:
-                    weekday_key = "weekend"
-            except ValueError:
-                # 日期格式无法解析
-                pass
-
-            # 构造前端需要的任务对象
-            task_item = {
-                "record_id": record_id,
-                "task_name": task_name,
-                "assignee": assignee,
-                "status": status,
-                "priority": priority,  # 保留原始优先级字段
-                "application_status": application_status,  # 添加申请状态字段
-                "date": date_str,
-                "start_date": start_date_str,
-                "end_date": end_date_str,
-                "weekday": weekday_key
-            }
-
-            # 添加到对应的分组
-            task_groups[weekday_key].append(task_item)
+    for interval in intervals:
+        for key, task_item in expand_interval(interval):
+            task_groups[key].append(task_item)
+
+    return task_groups
 
+
+def _project_record(item: Dict[str, Any], field_names: List[str]) -> Dict[str, Any]:
+    """只保留处理用到的字段，减少发往子进程的数据量"""
+    fields = item.get("fields", {})
+    return {
+        "record_id": item.get("record_id", ""),
+        "fields": {name: fields[name] for name in field_names if name in fields}
+    }
+
+
+def process_feishu_records_parallel(
+    records: List[Dict[str, Any]],
+    field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """多进程版本的 process_feishu_records()，结果 (分组及组内顺序) 与串行版本相同
+
+    记录按顺序切成若干块，在 ProcessPoolExecutor 中分别转换，再按块的顺序合并各分组。
+    进程间传输有固定开销，只有一块或只有一个进程时直接串行处理。
+
+    Args:
+        workers: 进程数，默认 PROCESS_POOL_WORKERS (0 表示 CPU 核数)
+        chunk_size: 每块记录数，默认 PROCESS_POOL_CHUNK_SIZE
+    """
+    extractor = get_field_extractor(field_mapping)
+    chunk_size = chunk_size or PROCESS_POOL_CHUNK_SIZE
+    workers = workers or PROCESS_POOL_WORKERS or os.cpu_count() or 1
+    if len(records) <= chunk_size or workers <= 1:
+        return process_feishu_records(records, extractor)
+
+    field_names = extractor.field_names
+    chunks = [
+        [_project_record(item, field_names) for item in records[i:i + chunk_size]]
+        for i in range(0, len(records), chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        # map() 按提交顺序返回结果，保证合并后的顺序与串行处理一致
+        # 编译后的提取器不能跨进程传递，传完整的映射配置由子进程重新编译
+        results = pool.map(process_feishu_records, chunks, [extractor.specs] * len(chunks))
+        task_groups = next(results)
+        for groups in results:
+            for key, tasks in groups.items():
+                task_groups[key].extend(tasks)
     return task_groups
 
 
+def process_records(
+    records: List[Dict[str, Any]],
+    field_mapping: Union[FieldExtractor, Dict[str, Any], None] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """一次转换整表时按配置选择串行或多进程: 默认串行，配置了多个进程 (PROCESS_POOL_WORKERS) 且
+    记录数不少于 PROCESS_POOL_MIN_RECORDS 时才使用进程池。同步流程不经过这里 (见 PROCESS_POOL_WORKERS)"""
+    workers = PROCESS_POOL_WORKERS or os.cpu_count() or 1
+    if workers > 1 and len(records) >= PROCESS_POOL_MIN_RECORDS:
+        return process_feishu_records_parallel(records, field_mapping, workers=workers)
+    return process_feishu_records(records, field_mapping)
+
+
 if __name__ == "__main__":
     CONFIG = {
         "app_id": os.getenv("FEISHU_APP_ID"),
@@ -229,7 +438,7 @@ if __name__ == "__main__":
         exit(1)
 
     logger.info("成功获取到 %d 条原始记录，开始处理...", len(raw_records))
-    processed_tasks = process_feishu_records(raw_records)
+    processed_tasks = process_records(raw_records)
 
     # 打印处理结果统计
     logger.info("处理结果统计:")
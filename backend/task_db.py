@@ -1,9 +1,18 @@
 import sqlite3
-from typing import Dict, List, Any, Optional
+import hashlib
+import json
+import re
+from typing import Callable, Deque, Dict, List, Any, Optional, Tuple
 import os
 from datetime import datetime, timedelta
+import time
 import logging
+import threading
+from collections import deque
 from contextlib import contextmanager
+from urllib.parse import quote
+
+from process_feishu_data import WEEKDAY_KEYS, date_str_to_ordinal, expand_interval, ordinal_to_date_str
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,14 +24,378 @@ logger = logging.getLogger(__name__)
 # 优先使用环境变量，本地开发时使用相对路径，Docker中使用/app/db/tasks.db
 DB_FILE = os.getenv("DB_FILE", "./data/db/tasks.db")
 
+# 单表同步时任务的默认来源标记
+DEFAULT_SOURCE = "default"
 
-@contextmanager
-def get_db_connection():
-    """数据库连接上下文管理器，自动处理提交/回滚"""
-    conn = sqlite3.connect(DB_FILE, timeout=10.0)
-    conn.execute("PRAGMA journal_mode=WAL")
+# 任务存储模式:
+# - daily: 跨天任务在 tasks 表中每天一行 (默认)
+# - interval: 每条记录在 task_intervals 表中只存一行 (开始/结束日期)，查询时只在请求的日期范围内按天展开
+# 查询总是同时读取两张表，切换模式后各数据源下一次同步会把任务迁移到新表
+TASK_STORAGE_MODE = os.getenv("TASK_STORAGE_MODE", "daily")
+
+TASK_COLUMNS = "record_id, task_name, assignee, status, priority, application_status, date, start_date, end_date, weekday, source"
+INTERVAL_COLUMNS = "record_id, task_name, assignee, status, priority, application_status, start_date, end_date, first_date, last_date, source"
+# 合并写入时逐行比较的列 (同一数据源内行以 record_id + date 为键)
+MERGE_COLUMNS = ("task_name", "assignee", "status", "priority", "application_status", "start_date", "end_date", "weekday")
+
+# 紧凑行格式: 日期列存日序号 (date.toordinal()，没有日期时为 0)，取值有限的列存 value_codes 表中的小整数编码。
+# 行和索引项都小得多，更多的数据能留在页缓存中。读取时解码，API 返回的仍是原来的字符串
+DATE_COLUMNS = ("date", "start_date", "end_date", "first_date", "last_date")
+CODED_COLUMNS = ("status", "priority", "application_status", "weekday")
+# 预置编码 (从 1 开始按列表顺序)。优先级按严重程度递增，ORDER BY priority DESC 即最紧急的在前；
+# 其他值首次写入时分配 0, -1, -2 …，排在预置值之后
+VALUE_CODE_SEEDS = {
+    "priority": ["普通", "重要", "紧急", "非常紧急"],
+    "weekday": ["monday", "tuesday", "wednesday", "thursday", "friday", "weekend", "unknown_date"],
+}
+# 数据库结构版本 (PRAGMA user_version): 2 为紧凑行格式，3 为 tasks 以 (source, record_id, date) 为唯一键，
+# 旧版本在 init_db() 中原地转换
+SCHEMA_VERSION = 3
+
+# 日历维度表: 每天一行，带星期、周 (周日/周一开始)、ISO 周、月份和工作日标记，统计时与任务按日序号连接。
+# 节假日和调休安排来自 HOLIDAYS_FILE (国务院办公厅每年发布的放假通知)，没有安排的年份按周一至周五上班计算
+HOLIDAYS_FILE = os.getenv(
+    "HOLIDAYS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays_cn.json")
+)
+# 日历覆盖的年份 (含首尾)，超出范围的日期不参与按周/按月统计
+CALENDAR_YEARS = (2000, 2050)
+CALENDAR_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS calendar (
+        day INTEGER PRIMARY KEY,        -- 日序号，与 tasks.date 相同
+        date TEXT NOT NULL,             -- YYYY-MM-DD
+        weekday INTEGER NOT NULL,       -- 0 为周一 … 6 为周日
+        week_sunday INTEGER NOT NULL,   -- 所在周 (周日开始) 第一天的日序号
+        week_monday INTEGER NOT NULL,   -- 所在周 (周一开始) 第一天的日序号
+        iso_year INTEGER NOT NULL,
+        iso_week INTEGER NOT NULL,
+        month INTEGER NOT NULL,         -- YYYYMM
+        is_workday INTEGER NOT NULL,    -- 法定节假日为 0，调休上班的周末为 1
+        holiday TEXT,                   -- 节假日名称
+        bucket TEXT NOT NULL            -- 任务分组键 (monday … friday / weekend)
+    )
+"""
+# 调休上班的周末不放在周末分组: 周日并入周一、周六并入周五 (前端一周从周日开始，即同一周相邻的工作日)
+MAKEUP_DAY_BUCKETS = {5: "friday", 6: "monday"}
+
+# fix_view.py 创建的本周 (周一至周日) 任务视图。date 为日序号: julianday(YYYY-MM-DD) - 1721424.5 即 date.toordinal()
+CURRENT_WEEK_VIEW = "current_week_tasks_view"
+CURRENT_WEEK_VIEW_SQL = f"""
+    CREATE VIEW {CURRENT_WEEK_VIEW} AS
+    SELECT * FROM tasks
+    WHERE date != 0 AND date BETWEEN
+        CAST(julianday(DATE('now', 'weekday 1', '-7 days')) - 1721424.5 AS INTEGER)  -- 本周一
+        AND
+        CAST(julianday(DATE('now', 'weekday 1', '-1 day')) - 1721424.5 AS INTEGER)   -- 本周日
+"""
+
+# 全量重建 tasks 时先写入的影子表: 写完并建好索引后，在同一事务末尾删除旧表并把影子表改名为 tasks
+STAGING_TABLE = "tasks_staging"
+# tasks 表的二级索引: (两个轮换使用的索引名, 索引定义)。影子表改名后索引名不变，下次重建时换用另一个。
+# 按日期查询的索引都是不含无日期行 (date = 0) 的部分索引，查询条件中须带上 date != 0 才能使用
+TASK_INDEXES = [
+    # 日期范围查询 (/api/tasks)、单日按负责人和优先级排序 (/api/tasks/by-date)、
+    # 统计按日期 + 负责人 + 优先级分组计数 (/api/tasks/stats，只读索引不回表)
+    (("idx_tasks_day", "idx_tasks_day_alt"), "(date, assignee, priority DESC) WHERE date != 0"),
+    # 无日期的任务 (/api/tasks 同时返回)
+    (("idx_tasks_undated", "idx_tasks_undated_alt"), "(assignee) WHERE date = 0"),
+]
+
+# 负责人维度: 一条任务可能有多个负责人 (assignee 为 "张三, 李四")，同步时拆分后写入关联表，
+# 按工程师查询和统计走关联表的索引，不需要对 assignee 做 LIKE 扫描。关联行由 TaskWriter 在提交前刷新
+ASSIGNEE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS engineers (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    # tasks 表每一行的每个负责人一行。priority 冗余自 tasks，统计时只读本表的索引
+    """
+    CREATE TABLE IF NOT EXISTS task_assignees (
+        engineer_id INTEGER NOT NULL, -- engineers.id
+        date INTEGER NOT NULL,        -- 同 tasks.date (日序号，无日期时为 0)
+        task_id INTEGER NOT NULL,     -- tasks.id
+        priority INTEGER NOT NULL,    -- 同 tasks.priority (编码)
+        source TEXT NOT NULL,
+        record_id TEXT NOT NULL,
+        PRIMARY KEY (engineer_id, date, task_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_task_assignees_day ON task_assignees (date, engineer_id, priority)",
+    "CREATE INDEX IF NOT EXISTS idx_task_assignees_record ON task_assignees (source, record_id)",
+    # task_intervals 表每一行的每个负责人一行
+    """
+    CREATE TABLE IF NOT EXISTS interval_assignees (
+        engineer_id INTEGER NOT NULL, -- engineers.id
+        interval_id INTEGER NOT NULL, -- task_intervals.id
+        source TEXT NOT NULL,
+        record_id TEXT NOT NULL,
+        PRIMARY KEY (engineer_id, interval_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_interval_assignees_record ON interval_assignees (source, record_id)",
+]
+# 拆分 assignee 的分隔符: 人员字段以 ", " 连接，文本字段常见中文逗号和顿号
+ASSIGNEE_SEPARATORS = re.compile(r"[,，、]")
+
+
+# 全文检索表: FTS5 trigram 分词 (SQLite 3.34+)，按连续三个字符建索引，中文客户名称和工作内容不需要分词词典。
+# 每条记录一行，rowid 为 (source, record_id) 的 64 位摘要，由 TaskWriter 在提交前刷新。
+# SQLite 不支持时 search_tasks 退回对任务表的 LIKE 扫描
+SEARCH_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5(
+        task_name, assignee, source UNINDEXED, record_id UNINDEXED, last_date UNINDEXED,
+        tokenize = 'trigram'
+    )
+"""
+# trigram 索引无法检索两个字的关键词 (如姓名、"巡检")。task_search_bigrams 以同样的 rowid 存每条记录中
+# 所有相邻两个字 (空格分隔，每个是一个词)，两个字的关键词按词匹配
+SEARCH_BIGRAM_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS task_search_bigrams USING fts5(bigrams, tokenize = 'unicode61')
+"""
+# 搜索结果高亮标记
+SEARCH_HIGHLIGHT = ("<mark>", "</mark>")
+# init_db() 检测到 FTS5 trigram 可用时为 True
+_search_enabled = False
+
+
+# 连接参数 (PRAGMA) 配置，格式为逗号分隔的 name=value:
+# - 写配置用于同步写库 (open_task_writer)。WAL 模式下 synchronous=NORMAL 不会损坏数据库，
+#   只是掉电时可能丢失最后几个事务，下次同步会重新写入
+# - 读配置用于 API 查询等其他连接
+SQLITE_WRITE_PRAGMAS = os.getenv(
+    "SQLITE_WRITE_PRAGMAS", "synchronous=NORMAL,cache_size=-65536,temp_store=MEMORY,mmap_size=268435456"
+)
+SQLITE_READ_PRAGMAS = os.getenv(
+    "SQLITE_READ_PRAGMAS", "cache_size=-16384,temp_store=MEMORY,mmap_size=268435456"
+)
+
+
+def parse_pragmas(value: str) -> List[Tuple[str, str]]:
+    """解析 "name=value,name=value" 形式的 PRAGMA 配置
+
+    Raises:
+        ValueError: 名称或取值不合法 (只允许标识符和整数 / 单词取值)
+    """
+    pragmas = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, setting = (part.strip() for part in item.partition("="))
+        if not name.isidentifier() or not setting.lstrip("-").isalnum():
+            raise ValueError(f"Invalid SQLite pragma: {item!r}")
+        pragmas.append((name, setting))
+    return pragmas
+
+
+PRAGMA_PROFILES = {
+    "read": parse_pragmas(SQLITE_READ_PRAGMAS),
+    "write": parse_pragmas(SQLITE_WRITE_PRAGMAS),
+}
+
+
+# 连接池: 只读连接数上限，以及连接全部被占用时取连接的最长等待秒数
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+SQLITE_POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", "5"))
+
+
+class ConnectionPoolTimeout(sqlite3.OperationalError):
+    """等待 SQLITE_POOL_TIMEOUT 秒后仍没有空闲的只读连接"""
+
+
+def _connect(profile: str, read_only: bool = False) -> sqlite3.Connection:
+    """打开一个连接并应用 PRAGMA 配置。池中的连接会在不同线程间复用 (同一时刻只有一个线程使用)"""
+    if read_only:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(DB_FILE))}?mode=ro", uri=True,
+                               timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+    else:
+        conn = sqlite3.connect(DB_FILE, timeout=10.0, check_same_thread=False)
     conn.execute("PRAGMA foreign_keys=ON")
+    for name, setting in PRAGMA_PROFILES[profile]:
+        conn.execute(f"PRAGMA {name}={setting}")
     conn.row_factory = sqlite3.Row  # 返回字典式行
+    return conn
+
+
+class ConnectionPool:
+    """SQLite 连接池
+
+    查询从池中取只读连接 (mode=ro + query_only)，用完放回复用，省去每次请求的连接和 PRAGMA 开销；
+    同步写库共用一个写连接，同一时刻只有一个写事务 (SQLite 本身也只允许一个写者)。
+    """
+
+    def __init__(self, size: int, timeout: float):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._waiters: Deque[Dict[str, Any]] = deque()
+        self._opened = 0
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._stats = {"checkouts": 0, "waits": 0, "timeouts": 0, "checkout_seconds": 0.0, "max_checkout_seconds": 0.0,
+                       "writer_checkouts": 0, "writer_wait_seconds": 0.0, "max_writer_wait_seconds": 0.0}
+
+    def _record(self, prefix: str, seconds: float):
+        with self._cond:
+            self._stats[f"{prefix}checkouts"] += 1
+            key = "checkout_seconds" if not prefix else "writer_wait_seconds"
+            self._stats[key] += seconds
+            self._stats[f"max_{key}"] = max(self._stats[f"max_{key}"], seconds)
+
+    @contextmanager
+    def reader(self):
+        """取一个只读连接，连接全部被占用时最多等待 timeout 秒
+
+        等待者按先来后到排队，归还的连接直接交给队首，查询密集时后到的请求不会插队把同步饿死。
+
+        Raises:
+            ConnectionPoolTimeout: 等待超时
+        """
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        conn = None
+        with self._cond:
+            if not self._waiters and self._idle:
+                conn = self._idle.pop()
+            elif not self._waiters and self._opened < self.size:
+                self._opened += 1
+            else:
+                # 排队等待归还的连接 (granted 后 conn 为 None 表示可以新开一个连接)
+                waiter = {"granted": False, "conn": None}
+                self._waiters.append(waiter)
+                self._stats["waits"] += 1
+                while not waiter["granted"]:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._waiters.remove(waiter)
+                        self._stats["timeouts"] += 1
+                        raise ConnectionPoolTimeout(f"No database connection available within {self.timeout}s")
+                    self._cond.wait(remaining)
+                conn = waiter["conn"]
+            generation = self._generation
+        if conn is None:
+            try:
+                conn = _connect("read", read_only=True)
+            except Exception:
+                self._release(None, generation)
+                raise
+        self._record("", time.perf_counter() - started)
+
+        try:
+            yield conn
+        finally:
+            try:
+                conn.rollback()  # 结束读事务，释放 WAL 快照
+                reusable = True
+            except sqlite3.Error:
+                reusable = False
+            if not reusable:
+                conn.close()
+                conn = None
+            self._release(conn, generation)
+
+    def _release(self, conn: Optional[sqlite3.Connection], generation: int):
+        """归还连接 (None 表示连接已关闭，空出一个名额)，有等待者时直接交给队首"""
+        with self._cond:
+            if conn is not None and generation != self._generation:
+                # 连接池已重置 (数据库重建)，旧连接不再复用
+                conn.close()
+                conn = None
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter["conn"], waiter["granted"] = conn, True
+                self._cond.notify_all()
+            elif conn is not None:
+                self._idle.append(conn)
+            else:
+                self._opened -= 1
+
+    @contextmanager
+    def writer(self):
+        """独占共享的写连接，正常退出时提交，出错时回滚"""
+        started = time.perf_counter()
+        with self._writer_lock:
+            self._record("writer_", time.perf_counter() - started)
+            if self._writer is None:
+                self._writer = _connect("write")
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def reset(self):
+        """关闭所有连接 (数据库文件被替换或重建后调用)，使用中的只读连接在归还时关闭"""
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池状态: 连接数、等待/超时次数、取连接耗时 (毫秒)"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle, opened = len(self._idle), self._opened
+        checkouts, writer_checkouts = stats["checkouts"], stats["writer_checkouts"]
+        return {
+            "size": self.size,
+            "open": opened,
+            "idle": idle,
+            "in_use": opened - idle,
+            "checkouts": checkouts,
+            "waits": stats["waits"],
+            "timeouts": stats["timeouts"],
+            "avg_checkout_ms": round(stats["checkout_seconds"] / checkouts * 1000, 3) if checkouts else 0.0,
+            "max_checkout_ms": round(stats["max_checkout_seconds"] * 1000, 3),
+            "writer_checkouts": writer_checkouts,
+            "writer_avg_wait_ms": round(stats["writer_wait_seconds"] / writer_checkouts * 1000, 3) if writer_checkouts else 0.0,
+            "writer_max_wait_ms": round(stats["max_writer_wait_seconds"] * 1000, 3),
+        }
+
+
+_pool = ConnectionPool(SQLITE_POOL_SIZE, SQLITE_POOL_TIMEOUT)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """数据库连接池状态 (供 /health 输出)"""
+    return _pool.stats()
+
+
+def close_connection_pool():
+    """关闭池中所有连接"""
+    _pool.reset()
+
+
+@contextmanager
+def get_db_connection(profile: str = "read"):
+    """数据库连接上下文管理器
+
+    Args:
+        profile: "read" (默认) 从连接池取只读连接，用完归还；
+                 "write" 打开一个新的读写连接，退出时自动提交/回滚后关闭 (用于少量写入，
+                 同步的批量写入使用 open_task_writer 的共享写连接)
+    """
+    if profile == "read":
+        with _pool.reader() as conn:
+            try:
+                yield conn
+            except sqlite3.Error as e:
+                logger.error(f"Database error: {e}")
+                raise
+        return
+
+    conn = _connect(profile)
     try:
         yield conn
         conn.commit()
@@ -36,35 +409,287 @@ def get_db_connection():
 def init_db():
     """初始化数据库，创建任务表"""
     os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+    # 数据库文件可能被替换过，丢弃池中的旧连接和编码缓存
+    _pool.reset()
+    _value_names.clear()
+    _makeup_buckets.clear()
 
-    with get_db_connection() as conn:
+    with get_db_connection("write") as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
         cursor = conn.cursor()
 
         # 创建存储处理后任务的表 (用于API查询)
-        # 修改表结构以支持跨天任务和新字段
+        _create_tasks_table(cursor, "tasks")
+
+        # 旧版本数据库没有 source 列，补上
+        columns = {row["name"] for row in cursor.execute("PRAGMA table_info(tasks)")}
+        if "source" not in columns:
+            cursor.execute("ALTER TABLE tasks ADD COLUMN source TEXT NOT NULL DEFAULT 'default'")
+            logger.info("Added column 'source' to table 'tasks'.")
+
+        # 编码列的取值字典
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                record_id TEXT NOT NULL,
-                task_name TEXT NOT NULL,
-                assignee TEXT NOT NULL,
-                status TEXT NOT NULL, -- 展示状态（进行中/已结束/优先级）
-                priority TEXT NOT NULL, -- 原始优先级
-                application_status TEXT, -- 申请状态
-                date TEXT NOT NULL,   -- 任务在这一天展示 (YYYY-MM-DD)
-                start_date TEXT,      -- 任务实际开始日期 (YYYY-MM-DD)
-                end_date TEXT,        -- 任务实际结束日期 (YYYY-MM-DD)
-                weekday TEXT NOT NULL, -- monday, tuesday, etc.
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                -- 添加唯一约束，防止重复插入同一天的同一条记录
-                UNIQUE(record_id, date)
+            CREATE TABLE IF NOT EXISTS value_codes (
+                kind TEXT NOT NULL,   -- 列名 (CODED_COLUMNS)
+                code INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (kind, code),
+                UNIQUE (kind, value)
             )
         """)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO value_codes (kind, code, value) VALUES (?, ?, ?)",
+            [(kind, code, value) for kind, values in VALUE_CODE_SEEDS.items() for code, value in enumerate(values, 1)]
+        )
+        # 区间存储模式的任务表: 每条记录一行
+        _create_intervals_table(cursor, "task_intervals")
+
+        # 旧版本的文本行格式原地转换为紧凑行格式 (转换时按新结构建表)；
+        # 紧凑格式但唯一键不含 source 的 tasks 表单独重建
+        if cursor.execute("PRAGMA user_version").fetchall()[0][0] < SCHEMA_VERSION:
+            column_types = {row["name"]: row["type"] for row in cursor.execute("PRAGMA table_info(tasks)").fetchall()}
+            table_sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'").fetchall()[0][0]
+            if column_types["date"] == "TEXT":
+                _migrate_compact_rows(conn)
+            elif "UNIQUE(record_id, date)" in table_sql:
+                _migrate_task_key(conn)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
+        # 每个索引都会拖慢同步写入: 没有查询按 weekday 过滤，按数据源和 record_id 查询、删除可以用
+        # UNIQUE(source, record_id, date) 的索引，以下索引只有写入开销
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_weekday")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_record_id")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_source")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_source_record")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_source_record_alt")
+        # 单列日期索引已被 idx_tasks_day 取代
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_date")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_date_alt")
+        # 按负责人查询改走 task_assignees
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_assignee_day")
+        cursor.execute("DROP INDEX IF EXISTS idx_tasks_assignee_day_alt")
         # 创建索引
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_weekday ON tasks (weekday)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_date ON tasks (date)")
-    logger.info("Database initialized. Table 'tasks' is ready.")
+        _create_task_indexes(cursor, "tasks")
+
+        # 同步状态表 (增量同步的高水位、上次全量同步时间等)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 日历维度表，节假日安排变化时重新生成
+        cursor.execute(CALENDAR_TABLE_SQL)
+        _refresh_calendar(cursor)
+
+        # 区间与查询范围重叠: last_date >= 开始日期 对近期查询区分度更高，放在前面；
+        # 带上负责人和优先级，统计时只读索引。与 tasks 表一样，有日期和无日期的行分开建部分索引。
+        # 按负责人查询走 interval_assignees
+        cursor.execute("DROP INDEX IF EXISTS idx_task_intervals_range")
+        cursor.execute("DROP INDEX IF EXISTS idx_task_intervals_assignee")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_task_intervals_span
+            ON task_intervals (last_date, first_date, assignee, priority) WHERE first_date != 0
+        """)
+        cursor.execute("DROP INDEX IF EXISTS idx_task_intervals_assignee_span")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_intervals_undated ON task_intervals (assignee) WHERE first_date = 0")
+
+        # 每条飞书记录相关字段的内容哈希，同步时跳过内容未变化的记录
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS record_hashes (
+                source TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (source, record_id)
+            )
+        """)
+
+        # 负责人维度表和关联表、全文检索表，新建时从已有任务回填
+        global _search_enabled
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('task_assignees', 'interval_assignees')")
+        assignees_exist = cursor.fetchone()[0] == 2
+        for sql in ASSIGNEE_TABLES_SQL:
+            cursor.execute(sql)
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('task_search', 'task_search_bigrams')")
+        search_exists = cursor.fetchone()[0] == 2
+        try:
+            cursor.execute(SEARCH_TABLE_SQL)
+            cursor.execute(SEARCH_BIGRAM_TABLE_SQL)
+            _search_enabled = True
+        except sqlite3.OperationalError as e:
+            _search_enabled = False
+            logger.warning("FTS5 trigram search unavailable (SQLite %s), search falls back to LIKE: %s",
+                           sqlite3.sqlite_version, e)
+        backfill_search = _search_enabled and not search_exists
+        if not assignees_exist or backfill_search:
+            cursor.execute("SELECT source FROM tasks UNION SELECT source FROM task_intervals")
+            for (source,) in cursor.fetchall():
+                writer = TaskWriter(conn.cursor(), source)
+                writer.dirty_all = True
+                if not assignees_exist:
+                    writer.flush_assignees()
+                if backfill_search:
+                    writer.flush_search()
+            if not assignees_exist:
+                logger.info("Built engineer tables 'engineers', 'task_assignees' and 'interval_assignees'.")
+            if backfill_search:
+                logger.info("Built full-text search index 'task_search'.")
+    logger.info("Database initialized. Tables 'tasks', 'task_intervals', 'calendar', 'sync_state' and 'record_hashes' are ready.")
+
+
+def _create_tasks_table(cursor, table: str):
+    """创建任务表 (tasks 或重建用的影子表，两者结构相同)"""
+    # 修改表结构以支持跨天任务和新字段
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id TEXT NOT NULL,
+            task_name TEXT NOT NULL,
+            assignee TEXT NOT NULL,
+            status INTEGER NOT NULL, -- 展示状态（进行中/已结束/优先级，编码）
+            priority INTEGER NOT NULL, -- 原始优先级 (编码，越大越紧急)
+            application_status INTEGER, -- 申请状态 (编码)
+            date INTEGER NOT NULL, -- 任务在这一天展示 (日序号，没有日期时为 0)
+            start_date INTEGER,   -- 任务实际开始日期 (日序号)
+            end_date INTEGER,     -- 任务实际结束日期 (日序号)
+            weekday INTEGER NOT NULL, -- monday, tuesday, etc. (编码)
+            source TEXT NOT NULL DEFAULT 'default', -- 数据来源 (多表同步时区分各个多维表格)
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            -- 添加唯一约束，防止重复插入同一天的同一条记录 (不同数据表的 record_id 可能相同，须带上 source)
+            UNIQUE(source, record_id, date)
+        )
+    """)
+
+
+def _create_intervals_table(cursor, table: str):
+    """创建区间存储模式的任务表"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id TEXT NOT NULL,
+            task_name TEXT NOT NULL,
+            assignee TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            priority INTEGER NOT NULL,
+            application_status INTEGER,
+            start_date INTEGER,   -- 任务实际开始日期 (日序号，展示用)
+            end_date INTEGER,     -- 任务实际结束日期 (日序号，展示用)
+            first_date INTEGER NOT NULL, -- 覆盖的第一天，没有有效日期时为 0
+            last_date INTEGER NOT NULL,  -- 覆盖的最后一天
+            source TEXT NOT NULL DEFAULT 'default',
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(source, record_id)
+        )
+    """)
+
+
+def _drop_dependent_views(cursor, tables: Tuple[str, ...]) -> List[Tuple[str, str]]:
+    """删除引用了 tables 中任一表 (或引用了这些视图) 的视图，按创建顺序返回 [(视图名, 建视图的 SQL)]
+
+    SQLite 改名或删除表时会重新解析所有视图，视图引用的表暂时不存在就会报错，
+    所以替换表之前先删除这些视图，替换完成后在同一事务中用 _restore_views 重建。
+    """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view' ORDER BY rowid")
+    views = [(row[0], row[1]) for row in cursor.fetchall()]
+    names = set(tables)
+    changed = True
+    while changed:
+        changed = False
+        pattern = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, names)), re.IGNORECASE)
+        for name, sql in views:
+            if name not in names and pattern.search(sql):
+                names.add(name)
+                changed = True
+    dependent = [(name, sql) for name, sql in views if name in names]
+    for name, _ in dependent:
+        cursor.execute(f'DROP VIEW "{name}"')
+    return dependent
+
+
+def _restore_views(cursor, views: List[Tuple[str, str]]):
+    """重建 _drop_dependent_views 删除的视图"""
+    for _, sql in views:
+        cursor.execute(sql)
+
+
+def _migrate_compact_rows(conn: sqlite3.Connection):
+    """把旧版本 (日期、状态等存为文本) 的 tasks 和 task_intervals 原地转换为紧凑行格式
+
+    在 init_db() 的事务中执行。负责人关联表和全文检索表随后从转换后的任务回填。
+    引用这两张表的视图按文本日期编写，转换后不再正确: fix_view.py 的本周任务视图
+    改写为按日序号比较，其他视图删除。
+    """
+    cursor = conn.cursor()
+    views = _drop_dependent_views(cursor, ("tasks", "task_intervals"))
+    codes = ValueCodes(cursor)
+    for column in CODED_COLUMNS:
+        tables = ("tasks",) if column == "weekday" else ("tasks", "task_intervals")
+        for table in tables:
+            cursor.execute(f"SELECT DISTINCT {column} FROM {table}")
+            for (value,) in cursor.fetchall():
+                codes.encode(column, value)
+    conn.create_function("day_ordinal", 1, _day, deterministic=True)
+    conn.create_function("value_code", 2, lambda kind, value: codes.codes[kind].get(value), deterministic=True)
+
+    for table, create, columns in (
+        ("tasks", _create_tasks_table, TASK_COLUMNS),
+        ("task_intervals", _create_intervals_table, INTERVAL_COLUMNS),
+    ):
+        expressions = ", ".join(
+            f"day_ordinal({column})" if column in DATE_COLUMNS
+            else f"value_code('{column}', {column})" if column in CODED_COLUMNS
+            else column
+            for column in columns.split(", ")
+        )
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+        create(cursor, table)
+        cursor.execute(f"""
+            INSERT INTO {table} (id, {columns}, last_updated)
+            SELECT id, {expressions}, last_updated FROM {table}_v1
+        """)
+        cursor.execute(f"DROP TABLE {table}_v1")
+    # 派生表中的日期也是旧格式，删除后由 init_db() 重新回填
+    for table in ("task_assignees", "interval_assignees", "task_search", "task_search_bigrams"):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    for name, _ in views:
+        if name == CURRENT_WEEK_VIEW:
+            cursor.execute(CURRENT_WEEK_VIEW_SQL)
+        else:
+            logger.warning("Dropped view '%s': it compares text dates and cannot be converted automatically.", name)
+    logger.info("Converted tables 'tasks' and 'task_intervals' to the compact row format (schema version %d).",
+                SCHEMA_VERSION)
+
+
+def _migrate_task_key(conn: sqlite3.Connection):
+    """把唯一键为 (record_id, date) 的 tasks 表重建为以 (source, record_id, date) 为唯一键
+
+    在 init_db() 的事务中执行。保留行 id，负责人关联表和全文检索表不需要回填。
+    列的格式不变，引用 tasks 的视图在改名前删除、重建新表后原样恢复。
+    """
+    cursor = conn.cursor()
+    views = _drop_dependent_views(cursor, ("tasks",))
+    cursor.execute("ALTER TABLE tasks RENAME TO tasks_v2")
+    _create_tasks_table(cursor, "tasks")
+    cursor.execute(f"""
+        INSERT INTO tasks (id, {TASK_COLUMNS}, last_updated)
+        SELECT id, {TASK_COLUMNS}, last_updated FROM tasks_v2
+    """)
+    cursor.execute("DROP TABLE tasks_v2")
+    _restore_views(cursor, views)
+    logger.info("Rebuilt table 'tasks' with UNIQUE(source, record_id, date) (schema version %d).", SCHEMA_VERSION)
+
+
+def _create_task_indexes(cursor, table: str):
+    """为任务表创建 TASK_INDEXES 中的索引，已存在时跳过，索引名取两个候选中未被占用的一个"""
+    cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")
+    existing = dict(cursor.fetchall())
+    for names, definition in TASK_INDEXES:
+        if any(existing.get(name) == table for name in names):
+            continue
+        name = next(name for name in names if name not in existing)
+        cursor.execute(f"CREATE INDEX {name} ON {table} {definition}")
 
 
 def get_week_range(date=None, week_start="sunday") -> tuple[str, str]:
@@ -137,47 +762,974 @@ def get_current_week_dates() -> tuple[str, str]:
 
 
 
-def save_processed_tasks_to_db(processed_tasks: Dict[str, List[Dict[str, Any]]]):
-    """将处理后的任务数据保存到数据库 (用于API查询)"""
+def load_holidays(path: Optional[str] = None) -> Tuple[Dict[int, str], set]:
+    """读取节假日安排文件
+
+    文件格式 (日期区间含首尾，跨年的假期写在放假通知所属的年份下):
+
+        {"2025": {"holidays": {"春节": ["2025-01-28", "2025-02-04"]}, "workdays": ["2025-01-26", "2025-02-08"]}}
+
+    Returns:
+        ({日序号: 节假日名称}, {调休上班的日序号})，文件不存在时都为空
+    """
+    path = path or HOLIDAYS_FILE
+    if not os.path.exists(path):
+        logger.warning("Holiday file %s not found, treating Monday to Friday as workdays", path)
+        return {}, set()
+    with open(path, 'r', encoding='utf-8') as f:
+        years = json.load(f)
+    holidays: Dict[int, str] = {}
+    workdays = set()
+    for year in years.values():
+        for name, (first, last) in year.get("holidays", {}).items():
+            for ordinal in range(date_str_to_ordinal(first), date_str_to_ordinal(last) + 1):
+                holidays[ordinal] = name
+        workdays.update(date_str_to_ordinal(day) for day in year.get("workdays", []))
+    return holidays, workdays
+
+
+def _calendar_rows(holidays: Dict[int, str], workdays: set):
+    """CALENDAR_YEARS 内每天的 calendar 表行"""
+    first = datetime(CALENDAR_YEARS[0], 1, 1).toordinal()
+    last = datetime(CALENDAR_YEARS[1], 12, 31).toordinal()
+    for ordinal in range(first, last + 1):
+        day = datetime.fromordinal(ordinal)
+        weekday = day.weekday()
+        iso_year, iso_week, _ = day.isocalendar()
+        if ordinal in workdays:
+            is_workday, bucket = 1, MAKEUP_DAY_BUCKETS.get(weekday, WEEKDAY_KEYS[weekday])
+        else:
+            is_workday, bucket = int(weekday < 5 and ordinal not in holidays), WEEKDAY_KEYS[weekday]
+        yield (
+            ordinal, day.strftime("%Y-%m-%d"), weekday, ordinal - (weekday + 1) % 7, ordinal - weekday,
+            iso_year, iso_week, day.year * 100 + day.month, is_workday, holidays.get(ordinal), bucket,
+        )
+
+
+def _refresh_calendar(cursor):
+    """节假日安排或日历范围变化时重新生成 calendar 表，并读取调休日的分组键"""
+    holidays, workdays = load_holidays()
+    fingerprint = hashlib.sha1(
+        json.dumps([CALENDAR_YEARS, sorted(holidays.items()), sorted(workdays)], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    cursor.execute("SELECT value FROM sync_state WHERE key = 'calendar_fingerprint'")
+    row = cursor.fetchone()
+    if row is None or row[0] != fingerprint:
+        cursor.execute("DELETE FROM calendar")
+        cursor.executemany(
+            "INSERT INTO calendar VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", _calendar_rows(holidays, workdays)
+        )
+        cursor.execute("""
+            INSERT OR REPLACE INTO sync_state (key, value, updated_at)
+            VALUES ('calendar_fingerprint', ?, CURRENT_TIMESTAMP)
+        """, (fingerprint,))
+        logger.info("Built calendar %d-%d with %d holidays and %d makeup workdays.",
+                    CALENDAR_YEARS[0], CALENDAR_YEARS[1], len(holidays), len(workdays))
+    cursor.execute("SELECT date, bucket FROM calendar WHERE weekday >= 5 AND is_workday = 1")
+    _makeup_buckets.update(cursor.fetchall())
+
+
+# 调休上班的周末 {YYYY-MM-DD: 分组键}，由 init_db() 从 calendar 表读取。
+# 同步时写入的 weekday 只按星期计算，读取时用它修正，节假日安排更新后不需要重新同步
+_makeup_buckets: Dict[str, str] = {}
+
+
+def _apply_makeup_buckets(tasks: List[Dict[str, Any]]):
+    """把调休上班日的任务移到工作日分组 (见 MAKEUP_DAY_BUCKETS)"""
+    if _makeup_buckets:
+        makeup_bucket = _makeup_buckets.get
+        for task in tasks:
+            bucket = makeup_bucket(task["date"])
+            if bucket:
+                task["weekday"] = bucket
+
+
+def count_workdays(start_date: str, end_date: str) -> int:
+    """日期范围 (含首尾) 内的工作日天数 (按 calendar 表，扣除法定节假日、计入调休上班日)"""
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        conn.execute("BEGIN TRANSACTION")
+        row = conn.execute(
+            "SELECT TOTAL(is_workday) FROM calendar WHERE day BETWEEN ? AND ?", (_day(start_date), _day(end_date))
+        ).fetchone()
+    return int(row[0])
+
+
+def _day(date_str: Optional[str]) -> Optional[int]:
+    """YYYY-MM-DD -> 存储的日序号 (空字符串为 0，None 保持 None)"""
+    if date_str is None:
+        return None
+    return date_str_to_ordinal(date_str) if date_str else 0
+
+
+class ValueCodes:
+    """编码列 (CODED_COLUMNS) 的取值字典，由写事务使用: 新的值在同一事务中写入 value_codes"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.codes: Dict[str, Dict[str, int]] = {kind: {} for kind in CODED_COLUMNS}
+        cursor.execute("SELECT kind, value, code FROM value_codes")
+        for kind, value, code in cursor.fetchall():
+            self.codes.setdefault(kind, {})[value] = code
 
-        # 先清空现有数据
-        cursor.execute("DELETE FROM tasks")
-        logger.info("Cleared existing processed tasks from database.")
+    def encode(self, kind: str, value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        codes = self.codes[kind]
+        code = codes.get(value)
+        if code is None:
+            # 排在已有的值之后 (见 VALUE_CODE_SEEDS)
+            code = min(codes.values(), default=1) - 1
+            self.cursor.execute("INSERT INTO value_codes (kind, code, value) VALUES (?, ?, ?)", (kind, code, value))
+            codes[value] = code
+        return code
 
-        # 插入新数据
-        insert_count = 0
+
+# 读取时的解码缓存 {kind: {code: value}}，遇到未知的编码 (其他连接新写入的值) 时重新读取
+_value_names: Dict[str, Dict[int, str]] = {}
+
+
+def _load_value_names(conn: Optional[sqlite3.Connection] = None):
+    """重新读取 value_codes (conn 为空时使用单独的只读连接)"""
+    global _value_names
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect("read", read_only=True)
+    try:
+        names: Dict[str, Dict[int, str]] = {}
+        for kind, code, value in conn.execute("SELECT kind, code, value FROM value_codes"):
+            names.setdefault(kind, {})[code] = value
+    finally:
+        if own_conn:
+            conn.close()
+    _value_names = names
+
+
+def _value_name(kind: str, code: Optional[int]) -> Optional[str]:
+    """编码 -> 原来的字符串"""
+    if code is None:
+        return None
+    names = _value_names.get(kind)
+    if names is None or code not in names:
+        _load_value_names()
+        names = _value_names.get(kind, {})
+    return names[code]
+
+
+class _DateStrs(dict):
+    """日序号 -> YYYY-MM-DD 的缓存 (0 为空字符串)"""
+
+    def __missing__(self, ordinal: int) -> str:
+        self[ordinal] = ordinal_to_date_str(ordinal)
+        return self[ordinal]
+
+
+_date_strs = _DateStrs({None: None, 0: ""})
+
+
+def _decode_rows(rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+    """同一查询的任务表 / 区间表行 -> API 使用的字典 (日期为 YYYY-MM-DD，编码列还原为字符串)
+
+    每列的转换表只查找一次，逐行只做字典取值。遇到未知的编码时重新读取 value_codes。
+    """
+    if not rows:
+        return []
+    columns = rows[0].keys()
+    for attempt in (1, 2):
+        converters = []
+        for index, column in enumerate(columns):
+            if column in DATE_COLUMNS:
+                converters.append((index, _date_strs))
+            elif column in CODED_COLUMNS:
+                converters.append((index, {None: None, **_value_names.get(column, {})}))
+        try:
+            decoded = []
+            for row in rows:
+                values = list(row)
+                for index, converter in converters:
+                    values[index] = converter[values[index]]
+                decoded.append(dict(zip(columns, values)))
+            if "weekday" in columns:
+                _apply_makeup_buckets(decoded)
+            return decoded
+        except KeyError:
+            if attempt == 2:
+                raise
+            _load_value_names()
+
+
+def split_assignees(assignee: str) -> List[str]:
+    """把任务的负责人字符串拆分为各个工程师的名字 (去掉空白和重复)"""
+    names = (name.strip() for name in ASSIGNEE_SEPARATORS.split(assignee or ""))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _search_bigrams(*texts: str) -> str:
+    """task_search_bigrams 的内容: 相邻两个字 (都是文字或数字) 用空格连接"""
+    pairs = (text[i:i + 2] for text in texts for i in range(len(text) - 1))
+    return " ".join(pair for pair in pairs if pair.isalnum())
+
+
+def _search_rowid(source: str, record_id: str) -> int:
+    """全文检索表中记录的 rowid: (source, record_id) 的 64 位摘要"""
+    digest = hashlib.blake2b(f"{source}\0{record_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class TaskWriter:
+    """在一个事务内分批写入任务，供流式同步逐页调用
+
+    通过 open_task_writer() 获取，退出上下文时统一提交，出错则整体回滚。
+    WAL 模式下读请求在提交前始终看到旧数据。写入和删除都限定在 source 数据源内。
+
+    rebuild=True 时为全量重建: 本数据源的任务写入影子表 (其他数据源的行先原样复制过去)，
+    不读取已有行和内容哈希，全部按新增写入；finish_rebuild() 建好索引后用影子表替换 tasks。
+    """
+
+    def __init__(self, cursor, source: str = DEFAULT_SOURCE, rebuild: bool = False):
+        self.cursor = cursor
+        self.source = source
+        # 任务行写入的表: tasks，重建时为影子表
+        self.table = STAGING_TABLE if rebuild else "tasks"
+        self.rebuilding = rebuild
+        self.rows_written = 0
+        self.cleared = False
+        self.tracking_seen = False
+        # merge() 累计的任务行数: 新增 / 更新 / 删除 / 未变化
+        self.merge_counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        self._codes: Optional[ValueCodes] = None
+        # 本事务中任务有变化的记录 (dirty_all 表示整个数据源)，提交前由 flush() 刷新负责人关联表和全文检索表
+        self.dirty_records: set = set()
+        self.dirty_all = False
+
+    @property
+    def codes(self) -> ValueCodes:
+        """编码列的取值字典 (第一次写入任务时读取)"""
+        if self._codes is None:
+            self._codes = ValueCodes(self.cursor)
+        return self._codes
+
+    def _task_values(self, task: Dict[str, Any], weekday: str) -> tuple:
+        """任务 -> MERGE_COLUMNS 各列的存储值 (日期为日序号，编码列为编码)"""
+        encode = self.codes.encode
+        return (
+            task["task_name"], task["assignee"], encode("status", task["status"]),
+            encode("priority", task.get("priority", "")), encode("application_status", task.get("application_status", "")),
+            _day(task.get("start_date")), _day(task.get("end_date")), encode("weekday", weekday)
+        )
+
+    def _insert_rows(self, rows: List[tuple]):
+        """插入任务行 (record_id, date, MERGE_COLUMNS..., source)，同一条记录同一天的旧行被替换"""
+        self.cursor.executemany(f"""
+            INSERT OR REPLACE INTO {self.table} (record_id, date, {', '.join(MERGE_COLUMNS)}, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    def clear(self):
+        """清空本数据源的任务及内容哈希"""
+        self.cursor.execute(f"DELETE FROM {self.table} WHERE source = ?", (self.source,))
+        self.cursor.execute("DELETE FROM task_intervals WHERE source = ?", (self.source,))
+        self.cursor.execute("DELETE FROM record_hashes WHERE source = ?", (self.source,))
+        self.dirty_all = True
+        self.cleared = True
+        logger.info("Cleared existing processed tasks of source '%s' from database.", self.source)
+
+    def get_hashes(self, record_ids: List[str]) -> Dict[str, str]:
+        """读取这些记录上次写入时的内容哈希 {record_id: hash}，重建时为空 (所有记录都要写入影子表)"""
+        hashes = {}
+        if self.rebuilding:
+            return hashes
+        # 分批查询，避免超出 SQLite 的参数个数上限
+        for start in range(0, len(record_ids), 500):
+            batch = record_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self.cursor.execute(
+                f"SELECT record_id, content_hash FROM record_hashes WHERE source = ? AND record_id IN ({placeholders})",
+                [self.source, *batch]
+            )
+            hashes.update((row[0], row[1]) for row in self.cursor.fetchall())
+        return hashes
+
+    def mark_seen(self, record_ids: List[str]):
+        """记录本次全量同步见到的 record_id，供 delete_unseen() 清理已删除的记录"""
+        if not self.tracking_seen:
+            self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS seen_records (record_id TEXT PRIMARY KEY)")
+            self.cursor.execute("DELETE FROM seen_records")
+            self.tracking_seen = True
+        self.cursor.executemany("INSERT OR IGNORE INTO seen_records (record_id) VALUES (?)", [(rid,) for rid in record_ids])
+
+    def delete_unseen(self) -> int:
+        """删除本数据源中未被 mark_seen() 标记的记录的任务，返回删除的记录数"""
+        if not self.tracking_seen:
+            return 0
+        # 重建时本数据源的旧行仍在 tasks 中
+        self.cursor.execute("""
+            SELECT record_id FROM tasks WHERE source = ?1 AND record_id NOT IN (SELECT record_id FROM seen_records)
+            UNION
+            SELECT record_id FROM task_intervals WHERE source = ?1 AND record_id NOT IN (SELECT record_id FROM seen_records)
+        """, (self.source,))
+        self.dirty_records.update(row[0] for row in self.cursor.fetchall())
+        self.cursor.execute(
+            "DELETE FROM record_hashes WHERE source = ? AND record_id NOT IN (SELECT record_id FROM seen_records)",
+            (self.source,)
+        )
+        removed = self.cursor.rowcount
+        # 重建时影子表里只有本次见到的记录
+        for table in (("task_intervals",) if self.rebuilding else ("tasks", "task_intervals")):
+            self.cursor.execute(
+                f"DELETE FROM {table} WHERE source = ? AND record_id NOT IN (SELECT record_id FROM seen_records)",
+                (self.source,)
+            )
+            if table == "tasks":
+                self.merge_counts["deleted"] += self.cursor.rowcount
+        return removed
+
+    def write(self, processed_tasks: Dict[str, List[Dict[str, Any]]]) -> int:
+        """追加写入一批按星期分组的任务 (一条预编译语句 executemany)，返回写入行数"""
+        rows = [
+            (task["record_id"], _day(task["date"]), *self._task_values(task, weekday), self.source)
+            for weekday, tasks in processed_tasks.items()
+            for task in tasks
+        ]
+        self._insert_rows(rows)
+        count = len(rows)
+        self.dirty_records.update(task["record_id"] for tasks in processed_tasks.values() for task in tasks)
+        self.rows_written += count
+        return count
+
+    def _existing_rows(self, record_ids: Optional[List[str]]) -> Dict[Tuple[str, str], Tuple[int, tuple]]:
+        """读取已有任务行 {(record_id, date): (id, MERGE_COLUMNS 的存储值)}，record_ids 为 None 时读取整个数据源"""
+        select = f"SELECT id, record_id, date, {', '.join(MERGE_COLUMNS)} FROM {self.table} WHERE source = ?"
+        existing = {}
+        if self.rebuilding:
+            # 影子表中还没有本数据源的行
+            return existing
+        if record_ids is None:
+            batches = [None]
+        else:
+            # 分批查询，避免超出 SQLite 的参数个数上限
+            batches = [record_ids[start:start + 500] for start in range(0, len(record_ids), 500)]
+        for batch in batches:
+            if batch is None:
+                self.cursor.execute(select, (self.source,))
+            else:
+                placeholders = ",".join("?" * len(batch))
+                self.cursor.execute(f"{select} AND record_id IN ({placeholders})", [self.source, *batch])
+            for row in self.cursor.fetchall():
+                existing[(row[1], row[2])] = (row[0], tuple(row[3:]))
+        return existing
+
+    def merge(
+        self,
+        processed_tasks: Dict[str, List[Dict[str, Any]]],
+        record_ids: Optional[List[str]] = None
+    ) -> Dict[str, int]:
+        """把按星期分组的任务合并进 tasks 表 (行以 record_id + date 为键)，返回各类行数
+
+        只插入新出现的日期行、更新内容有变化的行、删除不再出现的行，未变化的行不写
+        (last_updated 也保持不变)，减少同步时的索引页改写和 WAL 增长。
+        比较范围是 record_ids 这些记录的已有行，为 None 时是整个数据源。
+
+        Returns:
+            dict: inserted / updated / deleted / unchanged 行数
+        """
+        existing = self._existing_rows(record_ids)
+        inserts, updates = [], []
+        unchanged = 0
         for weekday, tasks in processed_tasks.items():
             for task in tasks:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO tasks 
-                    (record_id, task_name, assignee, status, date, start_date, end_date, weekday, priority, application_status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    task["record_id"],
-                    task["task_name"],
-                    task["assignee"],
-                    task["status"],
-                    task["date"],
-                    task.get("start_date"),
-                    task.get("end_date"),
-                    weekday,
-                    task.get("priority", ""),
-                    task.get("application_status", "")
-                ))
-                insert_count += 1
-
-        logger.info("Successfully saved %d processed tasks to database.", insert_count)
-
-
-def get_tasks_from_db(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+                values = self._task_values(task, weekday)
+                day = _day(task["date"])
+                old = existing.pop((task["record_id"], day), None)
+                if old is None:
+                    inserts.append((task["record_id"], day, *values, self.source))
+                elif old[1] != values:
+                    updates.append((*values, old[0]))
+                else:
+                    unchanged += 1
+        # 剩下的是这些记录不再覆盖的日期行
+        deletes = [(row_id,) for row_id, _ in existing.values()]
+
+        self.cursor.executemany(f"DELETE FROM {self.table} WHERE id = ?", deletes)
+        assignments = ", ".join(f"{column} = ?" for column in MERGE_COLUMNS)
+        self.cursor.executemany(
+            f"UPDATE {self.table} SET {assignments}, last_updated = CURRENT_TIMESTAMP WHERE id = ?", updates
+        )
+        self._insert_rows(inserts)
+
+        counts = {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes), "unchanged": unchanged}
+        if record_ids is None:
+            self.dirty_all = True
+        else:
+            self.dirty_records.update(record_ids)
+        for key, value in counts.items():
+            self.merge_counts[key] += value
+        self.rows_written += len(inserts) + len(updates)
+        return counts
+
+    def replace_records(
+        self,
+        record_ids: List[str],
+        processed_tasks: Dict[str, List[Dict[str, Any]]],
+        hashes: Optional[Dict[str, str]] = None,
+        intervals: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """按 record_id 替换任务，返回实际写入 (新增或更新) 的行数
+
+        与这些记录已有的日期行合并 (见 merge)，任务日期范围缩短时多余的日期行会被删除。
+        hashes 为这些记录新的内容哈希，未提供时清除旧哈希 (下次同步会重新处理)。
+        intervals 为不按天展开、以区间存储的任务 (超出展开预算的记录)。
+        """
+        counts = self.merge(processed_tasks, record_ids)
+        self._delete_records(record_ids, hashes, tables=("task_intervals",))
+        written = counts["inserted"] + counts["updated"]
+        if intervals:
+            written += self.write_intervals(intervals)
+        return written
+
+    def replace_all(self, processed_tasks: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+        """用完整的处理结果替换本数据源的任务 (合并写入)，并清除区间和内容哈希，返回各类行数"""
+        counts = self.merge(processed_tasks)
+        self.cursor.execute("DELETE FROM task_intervals WHERE source = ?", (self.source,))
+        self.cursor.execute("DELETE FROM record_hashes WHERE source = ?", (self.source,))
+        return counts
+
+    def write_intervals(self, intervals: List[Dict[str, Any]]) -> int:
+        """写入一批任务区间 (区间存储模式)，返回写入行数"""
+        encode = self.codes.encode
+        self.cursor.executemany(f"""
+            INSERT OR REPLACE INTO task_intervals ({INTERVAL_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                interval["record_id"], interval["task_name"], interval["assignee"], encode("status", interval["status"]),
+                encode("priority", interval.get("priority", "")),
+                encode("application_status", interval.get("application_status", "")),
+                _day(interval["start_date"]), _day(interval["end_date"]),
+                _day(interval["first_date"]), _day(interval["last_date"]),
+                self.source
+            )
+            for interval in intervals
+        ])
+        self.dirty_records.update(interval["record_id"] for interval in intervals)
+        self.rows_written += len(intervals)
+        return len(intervals)
+
+    def replace_record_intervals(
+        self,
+        record_ids: List[str],
+        intervals: List[Dict[str, Any]],
+        hashes: Optional[Dict[str, str]] = None
+    ) -> int:
+        """按 record_id 替换任务 (区间存储模式)，参数含义同 replace_records"""
+        self._delete_records(record_ids, hashes)
+        return self.write_intervals(intervals)
+
+    def list_intervals(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """本数据源以区间存储的任务: 返回 (总数, 跨度最长的 limit 个区间)
+
+        按天存储模式下这些是超出展开预算的记录 (通常是日期填错)。
+        """
+        self.cursor.execute("SELECT COUNT(*) FROM task_intervals WHERE source = ?", (self.source,))
+        total = self.cursor.fetchone()[0]
+        self.cursor.execute("""
+            SELECT record_id, task_name, assignee, first_date, last_date, last_date - first_date + 1 AS days
+            FROM task_intervals
+            WHERE source = ? AND first_date != 0
+            ORDER BY days DESC
+            LIMIT ?
+        """, (self.source, limit))
+        return total, _decode_rows(self.cursor.fetchall())
+
+    def _delete_records(
+        self,
+        record_ids: List[str],
+        hashes: Optional[Dict[str, str]],
+        tables: Optional[Tuple[str, ...]] = None
+    ):
+        """删除这些记录在任务表中的行 (默认 tasks 和 task_intervals)，并更新它们的内容哈希"""
+        params = [(rid, self.source) for rid in record_ids]
+        self.dirty_records.update(record_ids)
+        for table in tables or (self.table, "task_intervals"):
+            self.cursor.executemany(f"DELETE FROM {table} WHERE record_id = ? AND source = ?", params)
+        self.cursor.executemany("DELETE FROM record_hashes WHERE record_id = ? AND source = ?", params)
+        if hashes:
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO record_hashes (source, record_id, content_hash) VALUES (?, ?, ?)",
+                [(self.source, rid, content_hash) for rid, content_hash in hashes.items()]
+            )
+
+
+    def _record_batches(self, record_ids: Optional[List[str]]) -> List[Tuple[str, List[str]]]:
+        """把 record_ids 分批 (避免超出 SQLite 的参数个数上限)，返回 [(附加的 WHERE 条件, 参数)]，
+        record_ids 为 None 时只有一批，条件为整个数据源"""
+        if record_ids is None:
+            return [("", [self.source])]
+        return [
+            (f" AND record_id IN ({','.join('?' * len(batch))})", [self.source, *batch])
+            for batch in (record_ids[start:start + 500] for start in range(0, len(record_ids), 500))
+        ]
+
+    def flush_assignees(self):
+        """按本事务中任务有变化的记录重建它们在 task_assignees / interval_assignees 中的关联行"""
+        record_ids = None if self.dirty_all else list(self.dirty_records)
+        if record_ids == []:
+            return
+        task_rows, interval_rows = [], []
+        for condition, params in self._record_batches(record_ids):
+            for table in ("task_assignees", "interval_assignees"):
+                self.cursor.execute(f"DELETE FROM {table} WHERE source = ?{condition}", params)
+            self.cursor.execute(
+                f"SELECT id, assignee, date, priority, record_id FROM {self.table} WHERE source = ?{condition}", params
+            )
+            task_rows.extend(self.cursor.fetchall())
+            self.cursor.execute(
+                f"SELECT id, assignee, record_id FROM task_intervals WHERE source = ?{condition}", params
+            )
+            interval_rows.extend(self.cursor.fetchall())
+
+        # 同一个负责人字符串通常出现在很多行中，每个只拆分一次
+        names = {assignee: split_assignees(assignee) for assignee in {row[1] for row in task_rows + interval_rows}}
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO engineers (name) VALUES (?)",
+            [(name,) for name in {name for split in names.values() for name in split}]
+        )
+        self.cursor.execute("SELECT name, id FROM engineers")
+        engineer_ids = dict(self.cursor.fetchall())
+        ids = {assignee: [engineer_ids[name] for name in split] for assignee, split in names.items()}
+        self.cursor.executemany(
+            "INSERT INTO task_assignees (engineer_id, date, task_id, priority, source, record_id) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (engineer_id, date, task_id, priority, self.source, record_id)
+                for task_id, assignee, date, priority, record_id in task_rows
+                for engineer_id in ids[assignee]
+            ]
+        )
+        self.cursor.executemany(
+            "INSERT INTO interval_assignees (engineer_id, interval_id, source, record_id) VALUES (?, ?, ?, ?)",
+            [
+                (engineer_id, interval_id, self.source, record_id)
+                for interval_id, assignee, record_id in interval_rows
+                for engineer_id in ids[assignee]
+            ]
+        )
+
+    def flush(self):
+        """提交前刷新派生表 (负责人关联表、全文检索表)"""
+        if not (self.dirty_records or self.dirty_all):
+            return
+        self.flush_assignees()
+        self.flush_search()
+        self.dirty_records.clear()
+        self.dirty_all = False
+
+    def _search_rows(self, record_ids: Optional[List[str]]) -> List[tuple]:
+        """从任务表读取记录的检索行 (rowid, task_name, assignee, source, record_id, last_date)，
+        record_ids 为 None 时读取整个数据源"""
+        rows: Dict[str, tuple] = {}
+        for condition, params in self._record_batches(record_ids):
+            for sql in (
+                f"SELECT record_id, task_name, assignee, MAX(date) FROM {self.table} WHERE source = ?{condition} GROUP BY record_id",
+                f"SELECT record_id, task_name, assignee, last_date FROM task_intervals WHERE source = ?{condition}",
+            ):
+                self.cursor.execute(sql, params)
+                for record_id, task_name, assignee, last_date in self.cursor.fetchall():
+                    if record_id not in rows or last_date > rows[record_id][-1]:
+                        rows[record_id] = (_search_rowid(self.source, record_id), task_name, assignee,
+                                           self.source, record_id, last_date)
+        return list(rows.values())
+
+    def flush_search(self):
+        """按本事务中任务有变化的记录刷新全文检索表"""
+        if not _search_enabled or not (self.dirty_records or self.dirty_all):
+            return
+        if self.dirty_all:
+            self.cursor.execute("SELECT rowid FROM task_search WHERE source = ?", (self.source,))
+            stale = self.cursor.fetchall()
+            rows = self._search_rows(None)
+        else:
+            record_ids = list(self.dirty_records)
+            stale = [(_search_rowid(self.source, rid),) for rid in record_ids]
+            rows = self._search_rows(record_ids)
+        for table in ("task_search", "task_search_bigrams"):
+            self.cursor.executemany(f"DELETE FROM {table} WHERE rowid = ?", stale)
+        self.cursor.executemany("""
+            INSERT INTO task_search (rowid, task_name, assignee, source, record_id, last_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        self.cursor.executemany(
+            "INSERT INTO task_search_bigrams (rowid, bigrams) VALUES (?, ?)",
+            [(row[0], _search_bigrams(row[1], row[2])) for row in rows]
+        )
+
+    def set_sync_state(self, key: str, value: Optional[str]):
+        """在本写入事务中写入同步状态值 (value 为 None 时删除)，与任务行一起提交或回滚"""
+        _write_sync_state(self.cursor, key, value)
+
+    def begin_rebuild(self):
+        """创建影子表 (暂不建二级索引) 并复制其他数据源的任务行"""
+        self.cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        _create_tasks_table(self.cursor, STAGING_TABLE)
+        columns = f"id, {TASK_COLUMNS}, last_updated"
+        self.cursor.execute(
+            f"INSERT INTO {STAGING_TABLE} ({columns}) SELECT {columns} FROM tasks WHERE source != ?", (self.source,)
+        )
+
+    def finish_rebuild(self):
+        """给影子表建索引 (一次性建索引比逐行维护快)，然后删除旧的 tasks 并把影子表改名为 tasks
+
+        替换在同一事务内执行: 提交前的读请求看到旧表，提交后看到新表。
+        引用 tasks 的视图在替换前删除、替换后重建。
+        """
+        _create_task_indexes(self.cursor, STAGING_TABLE)
+        self.cursor.execute("SELECT COUNT(*) FROM tasks WHERE source = ?", (self.source,))
+        self.merge_counts["deleted"] += self.cursor.fetchone()[0]
+        views = _drop_dependent_views(self.cursor, ("tasks",))
+        self.cursor.execute("DROP TABLE tasks")
+        self.cursor.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO tasks")
+        _restore_views(self.cursor, views)
+        self.table = "tasks"
+        self.rebuilding = False
+        logger.info("Rebuilt tasks of source '%s' in a staging table and swapped it in.", self.source)
+
+    def cancel_rebuild(self):
+        """放弃重建 (如飞书返回空表)，tasks 保持不变"""
+        self.cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        self.table = "tasks"
+        self.rebuilding = False
+
+
+@contextmanager
+def open_task_writer(source: str = DEFAULT_SOURCE, rebuild: bool = False):
+    """打开一个任务写入事务，返回 TaskWriter (使用共享写连接，多个写事务依次进行)
+
+    Args:
+        rebuild: 全量重建本数据源的任务 (见 TaskWriter)，正常退出时用影子表替换 tasks
+    """
+    with _pool.writer() as conn:
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            writer = TaskWriter(conn.cursor(), source, rebuild=rebuild)
+            if rebuild:
+                writer.begin_rebuild()
+            yield writer
+            if writer.rebuilding:
+                writer.finish_rebuild()
+            writer.flush()
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            raise
+
+
+def save_processed_tasks_to_db(processed_tasks: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+    """将处理后的任务数据保存到数据库 (用于API查询)，返回新增 / 更新 / 删除 / 未变化的行数
+
+    整表写入影子表后替换 tasks (见 TaskWriter 的 rebuild)，写入期间查询不受影响。
+    """
+    with open_task_writer(rebuild=True) as writer:
+        writer.replace_all(processed_tasks)
+    counts = writer.merge_counts
+
+    logger.info("Successfully saved processed tasks to database: %d inserted, %d updated, %d deleted, %d unchanged.",
+                counts["inserted"], counts["updated"], counts["deleted"], counts["unchanged"])
+    return counts
+
+
+def replace_tasks_for_records(record_ids: List[str], processed_tasks: Dict[str, List[Dict[str, Any]]]) -> int:
+    """按 record_id 替换任务 (增量同步使用)
+
+    Returns:
+        int: 写入的任务行数
+    """
+    with open_task_writer() as writer:
+        insert_count = writer.replace_records(record_ids, processed_tasks)
+
+    logger.info("Replaced tasks for %d records (%d rows written).", len(record_ids), insert_count)
+    return insert_count
+
+
+def get_sync_state(key: str) -> Optional[str]:
+    """读取同步状态值，不存在时返回 None"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return row["value"] if row else None
+
+
+def _write_sync_state(cursor, key: str, value: Optional[str]):
+    if value is None:
+        cursor.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+    else:
+        cursor.execute("""
+            INSERT INTO sync_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """, (key, value))
+
+
+def set_sync_state(key: str, value: Optional[str]):
+    """写入同步状态值 (value 为 None 时删除该键)。与任务行一起提交的状态用 TaskWriter.set_sync_state"""
+    with get_db_connection("write") as conn:
+        _write_sync_state(conn, key, value)
+
+
+def _expand_interval_rows(
+    rows: List[sqlite3.Row],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """把 task_intervals 的行在 [start_date, end_date] 内按天展开为任务"""
+    tasks = []
+    for interval in _decode_rows(rows):
+        for _, task in expand_interval(interval, start_date, end_date):
+            task["source"] = interval["source"]
+            tasks.append(task)
+    _apply_makeup_buckets(tasks)
+    return tasks
+
+
+# 按负责人查询的条件 (参数为工程师名字)
+ENGINEER_ID_CONDITION = "a.engineer_id = (SELECT id FROM engineers WHERE name = ?)"
+
+
+def _prefixed(columns: str, alias: str) -> str:
+    """给逗号分隔的列名加上表别名，用于联表查询"""
+    return ", ".join(f"{alias}.{column}" for column in columns.split(", "))
+
+
+# 筛选条件 (task_filter.py 的格式) 可以翻译为 SQL 的字段: 文本列直接比较，编码列把取值换成编码，日期列换成日序号。
+# weekday 在读取时按日历修正 (见 _apply_makeup_buckets)，区间行的 date 在展开后才有，这两种条件留在 Python 中判断
+FILTER_TEXT_COLUMNS = ("record_id", "task_name", "assignee", "source")
+FILTER_CODED_COLUMNS = ("status", "priority", "application_status")
+FILTER_DATE_COLUMNS = {"tasks": ("date", "start_date", "end_date"), "task_intervals": ("start_date", "end_date")}
+
+
+def _filter_codes(kind: str, values: List[str]) -> List[int]:
+    """编码列的取值 -> 编码 (没有编码的值不会命中任何行)"""
+    codes = {value: code for code, value in _value_names.get(kind, {}).items()}
+    return [codes[value] for value in values if value in codes]
+
+
+def _filter_date(value: str) -> List[int]:
+    """日期列的取值 -> [日序号]，不是 YYYY-MM-DD 的值不会等于任何已存储的日期"""
+    if value == "":
+        return [0]
+    try:
+        ordinal = date_str_to_ordinal(value)
+    except ValueError:
+        return []
+    return [ordinal] if ordinal_to_date_str(ordinal) == value else []
+
+
+def _compile_condition(condition: Dict[str, Any], table: str, alias: str) -> Optional[Tuple[str, List[Any]]]:
+    """单个筛选条件 -> (SQL 片段, 参数)，无法翻译时返回 None
+
+    与 TaskFilter._evaluate_condition 的语义一致: 字段为空 (NULL) 时只有 is_empty 成立。
+    """
+    field, operator, value = condition.get("field"), condition.get("operator"), condition.get("value")
+    column = alias + str(field)
+    if field in FILTER_TEXT_COLUMNS:
+        stored, empty = (lambda values: values), ""
+    elif field in FILTER_CODED_COLUMNS:
+        stored = lambda values: _filter_codes(field, values)
+        empty = next(iter(_filter_codes(field, [""])), None)
+    elif field in FILTER_DATE_COLUMNS[table]:
+        stored = lambda values: [ordinal for value in values for ordinal in _filter_date(value)]
+        empty = 0
+    else:
+        return None
+
+    def one_of(values: List[Any], negate: bool = False) -> Tuple[str, List[Any]]:
+        if not values:
+            return (f"{column} IS NOT NULL", []) if negate else ("0", [])
+        placeholders = ", ".join("?" * len(values))
+        return f"{column} {'NOT IN' if negate else 'IN'} ({placeholders})", list(values)
+
+    if operator in ("equals", "not_equals"):
+        if not isinstance(value, str):
+            return None
+        return one_of(stored([value]), negate=operator == "not_equals")
+    if operator in ("in", "not_in"):
+        if not isinstance(value, list):
+            return one_of([], negate=operator == "not_in")
+        if not all(isinstance(item, str) for item in value):
+            return None
+        return one_of(stored(value), negate=operator == "not_in")
+    if operator in ("contains", "not_contains"):
+        if not isinstance(value, str) or field in FILTER_DATE_COLUMNS[table]:
+            return None
+        if field in FILTER_TEXT_COLUMNS:
+            return f"instr({column}, ?) {'> 0' if operator == 'contains' else '= 0'}", [value]
+        codes = [code for code, name in _value_names.get(field, {}).items() if value in name]
+        return one_of(codes, negate=operator == "not_contains")
+    if operator == "not_empty":
+        return (f"{column} != ?", [empty]) if empty is not None else (f"{column} IS NOT NULL", [])
+    if operator == "is_empty":
+        return (f"({column} IS NULL OR {column} = ?)", [empty]) if empty is not None else (f"{column} IS NULL", [])
+    if operator == "this_week" and field in FILTER_DATE_COLUMNS[table]:
+        week_start, week_end = get_week_range(week_start="sunday")
+        return f"{column} BETWEEN ? AND ?", [_day(week_start), _day(week_end)]
+    return None
+
+
+def compile_filter(
+    conditions: List[Dict[str, Any]],
+    logic: str = "and",
+    table: str = "tasks",
+    alias: str = ""
+) -> Tuple[Optional[str], List[Any], List[Dict[str, Any]]]:
+    """把筛选器的条件翻译为 tasks / task_intervals 表的 WHERE 片段
+
+    编码列的取值按 _value_names 换成编码，调用前须用查询所用的连接刷新 (_load_value_names(conn))，
+    否则其他连接刚写入的取值会被当作不存在。and 逻辑下翻译不了的条件 (如 greater_than) 留给调用方在 Python 中逐条判断；
+    or 逻辑下只要有一个条件翻译不了，整个筛选器都在 Python 中判断。
+
+    Args:
+        alias: 联表查询时列名的前缀 (如 "t.")
+
+    Returns:
+        (where, params, residual): where 为 None 时不在 SQL 中过滤，residual 为需要在 Python 中判断的条件
+    """
+    fragments: List[str] = []
+    params: List[Any] = []
+    residual: List[Dict[str, Any]] = []
+    for condition in conditions:
+        compiled = _compile_condition(condition, table, alias)
+        if compiled is None:
+            residual.append(condition)
+        else:
+            fragments.append(compiled[0])
+            params.extend(compiled[1])
+    if logic == "or":
+        if residual or not fragments:
+            return None, [], list(conditions)
+        return "(" + " OR ".join(fragments) + ")", params, []
+    if not fragments:
+        return None, [], residual
+    return " AND ".join(fragments), params, residual
+
+
+def _task_queries(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    assignee: Optional[str] = None,
+    include_undated: bool = False,
+    daily_filter: Optional[Tuple[str, List[Any]]] = None,
+    interval_filter: Optional[Tuple[str, List[Any]]] = None
+) -> Tuple[List[Tuple[str, List[Any]]], List[Tuple[str, List[Any]]]]:
+    """生成 query_tasks 的 SQL: (tasks 表的查询, task_intervals 表的查询)，每项为 (sql, params)
+
+    有日期和无日期的行分开查询，各自走 TASK_INDEXES / init_db 中的部分索引 (见 test_query_plan.py)。
+    指定负责人时从 task_assignees / interval_assignees 按 (engineer_id, date) 查找，多人任务同样命中。
+    daily_filter / interval_filter 为 compile_filter() 生成的 (WHERE 片段, 参数)，附加在其他条件之后。
+    """
+    def where(conditions: List[str]) -> str:
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    if assignee is None:
+        daily_sql = f"SELECT {TASK_COLUMNS} FROM tasks"
+        interval_sql = f"SELECT {INTERVAL_COLUMNS} FROM task_intervals"
+        date_column, first_column, last_column = "date", "first_date", "last_date"
+        daily_where: List[str] = []
+        interval_where: List[str] = []
+        filter_params: List[Any] = []
+    else:
+        daily_sql = f"SELECT {_prefixed(TASK_COLUMNS, 't')} FROM task_assignees AS a JOIN tasks AS t ON t.id = a.task_id"
+        interval_sql = (f"SELECT {_prefixed(INTERVAL_COLUMNS, 'i')} FROM interval_assignees AS a "
+                        "JOIN task_intervals AS i ON i.id = a.interval_id")
+        date_column, first_column, last_column = "a.date", "i.first_date", "i.last_date"
+        daily_where = interval_where = [ENGINEER_ID_CONDITION]
+        filter_params = [assignee]
+    daily_params = interval_params = filter_params
+    if daily_filter:
+        daily_where, daily_params = daily_where + [daily_filter[0]], filter_params + daily_filter[1]
+    if interval_filter:
+        interval_where, interval_params = interval_where + [interval_filter[0]], filter_params + interval_filter[1]
+
+    if not (start_date and end_date):
+        return ([(daily_sql + where(daily_where) + f" ORDER BY {date_column}", daily_params)],
+                [(interval_sql + where(interval_where), interval_params)])
+
+    first, last = _day(start_date), _day(end_date)
+    daily = [(
+        daily_sql + where([f"{date_column} != 0", f"{date_column} BETWEEN ? AND ?"] + daily_where)
+        + f" ORDER BY {date_column}",
+        [first, last, *daily_params]
+    )]
+    intervals = [(
+        interval_sql + where([f"{first_column} != 0", f"{last_column} >= ?", f"{first_column} <= ?"] + interval_where),
+        [first, last, *interval_params]
+    )]
+    if include_undated:
+        # 无日期的行排在最前 (date 为空字符串)
+        daily.insert(0, (daily_sql + where([f"{date_column} = 0"] + daily_where), daily_params))
+        intervals.append((interval_sql + where([f"{first_column} = 0"] + interval_where), interval_params))
+    return daily, intervals
+
+
+def query_tasks(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    assignee: Optional[str] = None,
+    include_undated: bool = False,
+    conditions: Optional[List[Dict[str, Any]]] = None,
+    logic: str = "and",
+    match: Optional[Callable[[List[Dict[str, Any]], str], Callable[[Dict[str, Any]], bool]]] = None
+) -> List[Dict[str, Any]]:
+    """查询每天一条的任务列表 (合并 tasks 表和按需展开的 task_intervals)，按日期排序
+
+    Args:
+        start_date / end_date: 日期范围 (YYYY-MM-DD，包含两端)，不提供时返回全部任务
+        assignee: 只返回该负责人的任务
+        include_undated: 提供日期范围时是否同时返回没有有效日期的任务
+        conditions / logic: 筛选条件 (task_filter.py 的格式)，能翻译的在 SQL 中过滤 (见 compile_filter)
+        match: match(conditions, logic) 返回判断单个任务的函数，用于翻译不了的条件，有这类条件时必须提供
+    """
+    tasks: List[Dict[str, Any]] = []
+    interval_rows: List[sqlite3.Row] = []
+    daily_residual: List[Dict[str, Any]] = []
+    interval_residual: List[Dict[str, Any]] = []
+    with get_db_connection() as conn:
+        daily_filter = interval_filter = None
+        if conditions:
+            _load_value_names(conn)
+            daily_where, daily_params, daily_residual = compile_filter(conditions, logic, "tasks", "t." if assignee else "")
+            interval_where, interval_params, interval_residual = compile_filter(
+                conditions, logic, "task_intervals", "i." if assignee else ""
+            )
+            daily_filter = (daily_where, daily_params) if daily_where else None
+            interval_filter = (interval_where, interval_params) if interval_where else None
+        daily_queries, interval_queries = _task_queries(
+            start_date, end_date, assignee, include_undated, daily_filter, interval_filter
+        )
+        cursor = conn.cursor()
+        for sql, params in daily_queries:
+            cursor.execute(sql, params)
+            tasks.extend(_decode_rows(cursor.fetchall()))
+        for sql, params in interval_queries:
+            cursor.execute(sql, params)
+            interval_rows.extend(cursor.fetchall())
+
+    if daily_residual:
+        tasks = list(filter(match(daily_residual, logic), tasks))
+    if interval_rows:
+        expanded = _expand_interval_rows(interval_rows, start_date, end_date)
+        if interval_residual:
+            expanded = list(filter(match(interval_residual, logic), expanded))
+        tasks.extend(expanded)
+        tasks.sort(key=lambda task: task["date"])
+    return tasks
+
+
+def get_tasks_from_db(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    include_undated: bool = False
+) -> Dict[str, List[Dict[str, Any]]]:
     """从数据库获取任务，并按星期分组。
     
     Args:
         start_date (str, optional): 开始日期 (YYYY-MM-DD)。如果提供，必须同时提供 end_date。
         end_date (str, optional): 结束日期 (YYYY-MM-DD)。如果提供，必须同时提供 start_date。
+        include_undated (bool): 提供日期范围时是否同时返回没有有效日期的任务。
         
     Returns:
         Dict[str, List[Dict[str, Any]]]: 按星期分组的任务数据。
@@ -192,47 +1744,18 @@ def get_tasks_from_db(start_date: Optional[str] = None, end_date: Optional[str]
         "unknown_date": []
     }
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    if start_date and end_date:
+        logger.info("Fetching tasks for date range: %s to %s", start_date, end_date)
+    else:
+        logger.info("Fetching all tasks from database")
+    tasks = query_tasks(start_date, end_date, include_undated=include_undated)
 
-        if start_date and end_date:
-            logger.info("Fetching tasks for date range: %s to %s", start_date, end_date)
-            cursor.execute("""
-                SELECT record_id, task_name, assignee, status, priority, application_status, date, start_date, end_date, weekday 
-                FROM tasks 
-                WHERE date BETWEEN ? AND ?
-                ORDER BY date
-            """, (start_date, end_date))
+    for task_item in tasks:
+        weekday = task_item["weekday"]
+        if weekday in task_groups:
+            task_groups[weekday].append(task_item)
         else:
-            logger.info("Fetching all tasks from database")
-            cursor.execute("""
-                SELECT record_id, task_name, assignee, status, priority, application_status, date, start_date, end_date, weekday 
-                FROM tasks
-                ORDER BY date
-            """)
-
-        rows = cursor.fetchall()
-        logger.info("Fetched %d rows from database.", len(rows))
-
-        for row in rows:
-            task_item = {
-                "record_id": row["record_id"],
-                "task_name": row["task_name"],
-                "assignee": row["assignee"],
-                "status": row["status"],
-                "priority": row["priority"],
-                "application_status": row["application_status"],
-                "date": row["date"],
-                "start_date": row["start_date"],
-                "end_date": row["end_date"],
-                "weekday": row["weekday"]
-            }
-
-            weekday = row["weekday"]
-            if weekday in task_groups:
-                task_groups[weekday].append(task_item)
-            else:
-                task_groups["unknown_date"].append(task_item)
+            task_groups["unknown_date"].append(task_item)
 
     total_tasks = sum(len(v) for v in task_groups.values())
     logger.info("Successfully loaded %d tasks from database.", total_tasks)
@@ -244,11 +1767,293 @@ def get_tasks_from_db(start_date: Optional[str] = None, end_date: Optional[str]
     return task_groups
 
 
+# 某一天的任务，按负责人、优先级从紧急到普通排序 (idx_tasks_day 的顺序，不需要额外排序)
+TASKS_ON_DATE_SQL = f"SELECT {TASK_COLUMNS} FROM tasks WHERE date != 0 AND date = ? ORDER BY assignee, priority DESC"
+# 日期范围内每天各负责人、各优先级的任务数 (只读 idx_tasks_day，按索引顺序分组)，用于按优先级统计
+STATS_DAILY_SQL = """
+    SELECT assignee, priority, COUNT(*) AS days
+    FROM tasks
+    WHERE date != 0 AND date BETWEEN ? AND ?
+    GROUP BY date, assignee, priority
+"""
+# 日期范围内每天各工程师、各优先级的任务数 (只读 idx_task_assignees_day)，多人任务每人各计一次
+STATS_ENGINEER_SQL = """
+    SELECT engineer_id, priority, COUNT(*) AS days
+    FROM task_assignees
+    WHERE date BETWEEN ? AND ?
+    GROUP BY date, engineer_id, priority
+"""
+# 与日期范围重叠的区间 (只读 idx_task_intervals_span)，重叠天数在 Python 中计算
+STATS_INTERVAL_SQL = """
+    SELECT assignee, priority, first_date, last_date
+    FROM task_intervals
+    WHERE first_date != 0 AND last_date >= ? AND first_date <= ?
+"""
+# 按周 / 按月汇总: 日历表按主键取日期范围内的每一天，连接当天的任务天数 (按天存储的行按索引顺序
+# 逐日计数，区间行按日历展开)。{period} 为 week_sunday 或 month
+STATS_PERIOD_SQL = """
+    SELECT c.{period} AS period, MIN(c.day) AS first_day, MAX(c.day) AS last_day, SUM(c.is_workday) AS workdays,
+           TOTAL(t.days) + TOTAL(v.days) AS total_tasks,
+           TOTAL(t.days * c.is_workday) + TOTAL(v.days * c.is_workday) AS workday_tasks
+    FROM calendar AS c
+    LEFT JOIN (
+        SELECT date, COUNT(*) AS days FROM tasks
+        WHERE date != 0 AND date BETWEEN :first AND :last
+        GROUP BY date
+    ) AS t ON t.date = c.day
+    LEFT JOIN (
+        SELECT d.day, COUNT(*) AS days
+        FROM task_intervals AS i JOIN calendar AS d ON d.day BETWEEN MAX(i.first_date, :first) AND MIN(i.last_date, :last)
+        WHERE i.first_date != 0 AND i.last_date >= :first AND i.first_date <= :last
+        GROUP BY d.day
+    ) AS v ON v.day = c.day
+    WHERE c.day BETWEEN :first AND :last
+    GROUP BY c.{period}
+    ORDER BY c.{period}
+"""
+STATS_PERIOD_COLUMNS = {"week": "week_sunday", "month": "month"}
+
+
+def get_tasks_by_date(date: str) -> List[Dict[str, Any]]:
+    """获取某一天的所有任务，按负责人、优先级 (从紧急到普通) 排序"""
+    _, interval_queries = _task_queries(date, date)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(TASKS_ON_DATE_SQL, (_day(date),))
+        tasks = _decode_rows(cursor.fetchall())
+        interval_rows = []
+        for sql, params in interval_queries:
+            cursor.execute(sql, params)
+            interval_rows.extend(cursor.fetchall())
+
+    if interval_rows:
+        tasks.extend(_expand_interval_rows(interval_rows, date, date))
+        # 与索引顺序一致: 按优先级编码降序
+        severity = {name: code for code, name in _value_names.get("priority", {}).items()}
+        tasks.sort(key=lambda task: severity[task["priority"]], reverse=True)
+        tasks.sort(key=lambda task: task["assignee"])
+    return tasks
+
+
+# 全文检索: 关键词作为短语匹配，按相关度 (bm25) 排序
+SEARCH_MATCH_SQL = f"""
+    SELECT source, record_id, task_name, assignee, last_date, rank,
+           snippet(task_search, -1, '{SEARCH_HIGHLIGHT[0]}', '{SEARCH_HIGHLIGHT[1]}', '…', 24) AS snippet
+    FROM task_search
+    WHERE task_search MATCH ?
+    ORDER BY rank
+    LIMIT ?
+"""
+# 两个字的关键词: 先在 task_search_bigrams 中按相关度取前 limit 条，再读取这些记录
+SEARCH_BIGRAM_SQL = """
+    SELECT s.source, s.record_id, s.task_name, s.assignee, s.last_date, m.rank
+    FROM (SELECT rowid, rank FROM task_search_bigrams WHERE task_search_bigrams MATCH ? ORDER BY rank LIMIT ?) AS m
+    JOIN task_search AS s ON s.rowid = m.rowid
+"""
+# 其他无法走索引的关键词 (单个字、含标点的两个字) 扫描检索表 (每条记录一行，比扫描按天存储的 tasks 小)
+SEARCH_SHORT_SQL = """
+    SELECT source, record_id, task_name, assignee, last_date
+    FROM task_search
+    WHERE task_name LIKE ? OR assignee LIKE ?
+    ORDER BY last_date DESC
+    LIMIT ?
+"""
+# 一条记录的所有任务行，最近的日期在前 (UNIQUE(source, record_id, date) 的索引)
+RECORD_TASKS_SQL = f"SELECT {TASK_COLUMNS} FROM tasks WHERE record_id = ? AND source = ? ORDER BY date DESC"
+RECORD_INTERVALS_SQL = f"SELECT {INTERVAL_COLUMNS} FROM task_intervals WHERE source = ? AND record_id = ?"
+
+
+def _highlight(text: str, keyword: str) -> str:
+    """给 text 中出现的关键词加上高亮标记 (忽略大小写)"""
+    return re.sub(re.escape(keyword), lambda m: f"{SEARCH_HIGHLIGHT[0]}{m.group(0)}{SEARCH_HIGHLIGHT[1]}",
+                  text, flags=re.IGNORECASE)
+
+
+def _interval_window_start(last_date: int, limit: int) -> Optional[str]:
+    """区间只需要展开最后的 limit 天 (last_date 为存储的日序号)"""
+    if not last_date:
+        return None
+    return ordinal_to_date_str(max(last_date - limit + 1, 1))
+
+
+def _search_phrase(keyword: str) -> str:
+    """关键词 -> MATCH 短语 (引号和 FTS 运算符不会被解析)"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def _search_tasks_like(keyword: str, limit: int) -> List[Dict[str, Any]]:
+    """不支持 FTS5 trigram 时的搜索: 对任务表做 LIKE 扫描，按日期降序"""
+    pattern = f"%{keyword}%"
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {TASK_COLUMNS}
+            FROM tasks
+            WHERE task_name LIKE ? OR assignee LIKE ?
+            ORDER BY date DESC
+            LIMIT ?
+        """, (pattern, pattern, limit))
+        tasks = _decode_rows(cursor.fetchall())
+        cursor.execute(f"""
+            SELECT {INTERVAL_COLUMNS}
+            FROM task_intervals
+            WHERE task_name LIKE ? OR assignee LIKE ?
+            ORDER BY last_date DESC
+            LIMIT ?
+        """, (pattern, pattern, limit))
+        interval_rows = cursor.fetchall()
+
+    for row in interval_rows:
+        tasks.extend(_expand_interval_rows([row], _interval_window_start(row["last_date"], limit)))
+    if interval_rows:
+        tasks.sort(key=lambda task: task["date"], reverse=True)
+    for task in tasks:
+        task["snippet"] = _highlight(task["task_name"], keyword) if keyword else task["task_name"]
+    return tasks[:limit]
+
+
+def search_tasks(keyword: str, limit: int = 100) -> List[Dict[str, Any]]:
+    """按任务名称或负责人搜索，返回最多 limit 条任务 (每天一条)
+
+    使用全文检索表 task_search: 匹配的记录按相关度排序，同一记录的任务按日期降序。
+    每条任务带 snippet: 命中内容的高亮片段 (SEARCH_HIGHLIGHT 标记)。
+    """
+    keyword = keyword.strip()
+    if not _search_enabled or not keyword:
+        return _search_tasks_like(keyword, limit)
+
+    tasks: List[Dict[str, Any]] = []
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        ranked = True
+        if len(keyword) >= 3:
+            cursor.execute(SEARCH_MATCH_SQL, (_search_phrase(keyword), limit))
+        elif len(keyword) == 2 and keyword.isalnum():
+            cursor.execute(SEARCH_BIGRAM_SQL, (_search_phrase(keyword), limit))
+        else:
+            ranked = False
+            pattern = f"%{keyword}%"
+            cursor.execute(SEARCH_SHORT_SQL, (pattern, pattern, limit))
+        rows = cursor.fetchall()
+        if ranked:
+            # 相关度相同时最近的任务在前 (只对返回的行排序，不在 SQL 中为所有命中的记录读取 last_date)
+            rows.sort(key=lambda row: row["last_date"], reverse=True)
+            rows.sort(key=lambda row: row["rank"])
+        matches = []
+        for row in rows:
+            if len(keyword) >= 3:
+                snippet = row["snippet"]
+            else:
+                # 高亮片段从命中的任务名称或负责人生成
+                text = row["task_name"] if keyword.lower() in row["task_name"].lower() else row["assignee"]
+                snippet = _highlight(text, keyword)
+            matches.append((row["source"], row["record_id"], snippet))
+
+        for source, record_id, snippet in matches:
+            cursor.execute(RECORD_TASKS_SQL, (record_id, source))
+            record_tasks = _decode_rows(cursor.fetchmany(limit - len(tasks)))
+            cursor.execute(RECORD_INTERVALS_SQL, (source, record_id))
+            for row in cursor.fetchall():
+                expanded = _expand_interval_rows([row], _interval_window_start(row["last_date"], limit))
+                record_tasks.extend(sorted(expanded, key=lambda task: task["date"], reverse=True))
+            for task in record_tasks[:limit - len(tasks)]:
+                task["snippet"] = snippet
+                tasks.append(task)
+            if len(tasks) >= limit:
+                break
+    return tasks
+
+
+def get_task_stats(start_date: str, end_date: str) -> tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """统计日期范围内的任务天数
+
+    Returns:
+        (by_engineer, by_priority): by_engineer 按 total_tasks 降序，每项包含
+        engineer, total_tasks, very_urgent, urgent, important (多人任务计入每位工程师)；
+        by_priority 为 {优先级: 数量} (每条任务计一次)
+    """
+    window_first, window_last = _day(start_date), _day(end_date)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(STATS_DAILY_SQL, (window_first, window_last))
+        priority_counts = [(priority, days) for _, priority, days in cursor.fetchall()]
+        cursor.execute(STATS_ENGINEER_SQL, (window_first, window_last))
+        engineer_counts = [tuple(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT id, name FROM engineers")
+        engineer_names = dict(cursor.fetchall())
+        cursor.execute(STATS_INTERVAL_SQL, (window_first, window_last))
+        interval_rows = cursor.fetchall()
+
+    engineer_counts = [(engineer_names[engineer_id], priority, days) for engineer_id, priority, days in engineer_counts]
+    # 区间与统计窗口重叠的天数 (区间行不多，负责人直接拆分)
+    for assignee, priority, first_date, last_date in interval_rows:
+        days = min(last_date, window_last) - max(first_date, window_first) + 1
+        priority_counts.append((priority, days))
+        engineer_counts.extend((name, priority, days) for name in split_assignees(assignee))
+
+    engineers: Dict[str, Dict[str, Any]] = {}
+    by_priority: Dict[str, int] = {}
+    priority_columns = {"非常紧急": "very_urgent", "紧急": "urgent", "重要": "important"}
+    for name, code, days in engineer_counts:
+        priority = _value_name("priority", code)
+        stats = engineers.setdefault(name, {
+            "engineer": name, "total_tasks": 0, "very_urgent": 0, "urgent": 0, "important": 0
+        })
+        stats["total_tasks"] += days
+        if priority in priority_columns:
+            stats[priority_columns[priority]] += days
+    for code, days in priority_counts:
+        priority = _value_name("priority", code)
+        by_priority[priority] = by_priority.get(priority, 0) + days
+
+    by_engineer = sorted(engineers.values(), key=lambda stats: stats["total_tasks"], reverse=True)
+    return by_engineer, by_priority
+
+
+def get_period_stats(start_date: str, end_date: str, group_by: str = "week") -> List[Dict[str, Any]]:
+    """按周 (周日开始) 或按月汇总日期范围内的任务天数
+
+    Returns:
+        按时间排序的列表，每项包含 period (周为周日的日期，月为 YYYY-MM)、start、end (截取到查询范围)、
+        workdays (工作日天数)、total_tasks、workday_tasks (落在工作日的任务天数)
+    """
+    sql = STATS_PERIOD_SQL.format(period=STATS_PERIOD_COLUMNS[group_by])
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, {"first": _day(start_date), "last": _day(end_date)})
+        rows = cursor.fetchall()
+
+    periods = []
+    for period, first_day, last_day, workdays, total_tasks, workday_tasks in rows:
+        periods.append({
+            "period": ordinal_to_date_str(period) if group_by == "week" else f"{period // 100}-{period % 100:02d}",
+            "start": ordinal_to_date_str(first_day),
+            "end": ordinal_to_date_str(last_day),
+            "workdays": workdays,
+            "total_tasks": int(total_tasks),
+            "workday_tasks": int(workday_tasks),
+        })
+    return periods
+
+
+def get_engineers() -> List[str]:
+    """返回当前有任务的工程师 (多人任务拆分为各自的名字，按名称排序)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT name FROM engineers AS e
+            WHERE EXISTS (SELECT 1 FROM task_assignees WHERE engineer_id = e.id)
+               OR EXISTS (SELECT 1 FROM interval_assignees WHERE engineer_id = e.id)
+            ORDER BY name
+        """)
+        return [row["name"] for row in cursor.fetchall()]
+
+
 def get_task_count() -> int:
-    """返回 tasks 表中的任务数量，便于健康检查和测试"""
+    """返回已存储的任务行数 (tasks 表与 task_intervals 表之和)，便于健康检查和测试"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) AS count FROM tasks")
+        cursor.execute("SELECT (SELECT COUNT(*) FROM tasks) + (SELECT COUNT(*) FROM task_intervals) AS count")
         row = cursor.fetchone()
 
     count = row["count"] if isinstance(row, sqlite3.Row) else row[0]
@@ -256,36 +2061,27 @@ def get_task_count() -> int:
     return count
 
 
-def get_tasks_by_record_id(record_id: str) -> List[Dict[str, Any]]:
-    """根据 record_id 获取所有相关任务记录"""
+def get_tasks_by_record_id(record_id: str, source: Optional[str] = None) -> List[Dict[str, Any]]:
+    """根据 record_id 获取所有相关任务记录
+
+    唯一键以 source 开头，只有给出 source 时才能走索引；不给时在所有数据源中查找 (扫描全表)。
+    """
+    source_filter = "AND source = ?" if source is not None else ""
+    params = (record_id, source) if source is not None else (record_id,)
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            """
-            SELECT record_id, task_name, assignee, status, priority, application_status, date, start_date, end_date, weekday
+            f"""
+            SELECT {TASK_COLUMNS}
             FROM tasks
-            WHERE record_id = ?
+            WHERE record_id = ? {source_filter}
             ORDER BY date
             """,
-            (record_id,)
+            params
         )
-        rows = cursor.fetchall()
-
-    tasks = [
-        {
-            "record_id": row["record_id"],
-            "task_name": row["task_name"],
-            "assignee": row["assignee"],
-            "status": row["status"],
-            "priority": row["priority"],
-            "application_status": row["application_status"],
-            "date": row["date"],
-            "start_date": row["start_date"],
-            "end_date": row["end_date"],
-            "weekday": row["weekday"]
-        }
-        for row in rows
-    ]
+        tasks = _decode_rows(cursor.fetchall())
+        cursor.execute(f"SELECT {INTERVAL_COLUMNS} FROM task_intervals WHERE record_id = ? {source_filter}", params)
+        tasks.extend(_expand_interval_rows(cursor.fetchall()))
 
     logger.debug("Fetched %d tasks for record_id %s", len(tasks), record_id)
     return tasks
@@ -1,15 +1,41 @@
 import json
 import os
-from typing import Dict, Any, List, Union
+from typing import Callable, Dict, Any, List, Tuple, Union
 from fastapi import HTTPException
 from datetime import datetime, timedelta
+import task_db
 # 导入统一的日期计算函数
 from task_db import get_week_range
 
+# 编译后的筛选条件: task -> 是否通过
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def _members(values: List[Any]) -> Union[frozenset, tuple]:
+    """in / not_in 的取值集合 (取值不可哈希时退回元组)"""
+    try:
+        return frozenset(values)
+    except TypeError:
+        return tuple(values)
+
+
+def _always_false(task: Dict[str, Any]) -> bool:
+    return False
+
+
+def _always_true(task: Dict[str, Any]) -> bool:
+    return True
+
+
 class TaskFilter:
     def __init__(self, config_path: str = "filter_config.json"):
         self.config_path = config_path
         self.config = self._load_config()
+        # 编译好的条件 {条件的 JSON: Predicate}，配置变化时清空
+        self._compiled: Dict[str, Predicate] = {}
+        # 本周范围的缓存 (日期, (开始, 结束))
+        self._week: Tuple[Any, Tuple[str, str]] = (None, ("", ""))
+        self._compile_filters()
     
     def _load_config(self) -> Dict[str, Any]:
         """加载筛选配置"""
@@ -37,79 +63,134 @@ class TaskFilter:
         with open(self.config_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def _evaluate_condition(self, task: Dict[str, Any], condition: Dict[str, Any]) -> bool:
-        """评估单个条件"""
-        field = condition["field"]
-        operator = condition["operator"]
+    def _compile_condition(self, condition: Dict[str, Any]) -> Predicate:
+        """把单个条件编译为闭包: 操作符在编译时分派，字段为空 (None) 时只有 is_empty 成立"""
+        field = condition.get("field")
+        operator = condition.get("operator")
         value = condition.get("value")
-        
-        # 获取任务字段值
-        task_value = task.get(field)
-        
-        # 处理空值情况
-        if task_value is None:
-            if operator in ["not_empty", "is_empty"]:
-                return operator == "is_empty"
-            return False
-        
-        # 根据操作符评估条件
+
         if operator == "equals":
-            return task_value == value
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and task_value == value
         elif operator == "not_equals":
-            return task_value != value
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and task_value != value
         elif operator == "contains":
-            return value in str(task_value)
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and value in str(task_value)
         elif operator == "not_contains":
-            return value not in str(task_value)
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and value not in str(task_value)
         elif operator == "in":
-            return task_value in value if isinstance(value, list) else False
+            if not isinstance(value, list):
+                return _always_false
+            members = _members(value)
+
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and task_value in members
         elif operator == "not_in":
-            return task_value not in value if isinstance(value, list) else True
-        elif operator == "greater_than":
-            try:
-                return float(task_value) > float(value)
-            except (ValueError, TypeError):
-                return False
-        elif operator == "less_than":
+            members = _members(value) if isinstance(value, list) else ()
+
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and task_value not in members
+        elif operator in ("greater_than", "less_than"):
             try:
-                return float(task_value) < float(value)
+                threshold = float(value)
             except (ValueError, TypeError):
-                return False
+                return _always_false
+            greater = operator == "greater_than"
+
+            def predicate(task):
+                task_value = task.get(field)
+                if task_value is None:
+                    return False
+                try:
+                    number = float(task_value)
+                except (ValueError, TypeError):
+                    return False
+                return number > threshold if greater else number < threshold
         elif operator == "not_empty":
-            return task_value is not None and task_value != ""
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and task_value != ""
         elif operator == "is_empty":
-            return task_value is None or task_value == ""
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is None or task_value == ""
         elif operator == "this_week":
             # 检查日期是否在本周（周日开始）
-            return self._is_date_in_current_week(task_value)
+            def predicate(task):
+                task_value = task.get(field)
+                return task_value is not None and self._is_date_in_current_week(task_value)
         else:
-            return False
+            return _always_false
+        return predicate
+
+    def compile_conditions(self, conditions: List[Dict[str, Any]], logic: str = "and") -> Predicate:
+        """把条件列表编译为一个闭包 (结果按条件内容缓存)，and / or 遇到第一个确定结果的条件即返回"""
+        key = json.dumps([conditions, logic], ensure_ascii=False, sort_keys=True, default=str)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        predicates = [self._compile_condition(cond) for cond in conditions]
+        if not predicates:
+            compiled = _always_true
+        elif len(predicates) == 1:
+            compiled = predicates[0]
+        elif logic == "or":
+            def compiled(task):
+                for predicate in predicates:
+                    if predicate(task):
+                        return True
+                return False
+        else:  # 默认为AND逻辑
+            def compiled(task):
+                for predicate in predicates:
+                    if not predicate(task):
+                        return False
+                return True
+        self._compiled[key] = compiled
+        return compiled
+
+    def _compile_filters(self):
+        """配置加载或变化后重新编译所有筛选器"""
+        self._compiled.clear()
+        for filter_config in self.config.get("filters", {}).values():
+            self.compile_conditions(filter_config.get("conditions", []), filter_config.get("logic", "and"))
+
+    def _evaluate_condition(self, task: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+        """评估单个条件"""
+        return self._compile_condition(condition)(task)
     
     def _evaluate_conditions(self, task: Dict[str, Any], conditions: List[Dict[str, Any]], logic: str = "and") -> bool:
         """评估条件列表"""
-        if not conditions:
-            return True
-            
-        results = [self._evaluate_condition(task, cond) for cond in conditions]
-        
-        if logic == "and":
-            return all(results)
-        elif logic == "or":
-            return any(results)
-        else:
-            return all(results)  # 默认为AND逻辑
+        return self.compile_conditions(conditions, logic)(task)
     
-    def filter_tasks(self, tasks: List[Dict[str, Any]], filter_name: str = None) -> List[Dict[str, Any]]:
-        """根据配置筛选任务"""
+    def _enabled_filter(self, filter_name: str = None) -> Union[Dict[str, Any], None]:
+        """返回启用的筛选器配置，不存在或未启用时返回 None"""
         # 如果没有指定筛选器，使用当前激活的筛选器
         if not filter_name:
             filter_name = self.config.get("active_filter", "default")
         
         # 获取筛选器配置
         filter_config = self.config.get("filters", {}).get(filter_name)
+        if not filter_config or not filter_config.get("enabled", False):
+            return None
+        return filter_config
+
+    def filter_tasks(self, tasks: List[Dict[str, Any]], filter_name: str = None) -> List[Dict[str, Any]]:
+        """根据配置筛选任务"""
+        filter_config = self._enabled_filter(filter_name)
         
         # 如果筛选器不存在或未启用，返回所有任务
-        if not filter_config or not filter_config.get("enabled", False):
+        if filter_config is None:
             return tasks
         
         # 获取条件和逻辑
@@ -117,12 +198,23 @@ class TaskFilter:
         logic = filter_config.get("logic", "and")  # 默认AND逻辑
         
         # 筛选任务
-        filtered_tasks = [
-            task for task in tasks 
-            if self._evaluate_conditions(task, conditions, logic)
-        ]
-        
-        return filtered_tasks
+        return list(filter(self.compile_conditions(conditions, logic), tasks))
+
+    def query_tasks(self, start_date: str, end_date: str, filter_name: str = None) -> List[Dict[str, Any]]:
+        """查询日期范围内 (以及没有有效日期) 通过筛选器的任务
+
+        能翻译为 SQL 的条件在数据库中过滤 (task_db.compile_filter)，其余条件只对查出的任务逐条判断，
+        耗时随结果数量而不是表的大小增长
+        """
+        filter_config = self._enabled_filter(filter_name)
+        if filter_config is None:
+            return task_db.query_tasks(start_date, end_date, include_undated=True)
+        return task_db.query_tasks(
+            start_date, end_date, include_undated=True,
+            conditions=filter_config.get("conditions", []),
+            logic=filter_config.get("logic", "and"),
+            match=self.compile_conditions
+        )
     
     def get_available_filters(self) -> List[str]:
         """获取所有可用的筛选器名称"""
@@ -177,6 +269,7 @@ class TaskFilter:
     
     def _save_config(self):
         """保存配置到文件"""
+        self._compile_filters()
         with open(self.config_path, 'w', encoding='utf-8') as f:
             json.dump(self.config, f, ensure_ascii=False, indent=2)
 
@@ -203,8 +296,11 @@ class TaskFilter:
             else:
                 return False
 
-            # 使用统一的日期计算函数获取本周范围
-            start_date_str, end_date_str = get_week_range(week_start="sunday")
+            # 使用统一的日期计算函数获取本周范围 (按日期缓存)
+            today = datetime.now().date()
+            if self._week[0] != today:
+                self._week = (today, get_week_range(today.strftime("%Y-%m-%d"), week_start="sunday"))
+            start_date_str, end_date_str = self._week[1]
 
             # 比较日期字符串
             return start_date_str <= check_date <= end_date_str
@@ -0,0 +1,86 @@
+"""事件推送校验测试: 配置了 Encrypt Key 时，除 URL 校验外的推送都必须带有效签名且时间戳未过期，
+重复的 event_id 被识别出来
+
+    cd backend && python -m pytest test_feishu_events.py
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from feishu_events import (
+    EVENT_MAX_AGE_SECONDS, EventVerificationError, RecentEventIds, is_duplicate_event, parse_event_request
+)
+
+cryptography = pytest.importorskip("cryptography")
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+TOKEN = "verification-token"
+ENCRYPT_KEY = "encrypt-key"
+RECORD_EVENT = {
+    "schema": "2.0",
+    "header": {"token": TOKEN, "event_type": "drive.file.bitable_record_changed_v1"},
+    "event": {"file_token": "app", "table_id": "tbl", "action_list": [{"record_id": "rec1", "action": "record_edited"}]},
+}
+CHALLENGE = {"type": "url_verification", "token": TOKEN, "challenge": "abc"}
+
+
+def _encrypted_body(payload):
+    plain = json.dumps(payload).encode("utf-8")
+    padding = 16 - len(plain) % 16
+    plain += bytes([padding]) * padding
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(hashlib.sha256(ENCRYPT_KEY.encode()).digest()), modes.CBC(iv)).encryptor()
+    data = iv + encryptor.update(plain) + encryptor.finalize()
+    return json.dumps({"encrypt": base64.b64encode(data).decode()}).encode("utf-8")
+
+
+def _signed_headers(body, key=ENCRYPT_KEY, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    headers = {"x-lark-request-timestamp": str(timestamp), "x-lark-request-nonce": "nonce"}
+    headers["x-lark-signature"] = hashlib.sha256(
+        (headers["x-lark-request-timestamp"] + headers["x-lark-request-nonce"] + key).encode() + body
+    ).hexdigest()
+    return headers
+
+
+def _parse(body, headers):
+    return parse_event_request(body, headers, verification_token=TOKEN, encrypt_key=ENCRYPT_KEY)
+
+
+def test_signed_event_accepted():
+    body = _encrypted_body(RECORD_EVENT)
+    assert _parse(body, _signed_headers(body)) == RECORD_EVENT
+
+
+@pytest.mark.parametrize("headers", [
+    lambda body: {},
+    lambda body: _signed_headers(body, key="wrong-key"),
+    lambda body: _signed_headers(body, timestamp=int(time.time()) - EVENT_MAX_AGE_SECONDS - 60),
+    lambda body: _signed_headers(body, timestamp=""),
+], ids=["unsigned", "bad_signature", "stale", "no_timestamp"])
+def test_unsigned_or_forged_event_rejected(headers):
+    body = _encrypted_body(RECORD_EVENT)
+    with pytest.raises(EventVerificationError):
+        _parse(body, headers(body))
+
+
+def test_unsigned_url_verification_accepted():
+    assert _parse(_encrypted_body(CHALLENGE), {}) == CHALLENGE
+
+
+def test_duplicate_event_ignored():
+    recent = RecentEventIds(ttl_seconds=60, max_ids=2)
+    event = dict(RECORD_EVENT, header=dict(RECORD_EVENT["header"], event_id="ev1"))
+    assert not is_duplicate_event(event, recent)
+    assert is_duplicate_event(event, recent)
+    for event_id in ("ev2", "ev3"):  # 超出 max_ids 时淘汰最早的 event_id
+        assert not is_duplicate_event(dict(event, header=dict(event["header"], event_id=event_id)), recent)
+    assert not is_duplicate_event(event, recent)
+    assert not is_duplicate_event(RECORD_EVENT, recent)  # 没有 event_id 的事件不去重
@@ -0,0 +1,55 @@
+"""飞书读取器的错误分类测试 (对本地替身服务 feishu_mock_server 发请求)
+
+    cd backend && python -m pytest test_feishu_reader.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import feishu_reader
+from feishu_mock_server import start_mock_server
+from feishu_reader import FeishuAPIError, FeishuBitableReader
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(feishu_reader, "TOKEN_CACHE_FILE", str(tmp_path / "token_cache.json"))
+    monkeypatch.setattr(feishu_reader, "_token_cache", {})
+    server = start_mock_server(records=250)
+    yield server
+    server.shutdown()
+
+
+def _reader(server):
+    host, port = server.server_address[:2]
+    return FeishuBitableReader("app", "secret", base_url=f"http://{host}:{port}")
+
+
+@pytest.mark.parametrize("call", [
+    lambda reader: reader.get_records("app", "tbl"),
+    lambda reader: reader.get_records("app", "tbl", filter={"conjunction": "and", "conditions": []}),
+    lambda reader: reader.get_records_by_ids("app", "tbl", ["rec00000001", "rec00000002"]),
+    lambda reader: reader.get_fields("app", "tbl"),
+])
+def test_revoked_token_is_refreshed(server, call):
+    """token 被作废时飞书返回 HTTP 400 + 99991663，应刷新 token 后重试而不是直接失败"""
+    reader = _reader(server)
+    token = reader._get_tenant_access_token()
+    server.state.revoked_tokens.add(token)
+
+    assert call(reader)
+    assert reader.access_token != token
+    assert server.state.stats["tokens_issued"] == 2
+
+
+def test_token_rejected_after_refresh(server):
+    """刷新后的 token 仍被拒绝时报错，不无限重试"""
+    reader = _reader(server)
+    server.state.revoked_tokens.update(f"t-mock-app-{n}" for n in (1, 2))
+
+    with pytest.raises(FeishuAPIError):
+        reader.get_fields("app", "tbl")
+    assert server.state.stats["tokens_issued"] == 2
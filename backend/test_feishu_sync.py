@@ -0,0 +1,62 @@
+"""同步流程测试 (对本地替身服务 feishu_mock_server 同步)
+
+    cd backend && python -m pytest test_feishu_sync.py
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import feishu_reader
+import feishu_sync
+import task_db
+from feishu_mock_server import start_mock_server
+from feishu_reader import FeishuBitableReader
+
+
+@pytest.fixture
+def reader(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    monkeypatch.setattr(feishu_sync, "SYNC_CHECKPOINT_DIR", str(tmp_path / "sync_checkpoints"))
+    monkeypatch.setattr(feishu_reader, "TOKEN_CACHE_FILE", str(tmp_path / "token_cache.json"))
+    task_db.init_db()
+    server = start_mock_server(records=300)
+    host, port = server.server_address[:2]
+    yield FeishuBitableReader("app", "secret", base_url=f"http://{host}:{port}")
+    server.shutdown()
+    task_db.close_connection_pool()
+
+
+def _sync(reader, mode, write_lock=None):
+    return feishu_sync.run_sync(app_token="app", table_id="tbl", mode=mode, reader=reader, write_lock=write_lock)
+
+
+@pytest.mark.parametrize("write_lock", [None, threading.Lock()], ids=["single", "parallel"])
+def test_sync_state_committed_with_tasks(reader, monkeypatch, write_lock):
+    """同步状态在写入任务的事务中提交，不另开写连接 (并行同步时可能等不到写锁)"""
+    def no_separate_connection(key, value):
+        raise AssertionError(f"sync state {key} written outside the task transaction")
+    monkeypatch.setattr(feishu_sync, "set_sync_state", no_separate_connection)
+
+    summary = _sync(reader, "full", write_lock)
+    assert summary["success"], summary["message"]
+    for name in ("watermark", "last_full_sync", "dataset_hash", "field_fingerprint"):
+        assert task_db.get_sync_state(feishu_sync._state_key(name, "app", "tbl"))
+
+
+@pytest.mark.parametrize("write_lock", [None, threading.Lock()], ids=["single", "parallel"])
+def test_unchanged_full_sync_skips_write(reader, monkeypatch, write_lock):
+    """整表内容与上次全量同步相同时直接结束，不打开写事务 (单表同步也一样)"""
+    assert _sync(reader, "full", write_lock)["success"]
+
+    def no_writer(*args, **kwargs):
+        raise AssertionError("write transaction opened for an unchanged dataset")
+    monkeypatch.setattr(feishu_sync, "open_task_writer", no_writer)
+
+    summary = _sync(reader, "full", write_lock)
+    assert summary["success"], summary["message"]
+    assert "dataset unchanged" in summary["message"]
+    assert summary["records_fetched"] == summary["records_skipped"] == 300
@@ -0,0 +1,83 @@
+"""筛选条件下推到 SQL 的回归测试: 结果须与先查出全部任务、再用 TaskFilter 在 Python 中筛选一致
+
+    cd backend && python -m pytest test_filter_pushdown.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import task_db
+from task_filter import TaskFilter
+
+START, END = task_db.get_week_range(week_start="sunday")
+
+CONDITIONS = [
+    {"field": "status", "operator": "not_in", "value": ["已取消", "已关闭"]},
+    {"field": "status", "operator": "in", "value": ["紧急", "高优先级"]},
+    {"field": "status", "operator": "equals", "value": "从未出现的状态"},
+    {"field": "assignee", "operator": "not_empty"},
+    {"field": "assignee", "operator": "contains", "value": "张三"},
+    {"field": "task_name", "operator": "not_contains", "value": "巡检"},
+    {"field": "priority", "operator": "contains", "value": "紧急"},
+    {"field": "priority", "operator": "greater_than", "value": "1"},
+    {"field": "application_status", "operator": "is_empty"},
+    {"field": "application_status", "operator": "equals", "value": "已通过"},
+    {"field": "date", "operator": "this_week"},
+    {"field": "date", "operator": "equals", "value": START},
+    {"field": "start_date", "operator": "in", "value": [START, "2025-1-5", "无效日期"]},
+    {"field": "end_date", "operator": "is_empty"},
+    {"field": "weekday", "operator": "equals", "value": "weekend"},
+    {"field": "unknown_field", "operator": "is_empty"},
+]
+
+
+def _task(record_id, date, **fields):
+    task = {
+        "record_id": record_id, "task_name": "客户A 巡检", "assignee": "张三", "status": "进行中",
+        "priority": "重要", "application_status": "", "date": date, "start_date": date, "end_date": date,
+    }
+    task.update(fields)
+    return task
+
+
+@pytest.fixture
+def task_filter(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    task_db.init_db()
+    task_db.save_processed_tasks_to_db({"monday": [
+        _task("rec1", START),
+        _task("rec2", END, assignee="张三, 李四", status="紧急", priority="非常紧急"),
+        _task("rec3", START, task_name="客户B 安装", application_status="已通过", status="已取消"),
+        _task("rec4", "", assignee="", start_date="", end_date=""),
+    ]})
+    with task_db.open_task_writer("intervals") as writer:
+        writer.write_intervals([
+            {"record_id": "rec5", "task_name": "客户C 驻场", "assignee": "李四", "status": "进行中", "priority": "紧急",
+             "application_status": "审批中", "start_date": START, "end_date": END, "first_date": START, "last_date": END},
+            {"record_id": "rec6", "task_name": "客户D 巡检", "assignee": "王五", "status": "已结束", "priority": "普通",
+             "application_status": "", "start_date": "", "end_date": "", "first_date": "", "last_date": ""},
+        ])
+    yield TaskFilter(str(tmp_path / "filter_config.json"))
+    task_db.close_connection_pool()
+
+
+def _keys(tasks):
+    return sorted((task["source"], task["record_id"], task["date"]) for task in tasks)
+
+
+@pytest.mark.parametrize("logic", ["and", "or"])
+@pytest.mark.parametrize("index", range(len(CONDITIONS)))
+def test_pushdown_matches_python(task_filter, logic, index):
+    conditions = [CONDITIONS[index], CONDITIONS[(index + 3) % len(CONDITIONS)]]
+    task_filter.config = {"filters": {"f": {"enabled": True, "conditions": conditions, "logic": logic}}}
+    for assignee in (None, "张三"):
+        everything = task_db.query_tasks(START, END, assignee=assignee, include_undated=True)
+        expected = task_filter.filter_tasks(everything, "f")
+        pushed = task_db.query_tasks(
+            START, END, assignee=assignee, include_undated=True,
+            conditions=conditions, logic=logic, match=task_filter.compile_conditions
+        )
+        assert _keys(pushed) == _keys(expected), conditions
@@ -0,0 +1,126 @@
+"""数据库升级测试: 从最初版本的数据库 (文本日期、UNIQUE(record_id, date)、feishu_records 表和
+fix_view.py 创建的本周任务视图) 开始执行 init_db()
+
+    cd backend && python -m pytest test_migrations.py
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import task_db
+
+# 最初版本的表结构 (与 backup/tasks.db.bak_20251017100056 相同)
+BASELINE_SCHEMA = [
+    """CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record_id TEXT NOT NULL,
+        task_name TEXT NOT NULL,
+        assignee TEXT NOT NULL,
+        status TEXT NOT NULL,
+        date TEXT NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        weekday TEXT NOT NULL,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP, priority TEXT, application_status TEXT,
+        UNIQUE(record_id, date)
+    )""",
+    """CREATE TABLE feishu_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record_id TEXT UNIQUE NOT NULL,
+        fields TEXT NOT NULL,
+        created_time INTEGER,
+        last_modified_time INTEGER,
+        last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX idx_tasks_weekday ON tasks (weekday)",
+    "CREATE INDEX idx_tasks_date ON tasks (date)",
+    "CREATE INDEX idx_feishu_record_id ON feishu_records (record_id)",
+    """CREATE VIEW current_week_tasks_view AS
+        SELECT * FROM tasks
+        WHERE date BETWEEN
+            (SELECT DATE('now', 'weekday 1', '-7 days'))
+            AND
+            (SELECT DATE('now', 'weekday 1', '-1 day'))""",
+]
+
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    """最初版本的数据库: 本周一、本周日、上周日各一条记录，另有一条没有日期的记录"""
+    path = str(tmp_path / "tasks.db")
+    with sqlite3.connect(path) as conn:
+        for sql in BASELINE_SCHEMA:
+            conn.execute(sql)
+        monday, sunday, last_sunday = conn.execute(
+            "SELECT DATE('now', 'weekday 1', '-7 days'), DATE('now', 'weekday 1', '-1 day'), "
+            "DATE('now', 'weekday 1', '-8 days')"
+        ).fetchone()
+        rows = [
+            ("rec1", "客户A 巡检", "张三", "进行中", monday, monday, sunday, "monday", "紧急", "审批中"),
+            ("rec1", "客户A 巡检", "张三", "进行中", sunday, monday, sunday, "weekend", "紧急", "审批中"),
+            ("rec2", "客户B 安装", "李四, 王五", "已结束", last_sunday, last_sunday, last_sunday, "weekend", "普通", "已通过"),
+            ("rec3", "客户C 驻场", "赵六", "重要", "", "", "", "unknown_date", "重要", ""),
+        ]
+        conn.executemany("""
+            INSERT INTO tasks (record_id, task_name, assignee, status, date, start_date, end_date, weekday,
+                               priority, application_status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.execute("INSERT INTO feishu_records (record_id, fields) VALUES ('rec1', '{}')")
+        view_rows = conn.execute("SELECT record_id, date FROM current_week_tasks_view ORDER BY date").fetchall()
+    monkeypatch.setattr(task_db, "DB_FILE", path)
+    yield view_rows
+    task_db.close_connection_pool()
+
+
+def test_migrate_baseline_with_view(baseline_db):
+    task_db.init_db()
+    with task_db.get_db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT record_id, date FROM {task_db.CURRENT_WEEK_VIEW} ORDER BY date"
+        ).fetchall()
+    assert [(record_id, task_db.ordinal_to_date_str(day)) for record_id, day in rows] == baseline_db
+    assert len(baseline_db) == 2
+
+
+def test_migrate_baseline_rows(baseline_db):
+    """升级后行数不变，查询接口返回的任务与升级前的文本行一致，派生表 (负责人、全文检索) 已回填"""
+    columns = ("record_id", "task_name", "assignee", "status", "date", "start_date", "end_date", "weekday",
+               "priority", "application_status")
+    with sqlite3.connect(task_db.DB_FILE) as conn:
+        before = sorted(conn.execute(f"SELECT {', '.join(columns)} FROM tasks").fetchall())
+
+    task_db.init_db()
+    task_db.init_db()  # 已是当前版本时不再转换
+
+    with task_db.get_db_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == task_db.SCHEMA_VERSION
+        assert conn.execute("SELECT COUNT(*) FROM feishu_records").fetchone()[0] == 1
+    assert task_db.get_task_count() == len(before) == 4
+    tasks = task_db.query_tasks(include_undated=True)
+    assert sorted(tuple(task[column] for column in columns) for task in tasks) == before
+    assert {task["source"] for task in tasks} == {task_db.DEFAULT_SOURCE}
+    assert [task["date"] for task in task_db.get_tasks_by_record_id("rec3")] == [""]
+    assert {"张三", "李四", "王五", "赵六"} <= set(task_db.get_engineers())
+    assert [task["record_id"] for task in task_db.search_tasks("安装")] == ["rec2"]
+
+
+def test_rebuild_keeps_views(tmp_path, monkeypatch):
+    """全量重建用影子表替换 tasks 时，引用 tasks 的视图 (包括视图上的视图) 保留下来"""
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    task_db.init_db()
+    with task_db.get_db_connection("write") as conn:
+        conn.execute("CREATE VIEW v AS SELECT * FROM tasks")
+        conn.execute("CREATE VIEW v_names AS SELECT task_name FROM v")
+    day = "2025-10-13"
+    task_db.save_processed_tasks_to_db({"monday": [{
+        "record_id": "rec1", "task_name": "客户A 巡检", "assignee": "张三", "status": "进行中",
+        "priority": "重要", "application_status": "", "date": day, "start_date": day, "end_date": day,
+    }]})
+    with task_db.get_db_connection() as conn:
+        assert [tuple(row) for row in conn.execute("SELECT task_name FROM v_names")] == [("客户A 巡检",)]
+    task_db.close_connection_pool()
@@ -0,0 +1,134 @@
+"""查询计划回归测试: 各接口的查询都应走索引，不做全表扫描，也不使用临时 B 树排序/分组
+
+用 EXPLAIN QUERY PLAN 检查 task_db 生成的 SQL。只允许扫描部分索引 (如只含无日期行的
+idx_tasks_undated)，不允许扫描整表或完整索引。
+
+    cd backend && python -m pytest test_query_plan.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import task_db
+
+START, END = "2025-10-13", "2025-10-19"
+
+
+def _api_tasks():
+    daily, intervals = task_db._task_queries(START, END, include_undated=True)
+    return daily + intervals
+
+
+def _by_engineer():
+    daily, intervals = task_db._task_queries(START, END, assignee="张三")
+    return daily + intervals
+
+
+def _by_date():
+    _, intervals = task_db._task_queries(START, START)
+    return [(task_db.TASKS_ON_DATE_SQL, [task_db._day(START)])] + intervals
+
+
+def _stats():
+    window = [task_db._day(START), task_db._day(END)]
+    return [(task_db.STATS_DAILY_SQL, window), (task_db.STATS_ENGINEER_SQL, window),
+            (task_db.STATS_INTERVAL_SQL, window)]
+
+
+# 默认筛选器 (filter_config.json) 的条件，翻译为 SQL 后附加在日期条件之后
+DEFAULT_FILTER = [
+    {"field": "status", "operator": "not_in", "value": ["已取消", "已关闭"]},
+    {"field": "assignee", "operator": "not_empty"},
+    {"field": "application_status", "operator": "not_in", "value": ["已撤回"]},
+    {"field": "date", "operator": "this_week"},
+]
+
+
+def _api_tasks_filtered():
+    daily_where, daily_params, _ = task_db.compile_filter(DEFAULT_FILTER, table="tasks")
+    interval_where, interval_params, _ = task_db.compile_filter(DEFAULT_FILTER, table="task_intervals")
+    daily, intervals = task_db._task_queries(
+        START, END, include_undated=True,
+        daily_filter=(daily_where, daily_params), interval_filter=(interval_where, interval_params)
+    )
+    return daily + intervals
+
+
+ENDPOINT_QUERIES = {
+    "/api/tasks": _api_tasks,
+    "/api/tasks?filter_name": _api_tasks_filtered,
+    "/api/tasks/by-engineer": _by_engineer,
+    "/api/tasks/by-date": _by_date,
+    "/api/tasks/stats": _stats,
+}
+
+
+@pytest.fixture(params=["fresh", "rebuilt"])
+def db(request, tmp_path, monkeypatch):
+    """新建的数据库，以及经过一次影子表重建 (索引换用另一组名字) 的数据库"""
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    task_db.init_db()
+    if request.param == "rebuilt":
+        task_db.save_processed_tasks_to_db({"monday": [{
+            "record_id": "rec1", "task_name": "客户A 巡检", "assignee": "张三", "status": "进行中",
+            "priority": "重要", "application_status": "审批中", "date": START,
+            "start_date": START, "end_date": START,
+        }]})
+    yield
+    task_db.close_connection_pool()
+
+
+def _plan(sql, params):
+    """返回 (查询计划各行的 detail, 部分索引名集合)"""
+    with task_db.get_db_connection() as conn:
+        partial = {
+            row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        }
+        details = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    return details, partial
+
+
+@pytest.mark.parametrize("endpoint", sorted(ENDPOINT_QUERIES))
+def test_endpoint_queries_use_indexes(db, endpoint):
+    for sql, params in ENDPOINT_QUERIES[endpoint]():
+        details, partial = _plan(sql, params)
+        for detail in details:
+            assert "TEMP B-TREE" not in detail, f"{endpoint}: {detail}\n{sql}"
+            if detail.startswith("SCAN "):
+                assert detail.split()[-1] in partial, f"{endpoint}: full scan {detail}\n{sql}"
+
+
+def test_stats_read_only_covering_indexes(db):
+    for sql, params in _stats():
+        details, _ = _plan(sql, params)
+        assert all("COVERING INDEX" in detail for detail in details), details
+
+
+def test_api_task_queries_use_partial_indexes(db):
+    """有日期的行走 idx_tasks_day，无日期的行走 idx_tasks_undated"""
+    undated_sql, dated_sql = [sql for sql, _ in task_db._task_queries(START, END, include_undated=True)[0]]
+    assert "idx_tasks_undated" in " ".join(_plan(undated_sql, [])[0])
+    assert "idx_tasks_day" in " ".join(_plan(dated_sql, [task_db._day(START), task_db._day(END)])[0])
+
+
+def test_search_queries_use_fts_index(db):
+    """关键字搜索走 FTS5 全文索引，按记录取任务行走 (source, record_id) 索引"""
+    if not task_db._search_enabled:
+        pytest.skip("SQLite 不支持 FTS5 trigram")
+    for sql, params in [(task_db.SEARCH_MATCH_SQL, ['"巡检"', 50]), (task_db.SEARCH_BIGRAM_SQL, ['"巡检"', 50])]:
+        details, _ = _plan(sql, params)
+        assert any("VIRTUAL TABLE INDEX" in detail and ":M" in detail for detail in details), details
+    for sql in (task_db.RECORD_TASKS_SQL, task_db.RECORD_INTERVALS_SQL):
+        details, _ = _plan(sql, ["rec1", "monday"])
+        assert all("INDEX" in detail for detail in details if detail.startswith(("SCAN", "SEARCH"))), details
+
+
+@pytest.mark.parametrize("group_by", sorted(task_db.STATS_PERIOD_COLUMNS))
+def test_period_stats_search_by_key(db, group_by):
+    """按周/按月汇总: 日历和任务都按主键或索引取日期范围，不扫描整表 (分组只涉及范围内的天数)"""
+    sql = task_db.STATS_PERIOD_SQL.format(period=task_db.STATS_PERIOD_COLUMNS[group_by])
+    details, _ = _plan(sql, {"first": task_db._day(START), "last": task_db._day(END)})
+    assert not any(detail.startswith("SCAN ") for detail in details), details
@@ -0,0 +1,53 @@
+"""两种存储模式 (daily 按天展开 / interval 按区间存储) 读出的任务应完全相同
+
+    cd backend && python -m pytest test_storage_modes.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import task_db
+from process_feishu_data import build_task_intervals, process_feishu_records
+
+START, END = "2025-10-13", "2025-10-19"
+FIELDS = {
+    "客户公司名称": "客户A", "工作内容": "巡检", "售后工程师": [{"id": "ou_1", "name": "张三"}],
+    "优先级": "紧急", "申请状态": "审批中",
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    task_db.init_db()
+    yield
+    task_db.close_connection_pool()
+
+
+def _stored_tasks(mode, record):
+    with task_db.open_task_writer(mode) as writer:
+        if mode == "daily":
+            writer.write(process_feishu_records([record]))
+        else:
+            writer.write_intervals(build_task_intervals([record]))
+    tasks = [task for task in task_db.query_tasks(START, END, include_undated=True) if task["source"] == mode]
+    for task in tasks:
+        del task["source"]
+    return tasks
+
+
+@pytest.mark.parametrize("dates", [
+    {},
+    {"服务开始时间": 1760400000000, "服务结束时间": 1760572800000},
+    {"服务开始时间": "1760400000000", "服务结束时间": "1760572800000.0"},
+], ids=["undated", "dated", "string"])
+def test_modes_return_same_tasks(db, dates):
+    record = {"record_id": "rec1", "fields": dict(FIELDS, **dates)}
+    daily = _stored_tasks("daily", record)
+    assert daily == _stored_tasks("interval", record)
+    assert daily and all(task["priority"] == "紧急" and task["application_status"] == "审批中" for task in daily)
+    # 数字字符串形式的时间戳与整数一样得到日期
+    assert all(task["date"] for task in daily) == bool(dates)
@@ -0,0 +1,73 @@
+"""多数据源写入的回归测试: 不同数据表的 record_id 可能相同，同一天的任务行不能互相覆盖
+
+    cd backend && python -m pytest test_task_sources.py
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import task_db
+
+DAY = "2025-10-13"
+
+
+def _tasks(task_name):
+    return {"monday": [{
+        "record_id": "rec1", "task_name": task_name, "assignee": "张三", "status": "进行中",
+        "priority": "重要", "application_status": "", "date": DAY, "start_date": DAY, "end_date": DAY,
+    }]}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_db, "DB_FILE", str(tmp_path / "tasks.db"))
+    task_db.init_db()
+    yield str(tmp_path / "tasks.db")
+    task_db.close_connection_pool()
+
+
+def _names(source=None):
+    return sorted(task["task_name"] for task in task_db.get_tasks_by_record_id("rec1", source))
+
+
+@pytest.mark.parametrize("rebuild", [False, True])
+def test_same_record_id_in_two_sources(db, rebuild):
+    for source, task_name in (("table_a", "客户A 巡检"), ("table_b", "客户B 安装")):
+        with task_db.open_task_writer(source, rebuild=rebuild) as writer:
+            writer.write(_tasks(task_name))
+    assert _names() == ["客户A 巡检", "客户B 安装"]
+    assert _names("table_b") == ["客户B 安装"]
+
+    with task_db.open_task_writer("table_a") as writer:
+        writer.replace_records(["rec1"], {})
+    assert _names() == ["客户B 安装"]
+
+
+def test_migrate_record_date_key(db):
+    """唯一键为 (record_id, date) 的旧表升级后保留原有行、id 和引用它的视图"""
+    with task_db.open_task_writer("table_a") as writer:
+        writer.write(_tasks("客户A 巡检"))
+    task_db.close_connection_pool()
+    with sqlite3.connect(db) as conn:
+        conn.execute("ALTER TABLE tasks RENAME TO tasks_new")
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'tasks_new'").fetchone()[0]
+        conn.execute(sql.replace("tasks_new", "tasks").replace("UNIQUE(source, record_id, date)", "UNIQUE(record_id, date)"))
+        conn.execute("INSERT INTO tasks SELECT * FROM tasks_new")
+        conn.execute("DROP TABLE tasks_new")
+        conn.execute("CREATE VIEW task_records AS SELECT source, record_id FROM tasks")
+        conn.execute("PRAGMA user_version = 2")
+        ids = conn.execute("SELECT id FROM tasks").fetchall()
+
+    task_db.init_db()
+    with task_db.get_db_connection() as conn:
+        assert "UNIQUE(source, record_id, date)" in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'tasks'").fetchone()[0]
+        assert [tuple(row) for row in conn.execute("SELECT id FROM tasks")] == ids
+        assert [tuple(row) for row in conn.execute("SELECT * FROM task_records")] == [("table_a", "rec1")]
+    with task_db.open_task_writer("table_b") as writer:
+        writer.write(_tasks("客户B 安装"))
+    assert _names() == ["客户A 巡检", "客户B 安装"]